@@ -0,0 +1,83 @@
+"""
+JSON dos bots (aiotelegram / aiodiscord).
+
+Usa msgspec quando instalado (`pip install emprestimos[rapido]`): payloads viram bytes
+direto, sem str intermediária, e as respostas são decodificadas já nos Structs tipados,
+lendo só os campos declarados. Sem msgspec tenta orjson e, por fim, o json da stdlib;
+os Structs viram dataclasses com os mesmos campos e o mesmo comportamento para quem usa.
+"""
+import json
+import typing
+import dataclasses
+from functools import lru_cache
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if msgspec is not None:
+    CODEC = 'msgspec'
+
+    class Struct(msgspec.Struct):
+        """Base das respostas tipadas dos bots."""
+
+    _encoder = msgspec.json.Encoder()
+
+    def codificar(payload) -> bytes:
+        return _encoder.encode(payload)
+
+    @lru_cache(maxsize=None)
+    def _decoder(tipo):
+        return msgspec.json.Decoder(tipo)
+
+    def decodificar(dados: bytes, tipo=None):
+        """Decodifica `dados` no tipo informado (Struct), ou em dict/list sem tipo."""
+        if tipo is None:
+            return msgspec.json.decode(dados)
+        return _decoder(tipo).decode(dados)
+
+else:
+    CODEC = 'orjson' if orjson is not None else 'json'
+
+    class Struct:
+        """Base das respostas tipadas dos bots (dataclass, sem msgspec)."""
+        def __init_subclass__(cls, **kwargs):
+            super().__init_subclass__(**kwargs)
+            dataclasses.dataclass(cls)
+
+    if orjson is not None:
+        codificar = orjson.dumps
+        _loads = orjson.loads
+    else:
+        def codificar(payload) -> bytes:
+            return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        _loads = json.loads
+
+    @lru_cache(maxsize=None)
+    def _campos(tipo):
+        """Campo -> Struct aninhado (ou None) de cada campo declarado em `tipo`."""
+        campos = {}
+        for nome, anotacao in typing.get_type_hints(tipo).items():
+            candidatos = typing.get_args(anotacao) or (anotacao,)
+            campos[nome] = next((c for c in candidatos if isinstance(c, type) and issubclass(c, Struct)), None)
+        return campos
+
+    def _converter(valor, tipo):
+        if not isinstance(valor, dict):
+            return valor
+        argumentos = {}
+        for nome, aninhado in _campos(tipo).items():
+            if nome in valor:
+                argumentos[nome] = _converter(valor[nome], aninhado) if aninhado else valor[nome]
+        return tipo(**argumentos)
+
+    def decodificar(dados: bytes, tipo=None):
+        """Decodifica `dados` no tipo informado (Struct), ou em dict/list sem tipo."""
+        valor = _loads(dados)
+        return valor if tipo is None else _converter(valor, tipo)
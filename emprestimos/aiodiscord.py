@@ -1,78 +1,129 @@
+import os
 import aiohttp
 import asyncio
-from dataclasses import dataclass
+from aiohttppool import get_pool
+from aioratelimit import RateLimiter, RateLimitError
+from aiolote import enviar_em_lote
+from aiocodec import Struct, codificar, decodificar
 
-@dataclass
-class DiscordResponse:
+# Só os campos lidos pelo bot; o restante da resposta é ignorado na decodificação
+class DiscordMessage(Struct):
+    id: str | int = 0
+    channel_id: str | int = 0
+    content: str = ""
+
+class DiscordErro(Struct):
+    message: str | None = None
+    code: int | None = None
+
+class DiscordResponse(Struct):
     success: bool
-    result: dict
-    error_message: str = None
+    result: DiscordMessage | None = None
+    error_message: str | None = None
 
-@dataclass
-class MessageInfo:
-    message_id: int
-    chat_id: int
+class MessageInfo(Struct):
+    message_id: int | str
+    chat_id: int | str | None
     text: str
 
 class DiscordBot:
-    def __init__(self, token, timeout=10):
+    def __init__(self, token, timeout=10, rate_limiter=None, pool=None, concorrencia=None):
         if not token:
             raise ValueError("O token do bot é obrigatório.")
         self.token = token
-        self.base_url = "https://discord.com/api/v10"
+        # DISCORD_API_URL permite apontar para um servidor local (ex.: bench_notificador.py)
+        self.base_url = os.getenv('DISCORD_API_URL', "https://discord.com/api/v10")
         self.timeout = timeout
-        self._session: aiohttp.ClientSession | None = None
-        self._session_lock = asyncio.Lock()
+        self.rate_limiter = rate_limiter or RateLimiter.para_plataforma("discord")
+        self.pool = pool or get_pool()
+        self._client_timeout = aiohttp.ClientTimeout(connect=2, sock_read=3)
+        # A sessão é compartilhada entre tokens, então a autenticação vai em cada requisição
+        self._headers = {
+            "Authorization": f"Bot {self.token}",
+            "Content-Type": "application/json"
+        }
+        # Requisições simultâneas deste token; tomado depois do RateLimiter (ver send_request)
+        self._em_voo = asyncio.Semaphore(concorrencia or int(os.getenv('BOT_CONCORRENCIA_TOKEN', 32)))
+        self.ultimo_lote = None  # EstatisticasLote do último send_many
 
     async def get_session(self) -> aiohttp.ClientSession:
-        async with self._session_lock:
-            if self._session is None or self._session.closed:
-                self._session = aiohttp.ClientSession(
-                    timeout=aiohttp.ClientTimeout(
-                        connect=2,
-                        sock_read=3,
-                    ),
-                    connector=aiohttp.TCPConnector(
-                        keepalive_timeout=60,
-                        limit_per_host=10,
-                        ttl_dns_cache=300,
-                        use_dns_cache=True,
-                    ),
-                    headers={
-                        "Authorization": f"Bot {self.token}",
-                        "Content-Type": "application/json"
-                    }
-                )
-        return self._session
-
-    async def reset_session(self):
-        async with self._session_lock:
-            if self._session and not self._session.closed:
-                await self._session.connector.close()
-                await self._session.close()
-            self._session = None
-
-    async def send_request(self, endpoint, payload):
+        # Sessão compartilhada por todos os bots do mesmo host (ver aiohttppool)
+        return await self.pool.get_session(self.base_url)
+
+    async def send_request(self, endpoint, payload, chat_id=None, corpo=None, metodo="POST"):
+        """
+        `corpo` é o payload já serializado (bytes); o send_many serializa cada mensagem
+        uma única vez e reaproveita o mesmo corpo nas retentativas.
+        `metodo` é "PATCH" na edição de mensagens.
+        """
         url = f"{self.base_url}/{endpoint}"
+        if corpo is None:
+            corpo = codificar(payload)
+        await self.rate_limiter.acquire(chat_id)
         try:
             session = await self.get_session()
-            async with session.post(url, json=payload) as response:
+            async with self._em_voo, session.request(metodo, url, data=corpo, headers=self._headers, timeout=self._client_timeout) as response:
+                dados = await response.read()
                 if response.status == 429:
-                    raise RuntimeError("Rate limit atingido")
-                data = await response.json()
-                return DiscordResponse(
-                    success=response.status in (200, 204),
-                    result=data if response.status in (200, 204) else {},
-                    error_message=data.get("message") if response.status not in (200, 204) else None
-                )
+                    raise self._rate_limit_error(response, self._corpo_429(dados), chat_id)
+                self._registrar_cota(response, chat_id)
+                if response.status in (200, 204):
+                    return DiscordResponse(success=True, result=decodificar(dados, DiscordMessage) if dados else None)
+                erro = decodificar(dados, DiscordErro) if dados else DiscordErro()
+                return DiscordResponse(success=False, error_message=erro.message)
+        except RateLimitError:
+            raise
         except aiohttp.ClientConnectionError:
-            await self.reset_session()
             raise RuntimeError("Conexão perdida com o Discord")
         except asyncio.TimeoutError:
             raise TimeoutError("Timeout na requisição para o Discord expirou.")
         except Exception as e:
             raise RuntimeError(f"Erro inesperado do tipo '{type(e).__name__}': {str(e)}")
 
+    def _registrar_cota(self, response, chat_id):
+        """
+        Lê X-RateLimit-Remaining / X-RateLimit-Reset-After de uma resposta bem-sucedida.
+        Se a cota do bucket acabou, pausa o chat até o reset em vez de esperar um 429.
+        """
+        restante = response.headers.get("X-RateLimit-Remaining")
+        reset_after = response.headers.get("X-RateLimit-Reset-After")
+        if restante is None or reset_after is None:
+            return
+        try:
+            if int(restante) <= 0:
+                self.rate_limiter.pausar(float(reset_after), chat_id=chat_id)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def _corpo_429(dados):
+        """
+        Corpo de um 429, tolerante: vazio, JSON inválido ou algo que não seja um objeto
+        (ex.: página de erro de um proxy) vira {}, e o _rate_limit_error cai nos headers.
+        """
+        if not dados:
+            return {}
+        try:
+            data = decodificar(dados)
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _rate_limit_error(self, response, data, chat_id):
+        """
+        Converte a resposta 429 do Discord em RateLimitError.
+        Usa `retry_after` do corpo (ou os headers Retry-After / X-RateLimit-Reset-After)
+        e pausa o bot inteiro quando o limite é global.
+        """
+        headers = response.headers
+        retry_after = (data or {}).get("retry_after") or headers.get("X-RateLimit-Reset-After") or headers.get("Retry-After") or 1
+        escopo = headers.get("X-RateLimit-Scope", "user")
+        global_ = bool((data or {}).get("global")) or headers.get("X-RateLimit-Global", "").lower() == "true"
+        if global_:
+            escopo = "global"
+        self.rate_limiter.pausar(float(retry_after), chat_id=None if global_ else chat_id)
+        return RateLimitError(retry_after, escopo=escopo, bucket=headers.get("X-RateLimit-Bucket"))
+
     async def send_message(self, chat_id, text, reply_markup=None, reply_to_message_id=None):
         if reply_markup:
             payload = {
@@ -82,28 +133,61 @@ class DiscordBot:
                 payload["components"] = reply_markup
             if reply_to_message_id:
                 payload["message_reference"] = {"message_id": reply_to_message_id}
-            response = await self.send_request(f"channels/{chat_id}/messages", payload)
-            if response.success:
-                message_data = response.result
-                return MessageInfo(
-                    message_id=message_data.get("id", 0),
-                    chat_id=message_data.get("channel_id", 0),
-                    text=message_data.get("content", "")
-                )
-            return response
+            response = await self.send_request(f"channels/{chat_id}/messages", payload, chat_id=chat_id)
+            return self._message_info(response)
         else:
             payload = {"content": text}
             if reply_to_message_id:
                 payload["message_reference"] = {"message_id": reply_to_message_id}
-            response = await self.send_request(f"channels/{chat_id}/messages", payload)
-            if response.success:
-                message_data = response.result
-                return MessageInfo(
-                    message_id=message_data.get("id", 0),
-                    chat_id=message_data.get("channel_id", 0),
-                    text=message_data.get("content", "")
-                )
-            return response
+            response = await self.send_request(f"channels/{chat_id}/messages", payload, chat_id=chat_id)
+            return self._message_info(response)
+
+    @staticmethod
+    def _message_info(response):
+        if response.success and response.result is not None:
+            message_data = response.result
+            return MessageInfo(
+                message_id=message_data.id,
+                chat_id=message_data.channel_id,
+                text=message_data.content
+            )
+        return response
+
+    async def send_many(self, messages, tentativas_429=3):
+        """
+        Envia várias mensagens de texto numa única chamada.
+
+        Canais diferentes são atendidos em paralelo, até o limite de requisições simultâneas
+        do token (`concorrencia` / BOT_CONCORRENCIA_TOKEN); mensagens do mesmo canal saem
+        na ordem da lista. Cada payload é serializado uma vez, antes do envio, e o mesmo
+        corpo é reenviado após um 429 (até `tentativas_429` vezes).
+
+        Args:
+            messages (list[dict]): Argumentos de send_message (chat_id, text, reply_markup...)
+
+        Returns:
+            list: Na ordem de `messages`, MessageInfo, DiscordResponse (success=False) ou a
+                exceção do item que falhou. As estatísticas ficam em `self.ultimo_lote`.
+        """
+        itens = []
+        for message in messages:
+            payload = {"content": message.get("text")}
+            if message.get("reply_markup"):
+                payload["components"] = message["reply_markup"]
+            if message.get("reply_to_message_id"):
+                payload["message_reference"] = {"message_id": message["reply_to_message_id"]}
+            corpo = codificar(payload)
+            itens.append((message.get("chat_id"), payload, corpo))
+
+        async def enviar(item):
+            chat_id, payload, corpo = item
+            if not chat_id:
+                raise ValueError("O chat_id é obrigatório.")
+            response = await self.send_request(f"channels/{chat_id}/messages", payload, chat_id=chat_id, corpo=corpo)
+            return self._message_info(response)
+
+        resultados, self.ultimo_lote = await enviar_em_lote(itens, lambda item: item[0], enviar, tentativas_429)
+        return resultados
 
     async def send_animation(self, chat_id=None, animation=None, caption=None, reply_markup=None, reply_to_message_id=None):
         return await self.send_photo(chat_id=chat_id, photo=animation, caption=caption, reply_markup=reply_markup, reply_to_message_id=reply_to_message_id)
@@ -119,15 +203,8 @@ class DiscordBot:
             }
             if reply_to_message_id:
                 payload["message_reference"] = {"message_id": reply_to_message_id}
-            response = await self.send_request(f"channels/{chat_id}/messages", payload)
-            if response.success:
-                message_data = response.result
-                return MessageInfo(
-                    message_id=message_data.get("id", 0),
-                    chat_id=message_data.get("channel_id", 0),
-                    text=message_data.get("content", "")
-                )
-            return response
+            response = await self.send_request(f"channels/{chat_id}/messages", payload, chat_id=chat_id)
+            return self._message_info(response)
         else:
             payload = {
                 "embeds": [{
@@ -137,15 +214,8 @@ class DiscordBot:
             }
             if reply_to_message_id:
                 payload["message_reference"] = {"message_id": reply_to_message_id}
-            response = await self.send_request(f"channels/{chat_id}/messages", payload)
-            if response.success:
-                message_data = response.result
-                return MessageInfo(
-                    message_id=message_data.get("id", 0),
-                    chat_id=message_data.get("channel_id", 0),
-                    text=message_data.get("content", "")
-                )
-            return response
+            response = await self.send_request(f"channels/{chat_id}/messages", payload, chat_id=chat_id)
+            return self._message_info(response)
 
     async def send_sticker(self, chat_id, sticker, reply_markup=None, reply_to_message_id=None):
         if reply_markup:
@@ -155,40 +225,60 @@ class DiscordBot:
             }
             if reply_to_message_id:
                 payload["message_reference"] = {"message_id": reply_to_message_id}
-            response = await self.send_request(f"channels/{chat_id}/messages", payload)
-            if response.success:
-                message_data = response.result
-                return MessageInfo(
-                    message_id=message_data.get("id", 0),
-                    chat_id=message_data.get("channel_id", 0),
-                    text=message_data.get("content", "")
-                )
-            return response
+            response = await self.send_request(f"channels/{chat_id}/messages", payload, chat_id=chat_id)
+            return self._message_info(response)
         else:
             payload = {"sticker_ids": [sticker]}
             if reply_to_message_id:
                 payload["message_reference"] = {"message_id": reply_to_message_id}
-            response = await self.send_request(f"channels/{chat_id}/messages", payload)
-            if response.success:
-                message_data = response.result
-                return MessageInfo(
-                    message_id=message_data.get("id", 0),
-                    chat_id=message_data.get("channel_id", 0),
-                    text=message_data.get("content", "")
-                )
-            return response
+            response = await self.send_request(f"channels/{chat_id}/messages", payload, chat_id=chat_id)
+            return self._message_info(response)
     
+    async def edit_message(self, chat_id, message_id, text, reply_markup=None):
+        payload = {"content": text}
+        if reply_markup:
+            payload["components"] = reply_markup
+        response = await self.send_request(f"channels/{chat_id}/messages/{message_id}", payload, chat_id=chat_id, metodo="PATCH")
+        return self._message_info(response)
+
+    async def delete_messages(self, chat_id, message_ids):
+        """
+        Apaga várias mensagens de um canal. O bulk-delete do Discord aceita de 2 a 100
+        mensagens com menos de 14 dias (e exige a permissão Manage Messages); o que não
+        couber nele, ou se ele for recusado, é apagado uma a uma.
+        """
+        ids = [str(message_id) for message_id in message_ids or []]
+        restantes = []
+        for inicio in range(0, len(ids), 100):
+            lote = ids[inicio:inicio + 100]
+            if len(lote) >= 2:
+                response = await self.send_request(f"channels/{chat_id}/messages/bulk-delete", {"messages": lote}, chat_id=chat_id)
+                if response.success:
+                    continue
+            restantes.extend(lote)
+        for message_id in restantes:
+            await self.delete_message(chat_id, message_id)
+
     async def delete_message(self, chat_id, message_id):
         url = f"{self.base_url}/channels/{chat_id}/messages/{message_id}"
 
         for tentativa in range(1, 4):  # 3 tentativas
+            await self.rate_limiter.acquire(chat_id)
             try:
                 session = await self.get_session()
-                async with session.delete(url) as response:
+                async with self._em_voo, session.delete(url, headers=self._headers, timeout=self._client_timeout) as response:
+                    if response.status == 429:
+                        raise self._rate_limit_error(response, self._corpo_429(await response.read()), chat_id)
+                    self._registrar_cota(response, chat_id)
                     if response.status == 204:
                         return {"ok": True, "description": "Mensagem deletada com sucesso."}
+                    if response.status == 404:
+                        return {"ok": True, "description": "Mensagem já não existia."}
+            except RateLimitError:
+                if tentativa == 3:
+                    raise
+                continue  # o rate_limiter já está pausado até o reset informado
             except aiohttp.ClientConnectionError:
-                await self.reset_session()
                 if tentativa == 3:
                     raise RuntimeError("Conexão perdida com o Discord")
             except asyncio.TimeoutError:
@@ -0,0 +1,236 @@
+"""
+Canal de e-mail do notificador (dependência opcional: `pip install emprestimos[email]`).
+
+PoolSMTP mantém algumas sessões SMTP autenticadas abertas entre os envios: cada mensagem
+pega uma sessão livre, envia e a devolve, sem refazer conexão, STARTTLS e AUTH por
+mensagem. EmailBot tem a mesma interface dos bots (send_message / send_many) e monta o
+HTML com a casca pré-compilada de core.email_template.
+"""
+import os
+import re
+import html
+import uuid
+import asyncio
+import logging
+from email.message import EmailMessage
+from aioratelimit import RateLimiter
+from aiolote import enviar_em_lote
+from aiocodec import Struct
+from core.email_template import envolver_html
+
+_TAG_HTML = re.compile(r"<[^>]+>")
+
+def _booleano(valor, padrao=False):
+    if valor is None or valor == '':
+        return padrao
+    return str(valor).strip().lower() in ('1', 'true', 'yes', 'sim', 'on')
+
+def texto_simples(conteudo):
+    """Versão em texto puro do HTML da mensagem (alternativa text/plain do e-mail)."""
+    return html.unescape(_TAG_HTML.sub('', conteudo))
+
+class EmailResponse(Struct):
+    ok: bool = False
+    description: str | None = None
+
+class MessageInfo(Struct):
+    message_id: str
+    chat_id: str | None
+    text: str
+
+class PoolSMTP:
+    """
+    Pool de sessões SMTP autenticadas.
+
+    As sessões são abertas sob demanda (até `tamanho`) e reaproveitadas entre mensagens e
+    ciclos. Uma sessão derrubada pelo servidor é reaberta uma vez antes de desistir, e
+    cada sessão é renovada depois de `mensagens_por_conexao` envios, já que muitos
+    provedores encerram sessões longas.
+    """
+    def __init__(self, host, porta=587, usuario='', senha='', tls=False, starttls=True, tamanho=4, timeout=30, mensagens_por_conexao=100):
+        try:
+            import aiosmtplib
+        except ImportError as e:
+            raise RuntimeError("O canal de e-mail do notificador precisa do aiosmtplib: pip install emprestimos[email]") from e
+        self._smtp = aiosmtplib
+        self._recusas = (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused)
+        self.host = host
+        self.porta = porta
+        self.usuario = usuario or None
+        self.senha = senha or None
+        self.tls = tls
+        self.starttls = starttls and not tls
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self.mensagens_por_conexao = mensagens_por_conexao
+        # Vagas do pool: [cliente, mensagens enviadas na sessão] ou None (sessão ainda não aberta)
+        self._vagas = asyncio.Queue()
+        for _ in range(tamanho):
+            self._vagas.put_nowait(None)
+        self.conexoes_abertas = 0   # sessões abertas desde o início (conexão + TLS + AUTH)
+
+    @classmethod
+    def de_ambiente(cls):
+        """Configuração do SMTP pelas mesmas variáveis do Django (EMAIL_HOST, EMAIL_PORT...)."""
+        return cls(
+            host=os.getenv('EMAIL_HOST', 'smtp4dev'),
+            porta=int(os.getenv('EMAIL_PORT', 587)),
+            usuario=os.getenv('EMAIL_HOST_USER', ''),
+            senha=os.getenv('EMAIL_HOST_PASSWORD', ''),
+            tls=_booleano(os.getenv('EMAIL_USE_SSL')),
+            starttls=_booleano(os.getenv('EMAIL_USE_TLS'), padrao=True),
+            tamanho=int(os.getenv('NOTIFICADOR_SMTP_CONEXOES', 4)),
+            timeout=float(os.getenv('EMAIL_TIMEOUT', 30)),
+        )
+
+    async def _conectar(self):
+        cliente = self._smtp.SMTP(
+            hostname=self.host, port=self.porta, username=self.usuario, password=self.senha,
+            use_tls=self.tls, start_tls=self.starttls, timeout=self.timeout,
+        )
+        await cliente.connect()  # faz STARTTLS e AUTH quando configurados
+        self.conexoes_abertas += 1
+        return [cliente, 0]
+
+    async def _encerrar(self, vaga):
+        if vaga is None:
+            return
+        cliente = vaga[0]
+        try:
+            if cliente.is_connected:
+                await cliente.quit()
+        except Exception:
+            cliente.close()
+
+    async def enviar(self, mensagem):
+        """
+        Envia `mensagem` (EmailMessage) por uma sessão livre do pool.
+
+        Returns:
+            tuple: (destinatários recusados, resposta final do servidor), como no aiosmtplib
+        """
+        vaga = await self._vagas.get()
+        try:
+            for tentativa in (1, 2):
+                if vaga is not None and (not vaga[0].is_connected or vaga[1] >= self.mensagens_por_conexao):
+                    await self._encerrar(vaga)
+                    vaga = None
+                reaproveitada = vaga is not None
+                if vaga is None:
+                    vaga = await self._conectar()
+                try:
+                    resposta = await vaga[0].send_message(mensagem)
+                except self._smtp.SMTPServerDisconnected:
+                    vaga[0].close()
+                    vaga = None
+                    # Sessão ociosa derrubada pelo servidor: reabre uma vez
+                    if not reaproveitada or tentativa == 2:
+                        raise
+                    continue
+                except self._recusas:
+                    # Recusa do servidor (o aiosmtplib já envia RSET): a sessão segue válida
+                    vaga[1] += 1
+                    raise
+                vaga[1] += 1
+                return resposta
+        except self._recusas:
+            raise
+        except Exception:
+            # Timeout ou erro de protocolo: o estado da sessão é desconhecido
+            if vaga is not None:
+                vaga[0].close()
+                vaga = None
+            raise
+        finally:
+            self._vagas.put_nowait(vaga)
+
+    async def fechar(self):
+        """Encerra (QUIT) as sessões livres; as vagas voltam ao pool sem conexão."""
+        for _ in range(self._vagas.qsize()):
+            vaga = self._vagas.get_nowait()
+            await self._encerrar(vaga)
+            self._vagas.put_nowait(None)
+
+class EmailBot:
+    def __init__(self, remetente=None, pool=None, rate_limiter=None):
+        self.remetente = remetente or os.getenv('DEFAULT_FROM_EMAIL') or os.getenv('EMAIL_HOST_USER') or 'info@example.com'
+        self._dominio = self.remetente.rsplit('@', 1)[1].strip('> ') if '@' in self.remetente else 'localhost'
+        self.pool = pool or PoolSMTP.de_ambiente()
+        self.rate_limiter = rate_limiter or RateLimiter.para_plataforma("email")
+        self.ultimo_lote = None  # EstatisticasLote do último send_many
+
+    def montar(self, destinatario, texto, assunto=None):
+        """
+        Monta o e-mail de `texto` (HTML do notificador_mensagens, com quebras de linha).
+        Sem `assunto`, usa a primeira linha da mensagem em texto puro.
+
+        Returns:
+            tuple[str, EmailMessage]: Identificador da mensagem e a mensagem
+        """
+        identificador = uuid.uuid4().hex
+        simples = texto_simples(texto)
+        mensagem = EmailMessage()
+        mensagem['From'] = self.remetente
+        mensagem['To'] = destinatario
+        mensagem['Subject'] = assunto or simples.strip().split('\n', 1)[0][:200]
+        mensagem['Message-ID'] = f"<{identificador}@{self._dominio}>"
+        mensagem.set_content(simples)
+        mensagem.add_alternative(envolver_html(texto.replace('\n', '<br>\n')), subtype='html')
+        return identificador, mensagem
+
+    async def send_message(self, chat_id=None, text=None, subject=None):
+        """
+        Envia `text` para o endereço `chat_id`.
+
+        Recusas definitivas do servidor (5xx, destinatário inválido) voltam como
+        EmailResponse(ok=False); recusas temporárias (4xx) e falhas de conexão sobem como
+        RuntimeError/TimeoutError para serem retentadas.
+        """
+        if not chat_id:
+            raise ValueError("O endereço de e-mail é obrigatório.")
+        identificador, mensagem = self.montar(chat_id, text or '', subject)
+        await self.rate_limiter.acquire(chat_id)
+        smtp = self.pool._smtp
+        try:
+            recusados, _ = await self.pool.enviar(mensagem)
+        except (smtp.SMTPTimeoutError, asyncio.TimeoutError):
+            raise TimeoutError("Timeout no envio para o servidor SMTP expirou.")
+        except (smtp.SMTPServerDisconnected, smtp.SMTPConnectError, OSError):
+            raise RuntimeError("Conexão perdida com o servidor SMTP")
+        except smtp.SMTPRecipientsRefused as e:
+            return EmailResponse(ok=False, description=f"Destinatário recusado: {e.recipients}")
+        except smtp.SMTPResponseException as e:
+            if e.code >= 500:
+                return EmailResponse(ok=False, description=f"{e.code} {e.message}")
+            raise RuntimeError(f"Servidor SMTP recusou temporariamente ({e.code} {e.message})")
+        except smtp.SMTPException as e:
+            raise RuntimeError(f"Erro SMTP do tipo '{type(e).__name__}': {str(e)}")
+        if recusados:
+            return EmailResponse(ok=False, description=f"Destinatário recusado: {recusados}")
+        return MessageInfo(message_id=identificador, chat_id=chat_id, text=text)
+
+    async def send_many(self, messages, tentativas_429=3):
+        """
+        Envia vários e-mails numa única chamada, pelas sessões do pool.
+
+        Endereços diferentes são atendidos em paralelo (no máximo uma mensagem por sessão
+        do pool ao mesmo tempo); mensagens do mesmo endereço saem na ordem da lista.
+
+        Args:
+            messages (list[dict]): Argumentos de send_message (chat_id, text, subject)
+
+        Returns:
+            list: Na ordem de `messages`, MessageInfo, EmailResponse (ok=False) ou a
+                exceção do item que falhou. As estatísticas ficam em `self.ultimo_lote`.
+        """
+        async def enviar(message):
+            return await self.send_message(message.get("chat_id"), message.get("text"), message.get("subject"))
+
+        resultados, self.ultimo_lote = await enviar_em_lote(messages, lambda message: message.get("chat_id"), enviar, tentativas_429)
+        return resultados
+
+    async def close(self):
+        try:
+            await self.pool.fechar()
+        except Exception as e:
+            logging.warning(f"Erro ao encerrar as sessões SMTP: {e}")
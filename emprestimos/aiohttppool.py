@@ -0,0 +1,108 @@
+import os
+import aiohttp
+import asyncio
+from urllib.parse import urlsplit
+
+class PoolHTTP:
+    """
+    Pool de sessões aiohttp compartilhado por todos os bots do processo.
+
+    Mantém uma ClientSession (e um TCPConnector) por host de plataforma, por exemplo
+    api.telegram.org e discord.com. Centenas de tokens passam a dividir o mesmo
+    cache de DNS e as mesmas conexões keep-alive, em vez de abrir uma sessão por bot.
+    """
+    def __init__(self, limit_per_host=None, keepalive_timeout=None):
+        self.limit_per_host = limit_per_host or int(os.getenv('NOTIFICADOR_HTTP_CONEXOES', 30))
+        self.keepalive_timeout = keepalive_timeout or int(os.getenv('NOTIFICADOR_HTTP_KEEPALIVE', 120))
+        self._sessoes = {}  # "scheme://host" -> ClientSession
+        self._contadores = {}  # "scheme://host" -> contadores alimentados pelo TraceConfig
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def chave_host(url):
+        partes = urlsplit(url)
+        return f"{partes.scheme}://{partes.netloc}"
+
+    async def get_session(self, url) -> aiohttp.ClientSession:
+        """Retorna a sessão compartilhada do host de `url`, criando-a na primeira vez."""
+        chave = self.chave_host(url)
+        session = self._sessoes.get(chave)
+        if session is not None and not session.closed:
+            return session
+        async with self._lock:
+            session = self._sessoes.get(chave)
+            if session is None or session.closed:
+                session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        keepalive_timeout=self.keepalive_timeout,
+                        limit_per_host=self.limit_per_host,
+                        ttl_dns_cache=300,     # cache DNS por 5 minutos — evita resolução repetida
+                        use_dns_cache=True,
+                    ),
+                    trace_configs=[self._rastreio(chave)],
+                )
+                self._sessoes[chave] = session
+        return session
+
+    def _rastreio(self, chave):
+        """
+        TraceConfig (API pública do aiohttp) que conta as requisições e conexões do host.
+        Os contadores sobrevivem à troca da sessão, então o histórico do host não se perde.
+        """
+        contadores = self._contadores.setdefault(chave, {
+            'requisicoes': 0, 'em_voo': 0, 'conexoes_criadas': 0, 'conexoes_reaproveitadas': 0,
+        })
+
+        async def inicio(session, contexto, parametros):
+            contadores['requisicoes'] += 1
+            contadores['em_voo'] += 1
+
+        async def fim(session, contexto, parametros):
+            contadores['em_voo'] -= 1
+
+        async def criada(session, contexto, parametros):
+            contadores['conexoes_criadas'] += 1
+
+        async def reaproveitada(session, contexto, parametros):
+            contadores['conexoes_reaproveitadas'] += 1
+
+        rastreio = aiohttp.TraceConfig()
+        rastreio.on_request_start.append(inicio)
+        rastreio.on_request_end.append(fim)
+        rastreio.on_request_exception.append(fim)
+        rastreio.on_connection_create_end.append(criada)
+        rastreio.on_connection_reuseconn.append(reaproveitada)
+        return rastreio
+
+    def metricas(self):
+        """
+        Por host: limites do TCPConnector, requisições em voo (até receber a resposta) e
+        conexões criadas x reaproveitadas do keep-alive, contadas pelo TraceConfig.
+        """
+        resultado = {}
+        for chave, session in self._sessoes.items():
+            if session.closed:
+                continue
+            connector = session.connector
+            resultado[chave] = {
+                **self._contadores[chave],
+                'limite': connector.limit,
+                'limite_por_host': connector.limit_per_host,
+            }
+        return resultado
+
+    async def close(self):
+        async with self._lock:
+            for session in self._sessoes.values():
+                if not session.closed:
+                    await session.close()
+            self._sessoes.clear()
+
+_POOL = None
+
+def get_pool() -> PoolHTTP:
+    """Pool global do processo."""
+    global _POOL
+    if _POOL is None:
+        _POOL = PoolHTTP()
+    return _POOL
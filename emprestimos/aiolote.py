@@ -0,0 +1,79 @@
+import time
+import asyncio
+from dataclasses import dataclass
+from aioratelimit import RateLimitError
+
+@dataclass
+class EstatisticasLote:
+    """Números do último send_many de um bot (bot.ultimo_lote)."""
+    total: int = 0
+    ok: int = 0
+    recusadas: int = 0      # respostas da plataforma com ok/success False (ex.: 550 do SMTP)
+    erros: int = 0
+    rate_limit: int = 0     # respostas 429 (cada uma é retentada com o mesmo corpo)
+    em_voo_max: int = 0     # maior número de envios em andamento ao mesmo tempo (inclui a espera pela cota)
+    segundos: float = 0.0
+
+    @property
+    def por_segundo(self):
+        return self.ok / self.segundos if self.segundos else 0.0
+
+def _recusada(resultado):
+    # MessageInfo não tem `ok`; as respostas de erro trazem ok (Telegram, e-mail) ou success (Discord) False
+    return getattr(resultado, 'ok', None) is False or getattr(resultado, 'success', None) is False
+
+async def enviar_em_lote(itens, chave_chat, enviar, tentativas_429=3):
+    """
+    Envia `itens` em paralelo entre chats e em sequência dentro de cada chat, para que
+    as mensagens de um chat cheguem na ordem da lista.
+
+    O limite de requisições simultâneas fica no próprio bot (semáforo por token, tomado
+    depois do RateLimiter), então chats esperando a própria cota não ocupam vagas.
+    Um 429 já pausa o RateLimiter do bot pelo retry_after; o item é reenviado com o
+    mesmo corpo pré-serializado até `tentativas_429` vezes.
+
+    Args:
+        itens (list): Itens a enviar
+        chave_chat (callable): item -> chat de destino
+        enviar (callable): item -> coroutine com o resultado do envio
+
+    Returns:
+        tuple[list, EstatisticasLote]: Resultados na ordem de `itens` (a exceção no lugar
+            do resultado quando o item falhou) e as estatísticas do lote
+    """
+    resultados = [None] * len(itens)
+    estatisticas = EstatisticasLote(total=len(itens))
+    por_chat = {}
+    for indice, item in enumerate(itens):
+        por_chat.setdefault(chave_chat(item), []).append(indice)
+    em_voo = 0
+
+    async def enviar_chat(indices):
+        nonlocal em_voo
+        for indice in indices:
+            for tentativa in range(1, tentativas_429 + 1):
+                em_voo += 1
+                estatisticas.em_voo_max = max(estatisticas.em_voo_max, em_voo)
+                try:
+                    resultado = await enviar(itens[indice])
+                except RateLimitError as e:
+                    estatisticas.rate_limit += 1
+                    resultado = e
+                except Exception as e:
+                    resultado = e
+                finally:
+                    em_voo -= 1
+                if not isinstance(resultado, RateLimitError):
+                    break
+            resultados[indice] = resultado
+            if isinstance(resultado, Exception):
+                estatisticas.erros += 1
+            elif _recusada(resultado):
+                estatisticas.recusadas += 1
+            else:
+                estatisticas.ok += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(enviar_chat(indices) for indices in por_chat.values()))
+    estatisticas.segundos = time.perf_counter() - inicio
+    return resultados, estatisticas
@@ -0,0 +1,191 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, replace
+
+@dataclass(frozen=True)
+class LimiteTaxa:
+    capacidade: float   # rajada máxima de requisições
+    por_segundo: float  # velocidade de reposição dos tokens
+
+@dataclass(frozen=True)
+class ConfigLimites:
+    global_: LimiteTaxa          # por token do bot
+    chat: LimiteTaxa             # por chat/canal
+    grupo: LimiteTaxa = None     # adicional para grupos (None = sem limite extra)
+    prefixos_grupo: tuple = ()   # chat_ids com um destes prefixos usam também o balde de grupo
+
+# Limites documentados pelas plataformas, com uma pequena margem de segurança
+LIMITES_PLATAFORMA = {
+    # Telegram: ~30 msg/s por bot, 1 msg/s por chat e 20 msg/min em grupos. Todo chat_id
+    # cadastrado é negativo (ver core.models.validate_chat_id), ou seja, um grupo ou canal;
+    # grupos básicos não têm o prefixo -100, então todo chat_id negativo usa o balde de grupo.
+    # TELEGRAM_PREFIXOS_GRUPO troca os prefixos (ex.: "-100" só supergrupos/canais, "" nenhum).
+    'telegram': ConfigLimites(
+        global_=LimiteTaxa(capacidade=30, por_segundo=28),
+        chat=LimiteTaxa(capacidade=1, por_segundo=1),
+        grupo=LimiteTaxa(capacidade=20, por_segundo=19 / 60),
+        prefixos_grupo=('-',),
+    ),
+    # Discord: 50 req/s por bot e 5 mensagens a cada 5s por canal
+    'discord': ConfigLimites(
+        global_=LimiteTaxa(capacidade=50, por_segundo=45),
+        chat=LimiteTaxa(capacidade=5, por_segundo=1),
+    ),
+    # E-mail: depende do provedor SMTP; um teto conservador para não cair em throttling/spam
+    'email': ConfigLimites(
+        global_=LimiteTaxa(capacidade=20, por_segundo=10),
+        chat=LimiteTaxa(capacidade=5, por_segundo=1),
+    ),
+}
+
+class RateLimitError(RuntimeError):
+    """
+    Limite de requisições atingido na plataforma (HTTP 429).
+    `retry_after` traz, em segundos, quanto tempo esperar antes de tentar de novo.
+    """
+    def __init__(self, retry_after, escopo=None, bucket=None):
+        self.retry_after = max(0.0, float(retry_after))
+        self.escopo = escopo    # 'chat', 'global', 'user', 'shared'...
+        self.bucket = bucket    # identificador do bucket informado pela plataforma
+        super().__init__(f"Rate limit atingido, aguardar {self.retry_after:.2f}s")
+
+class TokenBucket:
+    def __init__(self, limite: LimiteTaxa):
+        self.capacidade = limite.capacidade
+        self.por_segundo = limite.por_segundo
+        self.tokens = limite.capacidade
+        self.atualizado = time.monotonic()
+        self.bloqueado_ate = 0.0
+
+    def _repor(self, agora):
+        decorrido = agora - self.atualizado
+        if decorrido > 0:
+            self.tokens = min(self.capacidade, self.tokens + decorrido * self.por_segundo)
+            self.atualizado = agora
+
+    def tempo_ate_disponivel(self, agora=None):
+        """Segundos até existir 1 token disponível (0 se já existe)."""
+        agora = time.monotonic() if agora is None else agora
+        if agora < self.bloqueado_ate:
+            return self.bloqueado_ate - agora
+        self._repor(agora)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.por_segundo
+
+    def consumir(self):
+        self.tokens -= 1
+
+    def bloquear(self, segundos):
+        """Impede novos envios pelos próximos `segundos`; ao fim, libera uma única requisição."""
+        agora = time.monotonic()
+        self.bloqueado_ate = max(self.bloqueado_ate, agora + segundos)
+        self.tokens = 1
+        self.atualizado = self.bloqueado_ate
+
+    def cheio(self, agora=None):
+        agora = time.monotonic() if agora is None else agora
+        if agora < self.bloqueado_ate:
+            return False
+        self._repor(agora)
+        return self.tokens >= self.capacidade
+
+class RateLimiter:
+    """
+    Agendador assíncrono de envios por token de bot.
+
+    Cada requisição consome um token do balde global do bot, do balde do chat e,
+    quando o chat_id tem um dos `prefixos_grupo` da configuração, também do balde de grupo. Chats diferentes esperam
+    de forma independente; só o balde global é compartilhado.
+    """
+    # Acima disso, baldes ociosos (cheios) de chats são descartados
+    MAX_BALDES_CHAT = 10000
+
+    def __init__(self, config: ConfigLimites):
+        self.config = config
+        self._global = TokenBucket(config.global_)
+        self._global_lock = asyncio.Lock()
+        self._chats = {}  # chat_id -> (lock, balde_chat, balde_grupo | None)
+
+    @classmethod
+    def para_plataforma(cls, plataforma, fracao=1):
+        """
+        `fracao` reduz o limite global do bot quando o mesmo token é usado por
+        vários processos (ex.: 1/N com N workers), para que a soma respeite a plataforma.
+        <PLATAFORMA>_PREFIXOS_GRUPO (separados por vírgula) substitui os prefixos de grupo.
+        """
+        try:
+            config = LIMITES_PLATAFORMA[plataforma]
+        except KeyError:
+            raise ValueError(f"Plataforma sem limites configurados: {plataforma}")
+        prefixos = os.getenv(f"{plataforma.upper()}_PREFIXOS_GRUPO")
+        if prefixos is not None:
+            config = replace(config, prefixos_grupo=tuple(p.strip() for p in prefixos.split(',') if p.strip()))
+        if fracao != 1:
+            limite = config.global_
+            config = replace(config, global_=LimiteTaxa(
+                capacidade=max(1, limite.capacidade * fracao),
+                por_segundo=limite.por_segundo * fracao,
+            ))
+        return cls(config)
+
+    def eh_grupo(self, chat_id):
+        return bool(self.config.prefixos_grupo) and str(chat_id).startswith(self.config.prefixos_grupo)
+
+    def _estado_chat(self, chat_id):
+        estado = self._chats.get(chat_id)
+        if estado is None:
+            if len(self._chats) >= self.MAX_BALDES_CHAT:
+                self._descartar_ociosos()
+            grupo = None
+            if self.config.grupo and self.eh_grupo(chat_id):
+                grupo = TokenBucket(self.config.grupo)
+            estado = (asyncio.Lock(), TokenBucket(self.config.chat), grupo)
+            self._chats[chat_id] = estado
+        return estado
+
+    def _descartar_ociosos(self):
+        agora = time.monotonic()
+        for chat_id, (lock, chat, grupo) in list(self._chats.items()):
+            if not lock.locked() and chat.cheio(agora) and (grupo is None or grupo.cheio(agora)):
+                del self._chats[chat_id]
+
+    def pausar(self, segundos, chat_id=None):
+        """
+        Suspende envios informados pela plataforma (429 ou cota esgotada).
+        Sem chat_id, a pausa vale para todo o bot.
+        """
+        if chat_id is None:
+            self._global.bloquear(segundos)
+        else:
+            self._estado_chat(chat_id)[1].bloquear(segundos)
+
+    async def acquire(self, chat_id=None):
+        """Aguarda até que o envio para `chat_id` respeite todos os limites e reserva a vaga."""
+        if chat_id is None:
+            await self._acquire_global()
+            return
+
+        lock, chat, grupo = self._estado_chat(chat_id)
+        async with lock:
+            while True:
+                espera = chat.tempo_ate_disponivel()
+                if grupo is not None:
+                    espera = max(espera, grupo.tempo_ate_disponivel())
+                if espera <= 0:
+                    break
+                await asyncio.sleep(espera)
+            await self._acquire_global()
+            chat.consumir()
+            if grupo is not None:
+                grupo.consumir()
+
+    async def _acquire_global(self):
+        async with self._global_lock:
+            while True:
+                espera = self._global.tempo_ate_disponivel()
+                if espera <= 0:
+                    break
+                await asyncio.sleep(espera)
+            self._global.consumir()
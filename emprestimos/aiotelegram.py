@@ -1,77 +1,108 @@
+import os
 import uvloop
 import aiohttp
 import asyncio
-from dataclasses import dataclass
+from aiohttppool import get_pool
+from aioratelimit import RateLimiter, RateLimitError
+from aiolote import enviar_em_lote
+from aiocodec import Struct, codificar, decodificar
 
-@dataclass
-class TelegramResponse:
-    ok: bool
-    result: dict
-    description: str = None
+HEADERS_JSON = {"Content-Type": "application/json"}
 
-@dataclass
-class MessageInfo:
+# Só os campos lidos pelo bot; o restante da resposta é ignorado na decodificação
+class TelegramChat(Struct):
+    id: int | str | None = None
+
+class TelegramMessage(Struct):
+    message_id: int = 0
+    chat: TelegramChat | None = None
+    text: str = ""
+
+class TelegramParameters(Struct):
+    retry_after: float = 1
+
+class TelegramResponse(Struct):
+    ok: bool = False
+    result: TelegramMessage | bool | None = None  # True em deleteMessage
+    description: str | None = None
+    parameters: TelegramParameters | None = None
+
+class MessageInfo(Struct):
     message_id: int
-    chat_id: int
+    chat_id: int | str | None
     text: str
 
 class TelegramBot:
-    def __init__(self, token, timeout=10, parse_mode="HTML", disable_web_page_preview=True):
+    def __init__(self, token, timeout=10, parse_mode="HTML", disable_web_page_preview=True, rate_limiter=None, pool=None, concorrencia=None):
         if not token:
             raise ValueError("O token do bot é obrigatório.")
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{self.token}"
+        # TELEGRAM_API_URL permite apontar para um servidor local (ex.: bench_notificador.py)
+        self.base_url = f"{os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')}/bot{self.token}"
         self.timeout = timeout
         self.parse_mode = parse_mode
         self.disable_web_page_preview = disable_web_page_preview
-        self._session: aiohttp.ClientSession | None = None
-        self._session_lock = asyncio.Lock()
+        self.rate_limiter = rate_limiter or RateLimiter.para_plataforma("telegram")
+        self.pool = pool or get_pool()
+        self._client_timeout = aiohttp.ClientTimeout(connect=2, sock_read=self.timeout)
+        # Requisições simultâneas deste token; tomado depois do RateLimiter (ver send_request)
+        self._em_voo = asyncio.Semaphore(concorrencia or int(os.getenv('BOT_CONCORRENCIA_TOKEN', 32)))
+        self.ultimo_lote = None  # EstatisticasLote do último send_many
 
     async def get_session(self) -> aiohttp.ClientSession:
-        async with self._session_lock:
-            if self._session is None or self._session.closed:
-                self._session = aiohttp.ClientSession(
-                    timeout=aiohttp.ClientTimeout(
-                        connect=2,
-                        sock_read=self.timeout,
-                    ),
-                    connector=aiohttp.TCPConnector(
-                        keepalive_timeout=60,  # margem confortável para o intervalo de 3s
-                        limit_per_host=10,      # 10 conexões paralelas com api.telegram.org
-                        ttl_dns_cache=300,     # cache DNS por 5 minutos — evita resolução repetida
-                        use_dns_cache=True,
-                    )
-                )
-        return self._session
-
-    async def reset_session(self):
-        async with self._session_lock:
-            if self._session and not self._session.closed:
-                await self._session.connector.close()  # fecha o TCPConnector
-                await self._session.close()
-            self._session = None
-
-    async def send_request(self, method, payload):
+        # Sessão compartilhada por todos os bots do mesmo host (ver aiohttppool)
+        return await self.pool.get_session(self.base_url)
+
+    async def send_request(self, method, payload, corpo=None):
+        """
+        `corpo` é o payload já serializado (bytes); o send_many serializa cada mensagem
+        uma única vez e reaproveita o mesmo corpo nas retentativas.
+        """
         url = f"{self.base_url}/{method}"
+        if corpo is None:
+            corpo = codificar(payload)
+        await self.rate_limiter.acquire(payload.get("chat_id"))
         try:
             session = await self.get_session()
-            async with session.post(url, json=payload) as response:
+            async with self._em_voo, session.post(url, data=corpo, headers=HEADERS_JSON, timeout=self._client_timeout) as response:
+                dados = await response.read()
                 if response.status == 429:
-                    raise RuntimeError("Rate limit atingido")
-                data = await response.json()
-                return TelegramResponse(
-                    ok=data.get("ok"),
-                    result=data.get("result", {}),
-                    description=data.get("description")
-                )
+                    raise self._rate_limit_error(response, self._corpo_429(dados), payload.get("chat_id"))
+                return decodificar(dados, TelegramResponse)
+        except RateLimitError:
+            raise
         except aiohttp.ClientConnectionError:
-            await self.reset_session()
             raise RuntimeError("Conexão perdida com o Telegram")
         except asyncio.TimeoutError:
             raise TimeoutError("Timeout na requisição para o Telegram expirou.")
         except Exception as e:
             raise RuntimeError(f"Erro inesperado do tipo '{type(e).__name__}': {str(e)}")
     
+    @staticmethod
+    def _corpo_429(dados):
+        """
+        Corpo de um 429, tolerante: vazio, JSON inválido ou algo que não seja um objeto
+        (ex.: página de erro de um proxy) vira {}, e o _rate_limit_error cai no header.
+        """
+        if not dados:
+            return {}
+        try:
+            data = decodificar(dados)
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _rate_limit_error(self, response, data, chat_id):
+        """
+        Converte a resposta 429 do Telegram em RateLimitError.
+        O tempo de espera vem de `parameters.retry_after` (em segundos) ou, sem ele
+        no corpo, do header Retry-After.
+        """
+        parametros = data.get("parameters")
+        retry_after = (parametros.get("retry_after") if isinstance(parametros, dict) else None) or response.headers.get("Retry-After") or 1
+        self.rate_limiter.pausar(float(retry_after), chat_id=chat_id)
+        return RateLimitError(retry_after, escopo="chat" if chat_id is not None else "global")
+
     async def send_message(self, chat_id=None, text=None, parse_mode=None, reply_markup=None, disable_web_page_preview=None,reply_to_message_id=None):
         if not chat_id:
             raise ValueError("O chat_id é obrigatório.")
@@ -85,16 +116,58 @@ class TelegramBot:
             payload["reply_markup"] = {"inline_keyboard": reply_markup}
         if reply_to_message_id:
             payload["reply_to_message_id"] = reply_to_message_id             
-        response = await self.send_request("sendMessage", payload)
-        if response.ok:
+        return self._message_info(await self.send_request("sendMessage", payload))
+
+    @staticmethod
+    def _message_info(response):
+        if response.ok and isinstance(response.result, TelegramMessage):
             message_data = response.result
             return MessageInfo(
-                message_id = message_data.get("message_id", 0),
-                chat_id = message_data.get("chat", {}).get("id"),
-                text = message_data.get("text",""),
+                message_id = message_data.message_id,
+                chat_id = message_data.chat.id if message_data.chat else None,
+                text = message_data.text,
             )
         return response
 
+    async def send_many(self, messages, tentativas_429=3):
+        """
+        Envia várias mensagens de texto numa única chamada.
+
+        Chats diferentes são atendidos em paralelo, até o limite de requisições simultâneas
+        do token (`concorrencia` / BOT_CONCORRENCIA_TOKEN); mensagens do mesmo chat saem
+        na ordem da lista. Cada payload é serializado uma vez, antes do envio, e o mesmo
+        corpo é reenviado após um 429 (até `tentativas_429` vezes).
+
+        Args:
+            messages (list[dict]): Argumentos de send_message (chat_id, text, parse_mode...)
+
+        Returns:
+            list: Na ordem de `messages`, MessageInfo, TelegramResponse (ok=False) ou a
+                exceção do item que falhou. As estatísticas ficam em `self.ultimo_lote`.
+        """
+        itens = []
+        for message in messages:
+            payload = {
+                "chat_id": message.get("chat_id"),
+                "text": message.get("text"),
+                "parse_mode": message.get("parse_mode") or self.parse_mode,
+                "disable_web_page_preview": message["disable_web_page_preview"] if message.get("disable_web_page_preview") is not None else self.disable_web_page_preview
+            }
+            if message.get("reply_markup"):
+                payload["reply_markup"] = {"inline_keyboard": message["reply_markup"]}
+            if message.get("reply_to_message_id"):
+                payload["reply_to_message_id"] = message["reply_to_message_id"]
+            itens.append((payload, codificar(payload)))
+
+        async def enviar(item):
+            payload, corpo = item
+            if not payload["chat_id"]:
+                raise ValueError("O chat_id é obrigatório.")
+            return self._message_info(await self.send_request("sendMessage", payload, corpo))
+
+        resultados, self.ultimo_lote = await enviar_em_lote(itens, lambda item: item[0]["chat_id"], enviar, tentativas_429)
+        return resultados
+
     async def send_photo(self, chat_id=None, photo=None, caption=None, parse_mode=None, reply_markup=None, disable_web_page_preview=None,reply_to_message_id=None):
         if not chat_id:
             raise ValueError("O chat_id é obrigatório.")
@@ -109,15 +182,7 @@ class TelegramBot:
             payload["reply_markup"] = {"inline_keyboard": reply_markup}
         if reply_to_message_id:
             payload["reply_to_message_id"] = reply_to_message_id             
-        response = await self.send_request("sendPhoto", payload)
-        if response.ok:
-            message_data = response.result
-            return MessageInfo(
-                message_id = message_data.get("message_id", 0),
-                chat_id = message_data.get("chat", {}).get("id"),
-                text = message_data.get("text",""),
-            )
-        return response
+        return self._message_info(await self.send_request("sendPhoto", payload))
 
     async def send_sticker(self, chat_id=None, sticker=None, reply_markup=None,reply_to_message_id=None):
         if not chat_id:
@@ -130,15 +195,7 @@ class TelegramBot:
             payload["reply_markup"] = {"inline_keyboard": reply_markup}
         if reply_to_message_id:
             payload["reply_to_message_id"] = reply_to_message_id             
-        response = await self.send_request("sendSticker", payload)
-        if response.ok:
-            message_data = response.result
-            return MessageInfo(
-                message_id = message_data.get("message_id", 0),
-                chat_id = message_data.get("chat", {}).get("id"),
-                text = message_data.get("text",""),
-            )
-        return response
+        return self._message_info(await self.send_request("sendSticker", payload))
     
     async def send_animation(self, chat_id=None, animation=None, caption=None, parse_mode=None, reply_markup=None, disable_web_page_preview=None,reply_to_message_id=None):
         if not chat_id:
@@ -154,16 +211,45 @@ class TelegramBot:
             payload["reply_markup"] = {"inline_keyboard": reply_markup}
         if reply_to_message_id:
             payload["reply_to_message_id"] = reply_to_message_id             
-        response = await self.send_request("sendAnimation", payload)
-        if response.ok:
-            message_data = response.result
-            return MessageInfo(
-                message_id = message_data.get("message_id", 0),
-                chat_id = message_data.get("chat", {}).get("id"),
-                text = message_data.get("text",""),
-            )
-        return response
+        return self._message_info(await self.send_request("sendAnimation", payload))
     
+    async def edit_message_text(self, chat_id=None, message_id=None, text=None, parse_mode=None, reply_markup=None, disable_web_page_preview=None):
+        if not chat_id:
+            raise ValueError("O chat_id é obrigatório.")
+        if not message_id:
+            raise ValueError("O message_id é obrigatório.")
+        payload = {
+            "chat_id": chat_id,
+            "message_id": int(message_id),
+            "text": text,
+            "parse_mode": parse_mode or self.parse_mode,
+            "disable_web_page_preview": disable_web_page_preview if disable_web_page_preview is not None else self.disable_web_page_preview
+        }
+        if reply_markup:
+            payload["reply_markup"] = {"inline_keyboard": reply_markup}
+        response = await self.send_request("editMessageText", payload)
+        if not response.ok and "message is not modified" in (response.description or ""):
+            # Texto idêntico ao atual: a mensagem já está como deveria
+            return MessageInfo(message_id=int(message_id), chat_id=chat_id, text=text)
+        return self._message_info(response)
+
+    async def delete_messages(self, chat_id=None, message_ids=None):
+        """
+        Apaga várias mensagens de um chat com deleteMessages (até 100 por chamada).
+        Mensagens que não existem mais ou não podem ser apagadas são ignoradas pelo Telegram.
+
+        Returns:
+            list[TelegramResponse]: Uma resposta por lote de 100
+        """
+        if not chat_id:
+            raise ValueError("O chat_id é obrigatório.")
+        ids = [int(message_id) for message_id in message_ids or []]
+        respostas = []
+        for inicio in range(0, len(ids), 100):
+            payload = {"chat_id": chat_id, "message_ids": ids[inicio:inicio + 100]}
+            respostas.append(await self.send_request("deleteMessages", payload))
+        return respostas
+
     async def delete_message(self, chat_id=None, message_id=None):
         if not chat_id:
             raise ValueError("O chat_id é obrigatório.")
@@ -178,6 +264,10 @@ class TelegramBot:
         for tentativa in range(1, 4):  # 3 tentativas
             try:
                 return await self.send_request("deleteMessage", payload)
+            except RateLimitError:
+                if tentativa == 3:
+                    raise
+                continue  # o rate_limiter já está pausado até o retry_after informado
             except Exception as e:
                 if tentativa == 3:
                     raise
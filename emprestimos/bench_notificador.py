@@ -0,0 +1,435 @@
+"""
+Benchmark offline do notificador.
+
+Sobe um servidor aiohttp local que imita o `sendMessage` do Telegram e o
+`channels/{id}/messages` do Discord (latência, 429 com retry_after e quedas de
+conexão), gera um banco SQLite temporário com N empréstimos e mede a varredura
+e os envios de ponta a ponta (buscar_vencimentos + drenagem do outbox).
+O canal de e-mail é medido contra um servidor SMTP local (aiosmtpd).
+
+Uso:
+    python bench_notificador.py --emprestimos 2000 --donos 20 --latencia 0.05 --taxa-429 0.02
+    pytest bench_notificador.py -s
+"""
+import os
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from aiohttp import web
+from decimal import Decimal
+from datetime import timedelta
+
+class ServidorFalso:
+    """
+    Servidor local com as rotas de envio do Telegram e do Discord.
+
+    Args:
+        latencia (float): Segundos de espera antes de cada resposta
+        taxa_429 (float): Fração das requisições respondidas com 429
+        retry_after (float): Valor de retry_after informado nos 429
+        taxa_reset (float): Fração das requisições em que a conexão é derrubada sem resposta
+    """
+    def __init__(self, latencia=0.0, taxa_429=0.0, retry_after=1.0, taxa_reset=0.0, semente=None):
+        self.latencia = latencia
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self.taxa_reset = taxa_reset
+        self.url = None
+        self.requisicoes = 0
+        self.respostas_429 = 0
+        self.resets = 0
+        self.entregues = 0
+        self._random = random.Random(semente)
+        self._runner = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/sendMessage', self.telegram)
+        app.router.add_post('/channels/{chat_id}/messages', self.discord)
+        return app
+
+    async def iniciar(self, host='127.0.0.1', porta=0):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, porta)
+        await site.start()
+        porta = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{porta}"
+        return self.url
+
+    async def parar(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _sortear_falha(self, request):
+        """Aplica a latência e decide se a requisição cai ('reset'), recebe 429 ('429') ou passa (None)."""
+        self.requisicoes += 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        sorteio = self._random.random()
+        if sorteio < self.taxa_reset:
+            self.resets += 1
+            return 'reset'
+        if sorteio < self.taxa_reset + self.taxa_429:
+            self.respostas_429 += 1
+            return '429'
+        self.entregues += 1
+        return None
+
+    async def telegram(self, request):
+        payload = await request.json()
+        falha = await self._sortear_falha(request)
+        if falha == 'reset':
+            request.transport.close()
+            return web.Response()
+        if falha == '429':
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        return web.json_response({
+            "ok": True,
+            "result": {
+                "message_id": self.entregues,
+                "chat": {"id": payload.get("chat_id")},
+                "date": int(time.time()),
+                "text": payload.get("text", ""),
+            },
+        })
+
+    async def discord(self, request):
+        payload = await request.json()
+        falha = await self._sortear_falha(request)
+        if falha == 'reset':
+            request.transport.close()
+            return web.Response()
+        if falha == '429':
+            return web.json_response(
+                {"message": "You are being rate limited.", "retry_after": self.retry_after, "global": False},
+                status=429,
+                headers={"X-RateLimit-Scope": "user", "X-RateLimit-Bucket": "bench"},
+            )
+        return web.json_response({
+            "id": str(self.entregues),
+            "channel_id": request.match_info['chat_id'],
+            "content": payload.get("content", ""),
+        })
+
+class ServidorSMTPFalso:
+    """
+    Servidor SMTP local (aiosmtpd) que aceita qualquer AUTH e conta mensagens e sessões.
+    Destinatários que começam com "recusado" recebem 550 no RCPT.
+    """
+    def __init__(self):
+        self.mensagens = 0
+        self.sessoes = set()    # (host, porta) do cliente de cada sessão que entregou mensagens
+        self.host = '127.0.0.1'
+        self.porta = None
+        self._controller = None
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('recusado'):
+            return '550 5.1.1 Destinatário inexistente'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.mensagens += 1
+        self.sessoes.add(session.peer)
+        return '250 OK'
+
+    def iniciar(self):
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+        with socket.socket() as sock:
+            sock.bind((self.host, 0))
+            self.porta = sock.getsockname()[1]
+        self._controller = Controller(
+            self, hostname=self.host, port=self.porta,
+            authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False,
+        )
+        self._controller.start()
+        return self.porta
+
+    def parar(self):
+        if self._controller is not None:
+            self._controller.stop()
+            self._controller = None
+
+def configurar_django(dbpath):
+    """Aponta o Django para `dbpath` e aplica as migrations (cria o banco se não existir)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    from django.conf import settings
+    from django.db import connections
+    from django.core.management import call_command
+
+    settings.DATABASES['default']['NAME'] = dbpath
+    django.setup()
+    # Se o Django já estava configurado (vários benchmarks no mesmo processo), reabre a conexão
+    connections.close_all()
+    connections['default'].settings_dict['NAME'] = dbpath
+    call_command('migrate', verbosity=0)
+
+def gerar_dados(dbpath, emprestimos=1000, donos=10, rotas_por_dono=2, semente=0):
+    """
+    Preenche o banco com `emprestimos` empréstimos de 1 parcela cada, divididos entre
+    `donos` usuários. Cada dono tem `rotas_por_dono` rotas de notificação, alternando
+    Telegram e Discord. Os vencimentos são sorteados entre vencidas e os próximos 3 dias,
+    então toda parcela gera uma mensagem por rota do dono.
+
+    Returns:
+        dict: parcelas, rotas e mensagens esperadas
+    """
+    configurar_django(dbpath)
+    from django.utils import timezone
+    from django.contrib.auth.models import User
+    from core.models import Cliente, Emprestimo, Parcela, BotToken, ChatId, Notificacao
+
+    aleatorio = random.Random(semente)
+    usuarios = User.objects.bulk_create([User(username=f"bench{i}") for i in range(donos)])
+
+    tokens, chats = [], []
+    for usuario in usuarios:
+        for rota in range(rotas_por_dono):
+            plataforma = 'telegram' if rota % 2 == 0 else 'discord'
+            tokens.append(BotToken(nome='bench', dono=usuario, token=f"{usuario.id}{rota}:bench", plataforma=plataforma))
+            chats.append(ChatId(nome='bench', dono=usuario, chat_id=f"{usuario.id:04d}{rota:03d}", plataforma=plataforma))
+    tokens = BotToken.objects.bulk_create(tokens)
+    chats = ChatId.objects.bulk_create(chats)
+    # bulk_create não chama save()/full_clean(), por isso a plataforma é copiada do token aqui
+    Notificacao.objects.bulk_create([
+        Notificacao(dono=token.dono, token=token, chat_id=chat, plataforma=token.plataforma)
+        for token, chat in zip(tokens, chats)
+    ])
+
+    clientes = Cliente.objects.bulk_create([
+        Cliente(responsavel=usuario, nome=f"Cliente {usuario.id}", sobrenome="Bench", nome_completo=f"Cliente {usuario.id} Bench")
+        for usuario in usuarios
+    ])
+
+    agora = timezone.now()
+    lista_emprestimos, vencimentos = [], []
+    for i in range(emprestimos):
+        cliente = clientes[i % donos]
+        dias = aleatorio.choice([-30, -7, -1, 0, 1, 2, 3])
+        vencimentos.append(agora + timedelta(days=dias))
+        lista_emprestimos.append(Emprestimo(
+            responsavel=cliente.responsavel, cliente=cliente, valor=Decimal('1000'), parcelas='1',
+            data_inicio=agora - timedelta(days=30), data_fim=vencimentos[-1],
+        ))
+    # bulk_create também não dispara o signal que cria as parcelas, então elas são geradas aqui
+    lista_emprestimos = Emprestimo.objects.bulk_create(lista_emprestimos, batch_size=500)
+    Parcela.objects.bulk_create([
+        Parcela(
+            responsavel=emprestimo.responsavel, cliente=emprestimo.cliente, emprestimo=emprestimo,
+            valor=emprestimo.recebimento_futuro(), numero_parcela='1',
+            data_inicio=emprestimo.data_inicio, data_fim=vencimento,
+        )
+        for emprestimo, vencimento in zip(lista_emprestimos, vencimentos)
+    ], batch_size=500)
+
+    from django.db import connections
+    connections.close_all()
+    return {
+        'parcelas': emprestimos,
+        'rotas': donos * rotas_por_dono,
+        'mensagens_esperadas': emprestimos * rotas_por_dono,
+    }
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+def executar_benchmark(
+    emprestimos=1000, donos=10, rotas_por_dono=2,
+    latencia=0.02, taxa_429=0.01, retry_after=1.0, taxa_reset=0.005,
+    limites_reais=True, dbpath=None, semente=0,
+):
+    """
+    Gera os dados, sobe o servidor falso e executa buscar_vencimentos seguido da drenagem
+    do outbox, com as janelas de envio ignoradas (tudo sai na hora).
+
+    Args:
+        limites_reais (bool): Usa os limites das plataformas (1 msg/s por chat no Telegram);
+            com False, o RateLimiter não segura nada e mede-se só o pipeline
+
+    Returns:
+        dict: Métricas do benchmark (mensagens/s, latências p50/p99, retentativas, tempo total...)
+    """
+    dbpath = dbpath or os.path.join(tempfile.mkdtemp(prefix='bench_notificador_'), 'db.sqlite3')
+    # O ORM do Django é síncrono: os dados são gerados antes de abrir o event loop
+    dados = gerar_dados(dbpath, emprestimos=emprestimos, donos=donos, rotas_por_dono=rotas_por_dono, semente=semente)
+    servidor = ServidorFalso(latencia=latencia, taxa_429=taxa_429, retry_after=retry_after, taxa_reset=taxa_reset, semente=semente)
+    return {**dados, **asyncio.run(medir_envios(dbpath, servidor, limites_reais))}
+
+async def medir_envios(dbpath, servidor, limites_reais=True):
+    """Mede a varredura e os envios do notificador contra `servidor` usando o banco em `dbpath`."""
+    # Imports tardios: o notificador depende das variáveis de ambiente definidas abaixo
+    from aiohttppool import get_pool
+    from aioratelimit import RateLimiter, ConfigLimites, LimiteTaxa
+    from notificador import Notificador, DB, Particionamento
+
+    class NotificadorBenchmark(Notificador):
+        def __init__(self):
+            super().__init__()
+            self.latencias = []
+
+        @staticmethod
+        def agendar(linha, agora, espalhar=True):
+            return None
+
+        def _rate_limiter(self, plataforma):
+            if limites_reais:
+                return super()._rate_limiter(plataforma)
+            sem_limite = LimiteTaxa(capacidade=10**9, por_segundo=10**9)
+            return RateLimiter(ConfigLimites(global_=sem_limite, chat=sem_limite))
+
+        async def enviar_mensagem(self, bot, chat_id, texto, plataforma, editar=None):
+            inicio = time.perf_counter()
+            msg = await super().enviar_mensagem(bot, chat_id, texto, plataforma, editar)
+            self.latencias.append(time.perf_counter() - inicio)
+            return msg
+
+    url = await servidor.iniciar()
+    os.environ['TELEGRAM_API_URL'] = url
+    os.environ['DISCORD_API_URL'] = url
+
+    notificador = NotificadorBenchmark()
+    db = DB(dbpath)
+    db_leases = DB(dbpath)
+    await db.connect()
+    await db_leases.connect()
+    notificador.db = db
+    notificador._particao = Particionamento(db_leases)
+    try:
+        await notificador._particao.rebalancear()
+        hoje = notificador.hoje_local()
+
+        inicio = time.perf_counter()
+        gravadas = await notificador.buscar_vencimentos(hoje)
+        fim_varredura = time.perf_counter()
+        await notificador.processar_outbox(hoje)
+        fim = time.perf_counter()
+
+        status = {
+            row['status']: row['total']
+            for row in await db.banco.buscar("SELECT status, COUNT(*) AS total FROM core_notification_outbox GROUP BY status")
+        }
+    finally:
+        await notificador._particao.encerrar()
+        await get_pool().close()
+        await db.close()
+        await db_leases.close()
+        await servidor.parar()
+
+    enviadas = status.get('enviado', 0)
+    tempo_total = fim - inicio
+    return {
+        'gravadas': gravadas,
+        'enviadas': enviadas,
+        'falhas': status.get('falha', 0),
+        'tempo_varredura_pipeline': fim_varredura - inicio,
+        'tempo_total': tempo_total,
+        'mensagens_por_segundo': enviadas / tempo_total if tempo_total else 0.0,
+        'latencia_p50': percentil(notificador.latencias, 50),
+        'latencia_p99': percentil(notificador.latencias, 99),
+        'requisicoes': servidor.requisicoes,
+        'retentativas': servidor.requisicoes - servidor.entregues,
+        'respostas_429': servidor.respostas_429,
+        'resets': servidor.resets,
+    }
+
+def formatar_relatorio(resultado):
+    return "\n".join([
+        f"Parcelas: {resultado['parcelas']} | Rotas: {resultado['rotas']} | Mensagens esperadas: {resultado['mensagens_esperadas']}",
+        f"Gravadas no outbox: {resultado['gravadas']} | Enviadas: {resultado['enviadas']} | Falhas: {resultado['falhas']}",
+        f"Tempo total: {resultado['tempo_total']:.2f}s (varredura + pipeline: {resultado['tempo_varredura_pipeline']:.2f}s)",
+        f"Vazão: {resultado['mensagens_por_segundo']:.1f} mensagens/s",
+        f"Latência de entrega: p50 {resultado['latencia_p50'] * 1000:.1f}ms | p99 {resultado['latencia_p99'] * 1000:.1f}ms",
+        f"Requisições: {resultado['requisicoes']} | Retentativas: {resultado['retentativas']} "
+        f"(429: {resultado['respostas_429']}, conexões derrubadas: {resultado['resets']})",
+    ])
+
+def test_benchmark_notificador(tmp_path):
+    # Cenário curto com 429 e quedas de conexão; sem os limites reais para caber numa sessão de testes
+    logging.disable(logging.CRITICAL)
+    try:
+        resultado = executar_benchmark(
+            emprestimos=200, donos=10, rotas_por_dono=2,
+            latencia=0.005, taxa_429=0.05, retry_after=0.1, taxa_reset=0.01,
+            limites_reais=False, dbpath=str(tmp_path / 'db.sqlite3'),
+        )
+    finally:
+        logging.disable(logging.NOTSET)
+    print("\n" + formatar_relatorio(resultado))
+    assert resultado['enviadas'] == resultado['mensagens_esperadas']
+    assert resultado['falhas'] == 0
+    assert resultado['respostas_429'] + resultado['resets'] > 0
+
+async def medir_email(servidor, mensagens=300, destinatarios=50, conexoes=4):
+    """Envia `mensagens` por EmailBot.send_many contra `servidor` com um pool de `conexoes` sessões."""
+    from aioemail import EmailBot, PoolSMTP
+    from aioratelimit import RateLimiter, ConfigLimites, LimiteTaxa
+
+    sem_limite = LimiteTaxa(capacidade=10**9, por_segundo=10**9)
+    pool = PoolSMTP(servidor.host, servidor.porta, usuario='bench', senha='bench', starttls=False, tamanho=conexoes)
+    bot = EmailBot('notificador@example.com', pool=pool, rate_limiter=RateLimiter(ConfigLimites(global_=sem_limite, chat=sem_limite)))
+    lote = [
+        {'chat_id': f"cliente{i % destinatarios}@example.com", 'text': f"<b>Parcela {i}</b>\nVence hoje: R$ 10,00"}
+        for i in range(mensagens)
+    ]
+    lote.append({'chat_id': 'recusado@example.com', 'text': 'Sem destino'})
+    try:
+        resultados = await bot.send_many(lote)
+    finally:
+        await bot.close()
+    return resultados, bot.ultimo_lote, pool.conexoes_abertas
+
+def test_canal_email():
+    # Muitas mensagens por poucas sessões autenticadas; a recusa 550 não derruba a sessão
+    servidor = ServidorSMTPFalso()
+    servidor.iniciar()
+    try:
+        resultados, estatisticas, conexoes = asyncio.run(medir_email(servidor, conexoes=4))
+    finally:
+        servidor.parar()
+    print(f"\nE-mail: {estatisticas.ok} mensagens em {estatisticas.segundos:.2f}s "
+          f"({estatisticas.por_segundo:.0f}/s) por {conexoes} sessões SMTP")
+    assert all(getattr(r, 'message_id', None) for r in resultados[:-1])
+    assert resultados[-1].ok is False
+    assert servidor.mensagens == 300
+    assert (estatisticas.ok, estatisticas.recusadas, estatisticas.erros) == (300, 1, 0)
+    assert conexoes <= 4 and len(servidor.sessoes) <= 4
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline do notificador")
+    parser.add_argument('--emprestimos', type=int, default=1000)
+    parser.add_argument('--donos', type=int, default=10)
+    parser.add_argument('--rotas-por-dono', type=int, default=2)
+    parser.add_argument('--latencia', type=float, default=0.02, help="segundos por resposta do servidor falso")
+    parser.add_argument('--taxa-429', type=float, default=0.01)
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--taxa-reset', type=float, default=0.005)
+    parser.add_argument('--sem-limites', action='store_true', help="desliga o RateLimiter para medir só o pipeline")
+    parser.add_argument('--db', default=None, help="caminho do banco gerado (padrão: diretório temporário)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    resultado = executar_benchmark(
+        emprestimos=args.emprestimos, donos=args.donos, rotas_por_dono=args.rotas_por_dono,
+        latencia=args.latencia, taxa_429=args.taxa_429, retry_after=args.retry_after,
+        taxa_reset=args.taxa_reset, limites_reais=not args.sem_limites, dbpath=args.db,
+    )
+    print(formatar_relatorio(resultado))
@@ -10,7 +10,7 @@ from import_export.admin import ImportExportModelAdmin
 from django.utils.translation import gettext_lazy as _
 from utils.formatar_dinheiro import formatar_dinheiro
 from .forms import ParcelaAdminForm, EmprestimoAdminForm
-from .models import Cliente, Contato, Emprestimo, Parcela, ChatId, BotToken, Notificacao
+from .models import Cliente, Contato, Emprestimo, Parcela, ChatId, BotToken, Notificacao, NotificacaoOutbox, ExecucaoNotificador, EntregaNotificacao, LeaseNotificador
 
 class AtrasoEmprestimoFilter(SimpleListFilter):
     title = _('Por Atrasado')
@@ -404,6 +404,31 @@ class BotTokenAdmin(admin.ModelAdmin):
 
 @admin.register(Notificacao)
 class NotificacaoAdmin(admin.ModelAdmin):
-    list_display = ['id', 'dono', 'token', 'chat_id', 'plataforma']
+    list_display = ['id', 'dono', 'token', 'chat_id', 'plataforma', 'modo_envio', 'inicio_envio', 'fim_envio', 'vencidas_diarias', 'vencidas_intervalo', 'vencidas_reenvio']
     search_fields = ['dono__username', 'token__nome', 'chat_id__nome']
-    list_filter = ['plataforma']
\ No newline at end of file
+    list_filter = ['plataforma', 'modo_envio', 'vencidas_reenvio']
+
+@admin.register(NotificacaoOutbox)
+class NotificacaoOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'data_referencia', 'parcela', 'janela', 'chat_id', 'plataforma', 'shard', 'status', 'tentativas', 'agendado_para', 'enviado_em']
+    search_fields = ['chave', 'chat_id', 'parcela__id']
+    list_filter = ['status', 'plataforma', 'janela', 'data_referencia']
+    readonly_fields = ['chave', 'parcela', 'notificacao', 'janela', 'data_referencia', 'token', 'chat_id', 'plataforma', 'texto', 'parcelas', 'message_id_anterior', 'reenvio', 'tentativas', 'erro', 'message_id', 'criado_em', 'agendado_para', 'shard', 'reservado_em', 'enviado_em']
+
+@admin.register(ExecucaoNotificador)
+class ExecucaoNotificadorAdmin(admin.ModelAdmin):
+    list_display = ['data_referencia', 'iniciado_em', 'varredura_concluida_em', 'finalizado_em', 'ultima_parcela_id']
+    list_filter = ['data_referencia']
+    readonly_fields = ['relatorio']
+
+@admin.register(EntregaNotificacao)
+class EntregaNotificacaoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'parcela', 'notificacao', 'janela', 'envios', 'primeiro_envio', 'ultimo_envio', 'proximo_aviso']
+    search_fields = ['parcela__id', 'notificacao__chat_id__nome']
+    list_filter = ['janela', 'ultimo_envio', 'proximo_aviso']
+    readonly_fields = ['parcela', 'notificacao', 'janela', 'vencimento', 'envios', 'primeiro_envio', 'ultimo_envio', 'message_id']
+
+@admin.register(LeaseNotificador)
+class LeaseNotificadorAdmin(admin.ModelAdmin):
+    list_display = ['recurso', 'dono', 'expira_em', 'renovado_em']
+    search_fields = ['recurso', 'dono']
@@ -8,9 +8,69 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
+import asyncio
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Equivalente a get_asgi_application(): o setup vem antes de importar o que lê as settings
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
\ No newline at end of file
+from core.middleware import ESCOPO_ENVIO_DIRETO, ENVIOS_DIRETOS  # noqa: E402
+
+
+class ASGIHandlerArquivos(ASGIHandler):
+    """
+    ASGIHandler do Django com envio direto de arquivos estáticos.
+
+    Quando o servidor anuncia `http.response.pathsend` ou `http.response.zerocopysend`
+    no scope, o AsyncStaticMiddleware devolve uma RespostaArquivo e o corpo sai pelo
+    próprio servidor (os.sendfile), sem ler o arquivo no Python. Nos demais servidores
+    (ex.: uvicorn) o arquivo segue em streaming pelo aiofiles.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            extensoes = scope.get("extensions") or {}
+            scope[ESCOPO_ENVIO_DIRETO] = next((envio for envio in ENVIOS_DIRETOS if envio in extensoes), None)
+        await super().__call__(scope, receive, send)
+
+    async def send_response(self, response, send):
+        envio = getattr(response, "envio", None)
+        if envio is None:
+            return await super().send_response(response, send)
+
+        # Cabeçalhos e cookies saem pelo Django; só a mensagem final do corpo é trocada
+        # pela extensão do servidor (o streaming fica vazio e o arquivo não é lido aqui)
+        caminho = response.caminho
+        intervalo = response.intervalo
+        response.streaming_content = _corpo_vazio()
+
+        async def enviar(message):
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                if envio == "http.response.pathsend":
+                    message = {"type": envio, "path": caminho}
+                else:
+                    mensagem = {"type": envio, "more_body": False}
+                    if intervalo is not None:
+                        # 206 com um único intervalo: o servidor envia só o trecho pedido
+                        mensagem.update(offset=intervalo.inicio, count=intervalo.tamanho)
+                    # open() pode bloquear (disco lento, NFS): sai do event loop
+                    arquivo = await asyncio.to_thread(open, caminho, "rb")
+                    try:
+                        await send({**mensagem, "file": arquivo})
+                    finally:
+                        arquivo.close()
+                    return
+            await send(message)
+
+        await super().send_response(response, enviar)
+
+
+async def _corpo_vazio():
+    return
+    yield
+
+
+application = ASGIHandlerArquivos()
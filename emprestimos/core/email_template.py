@@ -1,14 +1,112 @@
 import os
+from functools import lru_cache
 from django.core.mail import EmailMultiAlternatives
 from django.core.mail.backends.smtp import EmailBackend
 
-class EmailTemplate(EmailBackend):
-    def send_messages(self, email_messages):
+# Casca HTML dos e-mails, montada uma vez por combinação de SITE_URL/SITE/COPYWRITER:
+# envolver uma mensagem é só concatenar início + conteúdo + fim (usada pelo
+# EmailTemplate e pelo notificador)
+_CASCA_HTML = """
+<!DOCTYPE html>
+<html lang="pt-BR">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <meta name="google" content="notranslate">
+        <meta name="format-detection" content="telephone=no">
+        <meta http-equiv="Content-Language" content="pt-BR">
+    </head>
+    <body style="margin: 0; padding: 0; background-color: #1c1c1e;">
+        <table width="100%" border="0" cellpadding="0" cellspacing="0" style="background-color: #1c1c1e;">
+            <tr>
+                <td>
+                    <table align="center" width="600" border="0" cellpadding="0" cellspacing="0" style="width: 600px; margin: 0 auto; color: #ffffff; font-family: Helvetica, Arial, sans-serif;">
+                        <tr>
+                            <td style="padding: 20px 10px;">
+                                <table width="100%" border="0" cellpadding="0" cellspacing="0">
+                                    <tr>
+                                        <td width="200" align="left">
+                                            <a href="{SITE_URL}">
+                                                <img src="" alt="{SITE}" style="display: block; width: 200px; height: auto;">
+                                            </a>
+                                        </td>
+                                        <td align="right" style="font-size: 14px; color: #bbbbbb;" class="fallback-font">
+                                            <p style="margin: 0; display: inline-block; margin-left: 15px;"><a href="{SITE_URL}" style="color: #bbbbbb; text-decoration: none;" translate="no">HOME</a></p>
+                                        </td>
+                                    </tr>
+                                </table>
+                            </td>
+                        </tr>
+
+                        <tr>
+                            <td style="padding: 20px 10px;">
+                                <table width="100%" border="0" cellpadding="0" cellspacing="0" style="background-color: #2c2c2e; border-radius: 8px;">
+                                    <tr>
+                                        <td style="padding: 40px 30px;">
+                                            <div style="color: #ffffff; font-size: 16px; line-height: 1.5;" class="fallback-font">
+                                                <span style="pointer-events: none;">
+                                                    <font style="vertical-align: inherit;">
+                                                        <font style="vertical-align: inherit;">
+                                                            {conteudo}
+                                                        </font>
+                                                    </font>
+                                                </span>
+                                            </div>
+                                        </td>
+                                    </tr>
+                                </table>
+                            </td>
+                        </tr>
 
-        COPYWRITER = os.getenv("COPYWRITER","")
-        SITE_URL = os.getenv("SITE_URL", "")
-        SITE = os.getenv("SITE", "")
+                        <tr>
+                            <td align="center" style="padding: 10px; font-size: 12px; color: #888888;" class="fallback-font">
+                                <span style="pointer-events: none;">
+                                    <font style="vertical-align: inherit;">
+                                        <font style="vertical-align: inherit;">Este é um e-mail automático. Não responda.</font>
+                                    </font>
+                                </span>
+                            </td>
+                        </tr>
 
+                        <tr>
+                            <td align="center" style="padding: 10px; font-size: 12px; color: #888888;" class="fallback-font">
+                                <span style="pointer-events: none;">
+                                    <font style="vertical-align: inherit;">
+                                        <font style="vertical-align: inherit;">&copy; 2025 {COPYWRITER}. Todos os direitos reservados.</font>
+                                    </font>
+                                </span>
+                            </td>
+                        </tr>
+                    </table>
+                </td>
+            </tr>
+        </table>
+    </body>
+</html>
+"""
+
+@lru_cache(maxsize=8)
+def _compilar_casca(site_url, site, copywriter):
+    casca = _CASCA_HTML.format(SITE_URL=site_url, SITE=site, COPYWRITER=copywriter, conteudo="\0")
+    inicio, fim = casca.split("\0")
+    return inicio, fim
+
+def _casca():
+    # As variáveis são lidas a cada chamada, como antes; só a montagem fica em cache
+    return _compilar_casca(os.getenv("SITE_URL", ""), os.getenv("SITE", ""), os.getenv("COPYWRITER", ""))
+
+ESTILO_LINK = '<a style="color: #70ff70; text-decoration: underline; font-weight: bold;" '
+
+def estilizar_links(conteudo):
+    return conteudo.replace('<a ', ESTILO_LINK)
+
+def envolver_html(conteudo):
+    """Documento HTML completo do e-mail com `conteudo` (fragmento HTML) no corpo."""
+    inicio, fim = _casca()
+    return inicio + estilizar_links(conteudo) + fim
+
+class EmailTemplate(EmailBackend):
+    def send_messages(self, email_messages):
         for message in email_messages:
             if isinstance(message, EmailMultiAlternatives):
                 if (hasattr(message, 'alternatives') and isinstance(message.alternatives, list) and len(message.alternatives) > 0 and isinstance(message.alternatives[0], (list, tuple)) and len(message.alternatives[0]) >= 2 and message.alternatives[0][0].strip()):
@@ -16,86 +114,8 @@ class EmailTemplate(EmailBackend):
                     message.alternatives = []
                 elif message.body:
                     original_html = message.body.replace('\n', '<br>')
+                else:
+                    continue
 
-                original_html = original_html.replace('<a ', '<a style="color: #70ff70; text-decoration: underline; font-weight: bold;" ')
-
-                html_content = f"""
-                <!DOCTYPE html>
-                <html lang="pt-BR">
-                    <head>
-                        <meta charset="UTF-8">
-                        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                        <meta name="google" content="notranslate">
-                        <meta name="format-detection" content="telephone=no">
-                        <meta http-equiv="Content-Language" content="pt-BR">
-                    </head>
-                    <body style="margin: 0; padding: 0; background-color: #1c1c1e;">
-                        <table width="100%" border="0" cellpadding="0" cellspacing="0" style="background-color: #1c1c1e;">
-                            <tr>
-                                <td>
-                                    <table align="center" width="600" border="0" cellpadding="0" cellspacing="0" style="width: 600px; margin: 0 auto; color: #ffffff; font-family: Helvetica, Arial, sans-serif;">
-                                        <tr>
-                                            <td style="padding: 20px 10px;">
-                                                <table width="100%" border="0" cellpadding="0" cellspacing="0">
-                                                    <tr>
-                                                        <td width="200" align="left">
-                                                            <a href="{SITE_URL}">
-                                                                <img src="" alt="{SITE}" style="display: block; width: 200px; height: auto;">
-                                                            </a>
-                                                        </td>
-                                                        <td align="right" style="font-size: 14px; color: #bbbbbb;" class="fallback-font">
-                                                            <p style="margin: 0; display: inline-block; margin-left: 15px;"><a href="{SITE_URL}" style="color: #bbbbbb; text-decoration: none;" translate="no">HOME</a></p>
-                                                        </td>
-                                                    </tr>
-                                                </table>
-                                            </td>
-                                        </tr>
-
-                                        <tr>
-                                            <td style="padding: 20px 10px;">
-                                                <table width="100%" border="0" cellpadding="0" cellspacing="0" style="background-color: #2c2c2e; border-radius: 8px;">
-                                                    <tr>
-                                                        <td style="padding: 40px 30px;">
-                                                            <div style="color: #ffffff; font-size: 16px; line-height: 1.5;" class="fallback-font">
-                                                                <span style="pointer-events: none;">
-                                                                    <font style="vertical-align: inherit;">
-                                                                        <font style="vertical-align: inherit;">
-                                                                            {original_html}
-                                                                        </font>
-                                                                    </font>
-                                                                </span>
-                                                            </div>
-                                                        </td>
-                                                    </tr>
-                                                </table>
-                                            </td>
-                                        </tr>
-
-                                        <tr>
-                                            <td align="center" style="padding: 10px; font-size: 12px; color: #888888;" class="fallback-font">
-                                                <span style="pointer-events: none;">
-                                                    <font style="vertical-align: inherit;">
-                                                        <font style="vertical-align: inherit;">Este é um e-mail automático. Não responda.</font>
-                                                    </font>
-                                                </span>
-                                            </td>
-                                        </tr>
-
-                                        <tr>
-                                            <td align="center" style="padding: 10px; font-size: 12px; color: #888888;" class="fallback-font">
-                                                <span style="pointer-events: none;">
-                                                    <font style="vertical-align: inherit;">
-                                                        <font style="vertical-align: inherit;">&copy; 2025 {COPYWRITER}. Todos os direitos reservados.</font>
-                                                    </font>
-                                                </span>
-                                            </td>
-                                        </tr>
-                                    </table>
-                                </td>
-                            </tr>
-                        </table>
-                    </body>
-                </html>
-                """
-                message.attach_alternative(html_content, "text/html")
-        return super().send_messages(email_messages)
\ No newline at end of file
+                message.attach_alternative(envolver_html(original_html), "text/html")
+        return super().send_messages(email_messages)
@@ -1,12 +1,17 @@
 """
 AsyncStaticMiddleware - Ultra-performático para Django 6.x
-Serve arquivos estáticos de forma assíncrona com suporte a gzip pré-compactado.
+Serve arquivos estáticos de forma assíncrona com variantes pré-compactadas (br, zstd, gzip).
 
 Otimizações:
 - Cache inteligente de metadados com limite de memória
 - Streaming assíncrono com chunks otimizados
 - Suporte a ETag e Last-Modified (304 responses)
-- Detecção automática de arquivos .gz (WhiteNoise compatible)
+- Detecção automática de arquivos .br/.zst/.gz (WhiteNoise + core.storage)
+- Negociação por Accept-Encoding (q-values), servindo a menor variante aceita
+- Requisições parciais (Range/If-Range, 206 e 416) via core.ranges
+- Envio direto pelo servidor (ASGI pathsend/zerocopysend) quando anunciado
+- Cache LRU em memória do conteúdo de arquivos pequenos (sem I/O de disco)
+- Índice imutável de STATIC_ROOT montado no startup (staticfiles.json + varredura)
 """
 
 # ============================================================================
@@ -14,17 +19,24 @@ Otimizações:
 # ============================================================================
 import os
 import sys
+import json
+import time
 import logging
 import aiofiles
 import mimetypes
+from stat import S_ISREG
+from functools import lru_cache
+from collections import OrderedDict
 from django.conf import settings
-from typing import Optional, Tuple
+from typing import NamedTuple, Optional
 from django.utils._os import safe_join
 from django.utils.http import http_date
+from django.middleware.gzip import GZipMiddleware
 from email.utils import parsedate_to_datetime
 from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
-from django.http import StreamingHttpResponse, HttpResponseNotModified, HttpResponseNotFound
+from django.http import HttpResponse, StreamingHttpResponse, HttpResponseNotModified, HttpResponseNotFound
+from .ranges import intervalos_pedidos, planejar, aplicar_plano, resposta_416, corpo_de_bytes, corpo_de_arquivo
 
 
 # ============================================================================
@@ -32,6 +44,39 @@ from django.http import StreamingHttpResponse, HttpResponseNotModified, HttpResp
 # ============================================================================
 logger = logging.getLogger("django.request")
 
+# Chave do scope com a extensão ASGI de envio direto de arquivos disponível na conexão
+# (preenchida por core.asgi.ASGIHandlerArquivos; None quando o servidor não anuncia nenhuma)
+ESCOPO_ENVIO_DIRETO = "emprestimos.envio_direto"
+ENVIOS_DIRETOS = ("http.response.pathsend", "http.response.zerocopysend")
+
+# Variantes pré-compactadas geradas pelo collectstatic: sufixo do arquivo -> Content-Encoding
+COMPRESSED_VARIANTS = {".br": "br", ".zst": "zstd", ".gz": "gzip"}
+
+
+@lru_cache(maxsize=512)
+def parse_accept_encoding(header: str) -> dict:
+    """
+    Interpreta o Accept-Encoding com q-values (RFC 9110).
+    
+    Ex.: "gzip, br;q=0.9, *;q=0" -> {"gzip": 1.0, "br": 0.9, "*": 0.0}
+    """
+    codings = {}
+    for part in header.lower().split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings["gzip" if coding == "x-gzip" else coding] = q
+    return codings
+
 # Exposes the active AsyncStaticMiddleware instance for diagnostics.
 _ASYNC_STATIC_MIDDLEWARE = None
 
@@ -40,6 +85,64 @@ def get_async_static_middleware():
     return _ASYNC_STATIC_MIDDLEWARE
 
 
+# ============================================================================
+# RESPONSE
+# ============================================================================
+
+class RespostaArquivo(StreamingHttpResponse):
+    """
+    StreamingHttpResponse de um arquivo estático que o servidor ASGI pode enviar
+    direto do disco (os.sendfile), sem passar os bytes pelo Python.
+
+    `envio` é a extensão ASGI a usar (ver ESCOPO_ENVIO_DIRETO) ou None. O corpo em
+    streaming continua disponível como fallback: se outro middleware substituir o
+    conteúdo (ex.: GZipMiddleware), o envio direto é desligado. `intervalo` limita o
+    envio a um trecho do arquivo (206 com um único Range; só no zerocopysend).
+    """
+    def __init__(self, caminho, streaming_content, envio=None, *args, intervalo=None, **kwargs):
+        super().__init__(streaming_content, *args, **kwargs)
+        self.caminho = caminho
+        self.envio = envio
+        self.intervalo = intervalo
+
+    def _set_streaming_content(self, value):
+        if hasattr(self, "envio"):
+            self.envio = None
+        super()._set_streaming_content(value)
+
+
+class RangeAwareGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware que não mexe em respostas parciais nem nas que aceitam Range.
+
+    Comprimir um 206/416 quebraria o Content-Range, e uma resposta que anuncia
+    Accept-Ranges (arquivos estáticos, comprovantes de core.ranges) tem os intervalos
+    contados sobre o conteúdo original: comprimida, o próximo Range pediria bytes errados.
+    Uma RespostaArquivo já foi negociada pelo AsyncStaticMiddleware (variantes .br/.zst/.gz)
+    e perderia o envio direto se o corpo fosse trocado pelo gzip em streaming.
+    """
+    def process_response(self, request, response):
+        if (response.status_code in (206, 416) or isinstance(response, RespostaArquivo)
+                or response.has_header("Accept-Ranges")):
+            return response
+        return super().process_response(request, response)
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+class StaticFileEntry(NamedTuple):
+    """Arquivo de STATIC_ROOT no índice do startup, com tudo que a resposta precisa."""
+    path: str                 # caminho absoluto servido
+    stat: os.stat_result
+    etag: str
+    content_type: str
+    headers: tuple            # ((nome, valor), ...) prontos para a resposta
+    immutable: bool           # nome com hash do manifest: conteúdo nunca muda
+    variants: dict            # encoding -> StaticFileEntry pré-compactado ('br', 'zstd', 'gzip')
+
+
 # ============================================================================
 # MIDDLEWARE
 # ============================================================================
@@ -51,7 +154,8 @@ class AsyncStaticMiddleware:
     Features:
     - 100% assíncrono (ASGI nativo)
     - Cache inteligente de metadados com limite de memória
-    - Suporte automático a gzip (arquivos .gz)
+    - Cache LRU do conteúdo de arquivos pequenos (original e .gz)
+    - Variantes pré-compactadas (.br, .zst, .gz) negociadas por Accept-Encoding
     - Validação HTTP (ETag + Last-Modified)
     - Streaming eficiente com aiofiles
     - Headers otimizados para CDN
@@ -86,19 +190,35 @@ class AsyncStaticMiddleware:
         self._file_cache = {}
         self._cache_memory_bytes = 0
         
+        # Índice do startup: rel_path -> StaticFileEntry (None = descoberta sob demanda)
+        self._index = None
+        self._index_build_ms = 0.0
+        
+        # Cache de conteúdo (LRU): serve_path -> (bytes, mtime, tamanho)
+        self._content_cache = OrderedDict()
+        self._content_cache_bytes = 0
+        
         # Estatísticas de performance
         self._cache_hits = 0
         self._cache_misses = 0
         self._total_requests = 0
+        self._direct_sends = 0
+        self._content_hits = 0
+        self._content_evictions = 0
         
         # Validação de configuração
         self._validate_settings()
         
+        if self.use_index:
+            self._build_index()
+        
         # Log de inicialização
         logger.info(
             f"[AsyncStatic] Inicializado - "
             f"Cache: {self.max_cache_memory_mb}MB / {self.max_cache_entries} entradas | "
-            f"Chunk: {self.chunk_size // 1024}KB"
+            f"Conteúdo: {self.content_cache_memory_mb}MB (até {self.content_cache_max_file_size // 1024}KB/arquivo) | "
+            f"Chunk: {self.chunk_size // 1024}KB | "
+            f"Índice: {f'{len(self._index)} arquivos' if self._index is not None else 'desligado'}"
         )
     
     def _load_config(self):
@@ -118,6 +238,10 @@ class AsyncStaticMiddleware:
         self.max_cache_memory_mb = storage_config.get('MAX_CACHE_MEMORY_MB', 5)
         self.avg_cache_entry_size = storage_config.get('AVG_CACHE_ENTRY_SIZE', 320)
         self.debug_logging = storage_config.get('DEBUG_LOGGING', False)
+        self.zero_copy = storage_config.get('ZERO_COPY', True)
+        self.use_index = storage_config.get('INDEX', True)
+        self.content_cache_memory_mb = storage_config.get('CONTENT_CACHE_MEMORY_MB', 32)
+        self.content_cache_max_file_size = storage_config.get('CONTENT_CACHE_MAX_FILE_SIZE', 65536)
         
         # Calcula max entries
         self.max_cache_entries = int(
@@ -170,6 +294,15 @@ class AsyncStaticMiddleware:
         # Extrai path relativo
         rel_path = request.path[len(static_url):].lstrip('/')
         
+        # Com o índice, o que não está nele não existe (404 sem tocar o disco) e
+        # arquivos com hash são servidos sem revalidar no disco
+        if self._index is not None:
+            entry = self._index.get(rel_path)
+            if entry is None:
+                return HttpResponseNotFound()
+            if entry.immutable:
+                return await self._serve_entry(request, entry)
+        
         # Proteção contra path traversal
         try:
             full_path = safe_join(str(settings.STATIC_ROOT), rel_path)
@@ -178,48 +311,182 @@ class AsyncStaticMiddleware:
             return HttpResponseNotFound()
         
         # Busca arquivo (com cache inteligente)
-        file_info = await self._get_file_info(full_path, request)
+        entry = await self._get_file_info(full_path, rel_path)
         
-        if file_info is None:
+        if entry is None:
             # Arquivo não encontrado - retorna 404
             return HttpResponseNotFound()
         
-        serve_path, is_compressed, stat_result = file_info
+        response = await self._serve_entry(request, entry)
+        
+        if self.debug_logging:
+            logger.debug(
+                f"[AsyncStatic] Servindo: {rel_path} | "
+                f"Encoding: {response.get('Content-Encoding', 'identity')} | "
+                f"Tamanho: {entry.stat.st_size // 1024}KB"
+            )
+        
+        return response
+    
+    async def _serve_entry(self, request, entry: StaticFileEntry):
+        """Escolhe a variante, valida o cache HTTP (304), trata Range e monta a resposta."""
+        entry = self._choose_variant(request, entry)
         
         # Validação de cache HTTP (retorna 304 se não modificado)
-        if self._should_return_304(request, stat_result):
+        if self._should_return_304(request, entry.stat, entry.etag):
             response = HttpResponseNotModified()
-            response["ETag"] = self._generate_etag(stat_result)
+            response["ETag"] = entry.etag
+            # O 304 repete o Vary da resposta completa, para caches intermediários
+            for header, value in entry.headers:
+                if header == "Vary":
+                    response[header] = value
             return response
         
-        # Cria response com streaming assíncrono
-        response = StreamingHttpResponse(
-            self._async_file_iterator(serve_path),
-            content_type=self._get_content_type(full_path)
-        )
-        
-        # Configura headers de cache e performance
-        self._set_response_headers(response, stat_result, is_compressed, rel_path)
+        # Range/If-Range sobre a variante escolhida (o ETag dela valida o If-Range)
+        intervalos = intervalos_pedidos(request, entry.stat.st_size, entry.etag, entry.stat.st_mtime)
+        if intervalos == []:
+            return resposta_416(entry.stat.st_size)
         
-        if self.debug_logging:
-            logger.debug(
-                f"[AsyncStatic] Servindo: {rel_path} | "
-                f"Gzip: {is_compressed} | "
-                f"Tamanho: {stat_result.st_size // 1024}KB"
+        return await self._build_response(request, entry, intervalos)
+    
+    def _choose_variant(self, request, entry: StaticFileEntry) -> StaticFileEntry:
+        """
+        Menor variante pré-compactada aceita pelo cliente (q > 0 no Accept-Encoding,
+        direto ou via "*"); sem nenhuma aceita, o arquivo original.
+        """
+        if not entry.variants:
+            return entry
+        codings = parse_accept_encoding(request.headers.get("Accept-Encoding", ""))
+        if not codings:
+            return entry
+        default_q = codings.get("*", 0.0)
+        best = entry
+        for encoding, variant in entry.variants.items():
+            if codings.get(encoding, default_q) > 0 and variant.stat.st_size < best.stat.st_size:
+                best = variant
+        return best
+    
+    async def _build_response(self, request, entry: StaticFileEntry, intervalos: Optional[list] = None):
+        """
+        Monta a resposta do arquivo: da memória (arquivos pequenos), pelo envio direto
+        do servidor ASGI ou em streaming. Com `intervalos`, vira um 206 que só lê (ou
+        envia) os trechos pedidos.
+        """
+        plano = planejar(intervalos, entry.stat.st_size, entry.content_type) if intervalos else None
+        
+        # Arquivos pequenos saem da memória, numa única resposta sem I/O de disco
+        content = await self._get_cached_content(entry.path, entry.stat)
+        if content is not None:
+            body = corpo_de_bytes(content, plano) if plano else content
+            response = HttpResponse(body, content_type=entry.content_type)
+        else:
+            # Cria response com streaming assíncrono; com pathsend/zerocopysend o servidor
+            # envia o arquivo direto e o iterador nem chega a ser consumido. Um intervalo
+            # único ainda vai direto pelo zerocopysend (offset/count); o pathsend só envia
+            # o arquivo inteiro e o multipart sempre sai em streaming
+            envio = getattr(request, "scope", {}).get(ESCOPO_ENVIO_DIRETO) if self.zero_copy else None
+            if plano and (len(intervalos) > 1 or envio != "http.response.zerocopysend"):
+                envio = None
+            if envio:
+                self._direct_sends += 1
+            response = RespostaArquivo(
+                entry.path,
+                corpo_de_arquivo(entry.path, plano, self.chunk_size) if plano else self._async_file_iterator(entry.path),
+                envio=envio,
+                intervalo=intervalos[0] if plano else None,
+                content_type=entry.content_type
             )
         
+        # Configura headers de cache e performance
+        for header, value in entry.headers:
+            response[header] = value
+        if plano:
+            aplicar_plano(response, plano)
         return response
     
+    def _build_index(self):
+        """
+        Monta o índice imutável de STATIC_ROOT no startup.
+        
+        Percorre STATIC_ROOT uma vez e registra cada arquivo com stat, ETag,
+        Content-Type, variantes pré-compactadas e headers prontos. Os nomes com hash
+        listados no staticfiles.json (ManifestStaticFilesStorage) são marcados como
+        imutáveis e nunca revalidados; os demais seguem a revalidação por mtime.
+        As variantes (.br/.zst/.gz) também entram como arquivos comuns, para que a URL
+        direta delas continue respondendo como sem o índice.
+        Arquivos criados depois do startup só aparecem ao reiniciar o processo.
+        """
+        static_root = str(settings.STATIC_ROOT)
+        if not os.path.isdir(static_root):
+            return
+        
+        inicio = time.perf_counter()
+        hashed = set()
+        try:
+            with open(os.path.join(static_root, "staticfiles.json"), encoding="utf-8") as f:
+                hashed = set(json.load(f).get("paths", {}).values())
+        except (OSError, ValueError) as e:
+            logger.warning(f"[AsyncStatic] Manifest de estáticos indisponível ({e}); nenhum arquivo marcado como imutável")
+        
+        index = {}
+        for dirpath, _, filenames in os.walk(static_root):
+            names = set(filenames)
+            for name in filenames:
+                full_path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(full_path, static_root).replace(os.sep, "/")
+                suffixes = [suffix for suffix in COMPRESSED_VARIANTS if name + suffix in names]
+                try:
+                    index[rel_path] = self._make_entry(full_path, rel_path, rel_path in hashed, suffixes)
+                except OSError:
+                    continue
+        
+        self._index = index
+        self._index_build_ms = (time.perf_counter() - inicio) * 1000
+    
+    def _make_entry(self, full_path: str, rel_path: str, immutable: bool, suffixes=COMPRESSED_VARIANTS) -> StaticFileEntry:
+        """
+        Entrada do arquivo com as variantes pré-compactadas de `suffixes` que existirem.
+        
+        Raises:
+            OSError: arquivo inexistente ou que não é arquivo regular
+        """
+        variants = {}
+        for suffix in suffixes:
+            encoding = COMPRESSED_VARIANTS[suffix]
+            try:
+                variants[encoding] = self._index_entry(full_path + suffix, rel_path, immutable, encoding)
+            except OSError:
+                continue
+        entry = self._index_entry(full_path, rel_path, immutable, None, vary=bool(variants))
+        entry.variants.update(variants)
+        return entry
+    
+    def _index_entry(self, serve_path: str, rel_path: str, immutable: bool, encoding: Optional[str], vary: bool = False) -> StaticFileEntry:
+        stat_result = os.stat(serve_path)
+        if not S_ISREG(stat_result.st_mode):
+            raise IsADirectoryError(serve_path)
+        return StaticFileEntry(
+            path=serve_path,
+            stat=stat_result,
+            etag=self._generate_etag(stat_result),
+            content_type=self._get_content_type(rel_path),
+            headers=tuple(self._build_headers(stat_result, encoding, rel_path, vary)),
+            immutable=immutable,
+            variants={},
+        )
+    
     async def _get_file_info(
         self, 
         full_path: str, 
-        request
-    ) -> Optional[Tuple[str, bool, os.stat_result]]:
+        rel_path: str
+    ) -> Optional[StaticFileEntry]:
         """
         Busca informações do arquivo com cache otimizado.
         
         Retorna:
-            Tupla (caminho_arquivo, is_gzip, stat_result) ou None se não encontrado
+            StaticFileEntry (com as variantes .br/.zst/.gz existentes) ou None se não encontrado.
+            A variante servida é escolhida por requisição (_choose_variant), então a mesma
+            entrada atende clientes com e sem compressão.
         
         Cache Strategy:
             - Cache hit: Valida mtime e retorna dados cacheados
@@ -231,15 +498,15 @@ class AsyncStaticMiddleware:
         # ===== CACHE HIT =====
         if cache_key in self._file_cache:
             self._cache_hits += 1
-            cached_path, cached_compressed, cached_stat = self._file_cache[cache_key]
+            cached_entry = self._file_cache[cache_key]
             
             # Revalidação rápida: verifica se arquivo foi modificado
             try:
-                current_mtime = os.path.getmtime(cached_path)
+                current_mtime = os.path.getmtime(cached_entry.path)
                 
                 # Tolerância de 10ms para sistemas de arquivos
-                if abs(current_mtime - cached_stat.st_mtime) < 0.01:
-                    return self._file_cache[cache_key]
+                if abs(current_mtime - cached_entry.stat.st_mtime) < 0.01:
+                    return cached_entry
                 
                 # Arquivo modificado - remove do cache
                 self._evict_from_cache(cache_key)
@@ -252,56 +519,34 @@ class AsyncStaticMiddleware:
         # ===== CACHE MISS =====
         self._cache_misses += 1
         
-        # Detecta suporte a gzip do cliente
-        accept_encoding = request.headers.get("Accept-Encoding", "")
-        supports_gzip = "gzip" in accept_encoding.lower()
-        
-        serve_path = full_path
-        is_compressed = False
-        
-        # Prioriza arquivo .gz se disponível e cliente suporta
-        if supports_gzip:
-            gz_path = full_path + ".gz"
-            try:
-                if os.path.isfile(gz_path):
-                    serve_path = gz_path
-                    is_compressed = True
-                    
-                    if self.debug_logging:
-                        logger.debug(f"[AsyncStatic] ✅ Gzip encontrado: {gz_path}")
-            except OSError:
-                pass
-        
-        # Verifica se arquivo existe e obtém metadados
+        # Verifica se arquivo existe (regular, não diretório) e obtém metadados das variantes
         try:
-            stat_result = os.stat(serve_path)
-            
-            # Garante que é arquivo regular (não diretório)
-            if not os.path.isfile(serve_path):
-                return None
-                
-        except (OSError, IOError):
+            entry = self._make_entry(full_path, rel_path, immutable=False)
+        except OSError:
             if self.debug_logging:
-                logger.debug(f"[AsyncStatic] ❌ Não encontrado: {serve_path}")
+                logger.debug(f"[AsyncStatic] ❌ Não encontrado: {full_path}")
             return None
         
+        if self.debug_logging and entry.variants:
+            logger.debug(f"[AsyncStatic] ✅ Variantes encontradas: {full_path} ({', '.join(entry.variants)})")
+        
         # ===== ATUALIZA CACHE =====
-        file_info = (serve_path, is_compressed, stat_result)
-        self._add_to_cache(cache_key, file_info)
+        self._add_to_cache(cache_key, entry)
         
-        return file_info
+        return entry
     
-    def _add_to_cache(self, cache_key: str, file_info: Tuple):
+    def _add_to_cache(self, cache_key: str, entry: StaticFileEntry):
         """
         Adiciona entrada ao cache respeitando limite de memória.
         Implementa eviction FIFO quando limite é atingido.
         """
-        # Calcula tamanho da nova entrada
-        entry_size = (
-            sys.getsizeof(cache_key) +
-            sys.getsizeof(file_info) +
-            sys.getsizeof(file_info[0]) +  # serve_path
-            sys.getsizeof(file_info[2])    # stat_result
+        # Calcula tamanho da nova entrada (arquivo original e variantes)
+        entry_size = sys.getsizeof(cache_key) + sum(
+            sys.getsizeof(item) +
+            sys.getsizeof(item.path) +
+            sys.getsizeof(item.stat) +
+            sys.getsizeof(item.headers)
+            for item in (entry, *entry.variants.values())
         )
         
         max_bytes = self.max_cache_memory_mb * 1024 * 1024
@@ -321,7 +566,7 @@ class AsyncStaticMiddleware:
             self._evict_from_cache(oldest_key)
         
         # Adiciona ao cache
-        self._file_cache[cache_key] = file_info
+        self._file_cache[cache_key] = entry
         self._cache_memory_bytes += entry_size
     
     def _evict_from_cache(self, cache_key: str):
@@ -334,6 +579,57 @@ class AsyncStaticMiddleware:
                 self._cache_memory_bytes - self.avg_cache_entry_size
             )
     
+    async def _get_cached_content(self, serve_path: str, stat_result: os.stat_result) -> Optional[bytes]:
+        """
+        Conteúdo de arquivos até CONTENT_CACHE_MAX_FILE_SIZE, mantido em memória.
+        
+        A entrada vale enquanto mtime e tamanho baterem com o stat do arquivo
+        (revalidado pelo cache de metadados). Na falta, o arquivo é lido uma vez
+        e guardado; o orçamento de memória conta os bytes reais de cada entrada
+        e as menos usadas recentemente saem primeiro (LRU).
+        
+        Returns:
+            bytes do arquivo, ou None se ele não cabe no cache
+        """
+        size = stat_result.st_size
+        if size > self.content_cache_max_file_size or not self.content_cache_memory_mb:
+            return None
+        
+        entry = self._content_cache.get(serve_path)
+        if entry is not None:
+            content, mtime, cached_size = entry
+            if mtime == stat_result.st_mtime and cached_size == size:
+                self._content_cache.move_to_end(serve_path)
+                self._content_hits += 1
+                return content
+            self._evict_content(serve_path)
+        
+        try:
+            async with aiofiles.open(serve_path, mode='rb') as f:
+                content = await f.read()
+        except OSError as e:
+            logger.error(f"[AsyncStatic] Erro ao ler arquivo {serve_path}: {e}")
+            return None
+        if len(content) != size:
+            # Arquivo mudou entre o stat e a leitura: serve sem cachear
+            return None
+        
+        entry_size = sys.getsizeof(content) + sys.getsizeof(serve_path)
+        max_bytes = self.content_cache_memory_mb * 1024 * 1024
+        while self._content_cache and self._content_cache_bytes + entry_size > max_bytes:
+            self._evict_content(next(iter(self._content_cache)))
+            self._content_evictions += 1
+        if entry_size <= max_bytes:
+            self._content_cache[serve_path] = (content, stat_result.st_mtime, size)
+            self._content_cache_bytes += entry_size
+        return content
+    
+    def _evict_content(self, serve_path: str):
+        """Remove entrada do cache de conteúdo e desconta seus bytes."""
+        entry = self._content_cache.pop(serve_path, None)
+        if entry is not None:
+            self._content_cache_bytes -= sys.getsizeof(entry[0]) + sys.getsizeof(serve_path)
+    
     async def _async_file_iterator(self, file_path: str):
         """
         Generator assíncrono otimizado para streaming de arquivos.
@@ -362,7 +658,7 @@ class AsyncStaticMiddleware:
             )
             raise
     
-    def _should_return_304(self, request, stat_result: os.stat_result) -> bool:
+    def _should_return_304(self, request, stat_result: os.stat_result, etag: Optional[str] = None) -> bool:
         """
         Verifica se deve retornar 304 Not Modified.
         
@@ -373,6 +669,7 @@ class AsyncStaticMiddleware:
         Args:
             request: HttpRequest do Django
             stat_result: Metadados do arquivo (os.stat_result)
+            etag: ETag já calculado (índice), para não gerar de novo
             
         Returns:
             True se deve retornar 304, False caso contrário
@@ -380,7 +677,7 @@ class AsyncStaticMiddleware:
         # ===== VALIDAÇÃO POR ETAG (preferencial) =====
         if_none_match = request.headers.get("If-None-Match")
         if if_none_match:
-            current_etag = self._generate_etag(stat_result)
+            current_etag = etag or self._generate_etag(stat_result)
             
             # Suporta múltiplos ETags (separados por vírgula)
             client_etags = [tag.strip().strip('"') for tag in if_none_match.split(',')]
@@ -482,48 +779,59 @@ class AsyncStaticMiddleware:
         
         return mime_map.get(ext, 'application/octet-stream')
     
-    def _set_response_headers(
+    def _build_headers(
         self,
-        response,
         stat_result: os.stat_result,
-        is_compressed: bool,
-        rel_path: str
-    ):
+        encoding: Optional[str],
+        rel_path: str,
+        vary: bool = False
+    ) -> list:
         """
-        Configura headers HTTP otimizados para CDN e cache.
+        Monta os headers HTTP otimizados para CDN e cache.
         
         Headers configurados:
         - Cache validation: ETag, Last-Modified
         - Cache strategy: Cache-Control
-        - Compression: Content-Encoding, Vary
-        - Size: Content-Length
+        - Compression: Content-Encoding, Vary (também na versão sem compressão
+          quando existem variantes, para caches não servirem a versão errada)
+        - Size: Content-Length, Accept-Ranges
         - Security: X-Content-Type-Options
         - CORS: Access-Control-Allow-Origin (para fontes)
+        
+        Returns:
+            Lista de pares (header, valor), na ordem em que são aplicados
         """
         # ===== VALIDAÇÃO DE CACHE =====
-        response["ETag"] = self._generate_etag(stat_result)
-        response["Last-Modified"] = http_date(stat_result.st_mtime)
+        headers = [
+            ("ETag", self._generate_etag(stat_result)),
+            ("Last-Modified", http_date(stat_result.st_mtime)),
+        ]
         
         # ===== ESTRATÉGIA DE CACHE =====
         # Usa configuração carregada de settings.STATIC_MIDDLEWARE
-        response["Cache-Control"] = self.cache_control
+        headers.append(("Cache-Control", self.cache_control))
         
         # ===== COMPRESSÃO =====
-        if is_compressed:
-            response["Content-Encoding"] = "gzip"
-            response["Vary"] = "Accept-Encoding"
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+        if encoding or vary:
+            headers.append(("Vary", "Accept-Encoding"))
         
         # ===== TAMANHO DO CONTEÚDO =====
         # Crítico para performance: permite browser calcular progresso
-        response["Content-Length"] = stat_result.st_size
+        headers.append(("Content-Length", str(stat_result.st_size)))
+        # Downloads retomáveis e leitores de PDF/vídeo buscando trechos (206)
+        headers.append(("Accept-Ranges", "bytes"))
         
         # ===== SECURITY HEADERS =====
-        response["X-Content-Type-Options"] = "nosniff"
+        headers.append(("X-Content-Type-Options", "nosniff"))
         
         # ===== CORS PARA FONTES =====
         # Permite uso cross-origin de web fonts
         if self._is_font_file(rel_path):
-            response["Access-Control-Allow-Origin"] = self.cors_origin_fonts
+            headers.append(("Access-Control-Allow-Origin", self.cors_origin_fonts))
+        
+        return headers
     
     def _is_font_file(self, path: str) -> bool:
         """Verifica se é arquivo de web font."""
@@ -567,7 +875,21 @@ class AsyncStaticMiddleware:
             'cache_hits': self._cache_hits,
             'cache_misses': self._cache_misses,
             'hit_rate_percent': round(hit_rate, 2),
+            'direct_sends': self._direct_sends,
+            
+            # Startup index
+            'index_entries': len(self._index) if self._index is not None else None,
+            'index_immutable': sum(entry.immutable for entry in self._index.values()) if self._index is not None else None,
+            'index_build_ms': round(self._index_build_ms, 2),
+            
+            # Content cache
+            'content_cache_entries': len(self._content_cache),
+            'content_cache_memory_mb': round(self._content_cache_bytes / (1024 * 1024), 2),
+            'content_cache_max_memory_mb': self.content_cache_memory_mb,
+            'content_cache_hits': self._content_hits,
+            'content_cache_evictions': self._content_evictions,
             
             # Configuration
             'chunk_size_kb': self.chunk_size // 1024,
+            'zero_copy': self.zero_copy,
         }
\ No newline at end of file
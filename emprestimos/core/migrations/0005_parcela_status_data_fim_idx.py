@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_emprestimo_parcelas_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parcela',
+            index=models.Index(fields=['status', 'data_fim'], name='core_parcela_status_fim_idx'),
+        ),
+    ]
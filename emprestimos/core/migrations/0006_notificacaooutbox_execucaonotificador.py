@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_parcela_status_data_fim_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecucaoNotificador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_referencia', models.DateField(unique=True)),
+                ('iniciado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('varredura_concluida_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificacaoOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=255, unique=True)),
+                ('janela', models.SmallIntegerField(help_text='Dias até o vencimento (-1 = vencida)')),
+                ('data_referencia', models.DateField()),
+                ('token', models.CharField(max_length=255)),
+                ('chat_id', models.CharField(max_length=255)),
+                ('plataforma', models.CharField(choices=[('telegram', 'Telegram'), ('discord', 'Discord')], default='telegram', max_length=10)),
+                ('texto', models.TextField()),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('falha', 'Falha')], default='pendente', max_length=10)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('message_id', models.CharField(blank=True, max_length=64, null=True)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reservado_em', models.DateTimeField(blank=True, null=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+                ('notificacao', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.notificacao')),
+                ('parcela', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.parcela')),
+            ],
+            options={
+                'db_table': 'core_notification_outbox',
+                'indexes': [models.Index(fields=['data_referencia', 'status'], name='core_outbox_data_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_notificacaooutbox_execucaonotificador'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucaonotificador',
+            name='ultima_parcela_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='fim_envio',
+            field=models.TimeField(default=datetime.time(20, 0), help_text='Fim da janela de envio (horário local). Se menor que o início, a janela atravessa a meia-noite'),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='inicio_envio',
+            field=models.TimeField(default=datetime.time(8, 0), help_text='Início da janela de envio (horário local)'),
+        ),
+        migrations.AddField(
+            model_name='notificacaooutbox',
+            name='agendado_para',
+            field=models.DateTimeField(blank=True, help_text='Envio não antes deste horário (vazio = imediato)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='notificacaooutbox',
+            name='status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('falha', 'Falha'), ('expirado', 'Expirado')], default='pendente', max_length=10),
+        ),
+    ]
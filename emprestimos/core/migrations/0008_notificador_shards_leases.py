@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_notificacao_janela_envio_outbox_agendamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaseNotificador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurso', models.CharField(max_length=100, unique=True)),
+                ('dono', models.CharField(max_length=100)),
+                ('expira_em', models.DateTimeField()),
+                ('renovado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'core_notificador_lease',
+            },
+        ),
+        migrations.AddField(
+            model_name='notificacaooutbox',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='notificacaooutbox',
+            index=models.Index(fields=['data_referencia', 'shard', 'status'], name='core_outbox_data_shard_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_notificador_shards_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='modo_envio',
+            field=models.CharField(choices=[('individual', 'Uma mensagem por parcela'), ('resumo', 'Resumo agrupado')], default='individual', help_text='Resumo agrupa as parcelas do dia em poucas mensagens', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notificacaooutbox',
+            name='parcelas',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
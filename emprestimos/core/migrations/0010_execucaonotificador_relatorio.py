@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_notificacao_modo_envio_outbox_parcelas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucaonotificador',
+            name='relatorio',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_execucaonotificador_relatorio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='vencidas_diarias',
+            field=models.PositiveSmallIntegerField(default=7, help_text='Por quantos dias após o vencimento a parcela vencida é lembrada todo dia'),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='vencidas_intervalo',
+            field=models.PositiveSmallIntegerField(default=7, help_text='Depois disso, intervalo em dias entre os lembretes (0 = não lembrar mais)'),
+        ),
+        migrations.CreateModel(
+            name='EntregaNotificacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('janela', models.SmallIntegerField(help_text='Dias até o vencimento (-1 = vencida)')),
+                ('vencimento', models.DateTimeField(help_text='data_fim da parcela quando foi avisada; se mudar, a parcela volta a ser avisada')),
+                ('envios', models.PositiveIntegerField(default=0)),
+                ('primeiro_envio', models.DateField()),
+                ('ultimo_envio', models.DateField()),
+                ('proximo_aviso', models.DateField(blank=True, help_text='Vencidas: próximo dia em que pode ser lembrada (vazio = não lembrar mais)', null=True)),
+                ('notificacao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.notificacao')),
+                ('parcela', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.parcela')),
+            ],
+            options={
+                'db_table': 'core_notificacao_entrega',
+                'constraints': [models.UniqueConstraint(fields=('parcela', 'notificacao', 'janela'), name='core_entrega_parcela_rota_janela_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_notificacao_entrega_politica_vencidas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entreganotificacao',
+            name='message_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='vencidas_reenvio',
+            field=models.CharField(choices=[('editar', 'Editar a mensagem anterior'), ('substituir', 'Enviar nova e apagar a anterior'), ('nova', 'Enviar nova e manter a anterior')], default='editar', help_text='O que fazer com o lembrete anterior da mesma parcela vencida', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notificacaooutbox',
+            name='message_id_anterior',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificacaooutbox',
+            name='reenvio',
+            field=models.CharField(blank=True, choices=[('editar', 'Editar a mensagem anterior'), ('substituir', 'Enviar nova e apagar a anterior'), ('nova', 'Enviar nova e manter a anterior')], max_length=10, null=True),
+        ),
+    ]
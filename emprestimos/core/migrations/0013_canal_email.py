@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_reenvio_vencidas_message_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bottoken',
+            name='plataforma',
+            field=models.CharField(choices=[('telegram', 'Telegram'), ('discord', 'Discord'), ('email', 'E-mail')], default='telegram', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='chatid',
+            name='plataforma',
+            field=models.CharField(choices=[('telegram', 'Telegram'), ('discord', 'Discord'), ('email', 'E-mail')], default='telegram', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='notificacao',
+            name='plataforma',
+            field=models.CharField(choices=[('telegram', 'Telegram'), ('discord', 'Discord'), ('email', 'E-mail')], default='telegram', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='notificacao',
+            name='token',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.bottoken'),
+        ),
+        migrations.AlterField(
+            model_name='notificacaooutbox',
+            name='plataforma',
+            field=models.CharField(choices=[('telegram', 'Telegram'), ('discord', 'Discord'), ('email', 'E-mail')], default='telegram', max_length=10),
+        ),
+    ]
@@ -1,4 +1,5 @@
 import re
+import datetime
 from decimal import Decimal
 from django.db import models
 from django.contrib import admin
@@ -25,6 +26,7 @@ TIPO_CONTATO_CHOICES = (
 PLATAFORMAS_CHOICES = [
     ('telegram', 'Telegram'),
     ('discord', 'Discord'),
+    ('email', 'E-mail'),
 ]
 
 def validate_token(value):
@@ -38,6 +40,8 @@ def validate_chat_id(value, plataforma):
         raise ValidationError(
             f"{value} não é válido para Telegram. O chat_id deve começar com '-' e conter apenas números."
         )
+    if plataforma == 'email':
+        validate_email(value)
 
 def validate_cpf(cpf):
     cpf = re.sub(r'\D', '', cpf)
@@ -289,6 +293,12 @@ class Parcela(models.Model):
     comprovante = models.BinaryField(blank=True, null=True)
     tipo_comprovante = models.CharField(max_length=50, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Varredura diária do notificador: parcelas pendentes por data de vencimento
+            models.Index(fields=['status', 'data_fim'], name='core_parcela_status_fim_idx'),
+        ]
+
     def __str__(self):
         return f"{self.id} - {self.emprestimo.id} - {self.cliente.nome} - {self.responsavel.username}"
     
@@ -368,20 +378,52 @@ class BotToken(models.Model):
     token = models.CharField(max_length=255, null=False, unique=True, validators=[validate_token])
     plataforma = models.CharField(max_length=10, choices=PLATAFORMAS_CHOICES, default='telegram')
 
+    def clean(self):
+        if self.plataforma == 'email':
+            raise ValidationError("E-mail não usa token; o notificador envia pelo servidor SMTP configurado.")
+
     def __str__(self):
         return f"{self.nome} - {self.dono} - {self.plataforma}"
 
+MODO_ENVIO_CHOICES = [
+    ('individual', 'Uma mensagem por parcela'),
+    ('resumo', 'Resumo agrupado'),
+]
+
+REENVIO_VENCIDAS_CHOICES = [
+    ('editar', 'Editar a mensagem anterior'),
+    ('substituir', 'Enviar nova e apagar a anterior'),
+    ('nova', 'Enviar nova e manter a anterior'),
+]
+
 class Notificacao(models.Model):
     dono = models.ForeignKey(User, on_delete=models.CASCADE)
-    token = models.ForeignKey(BotToken, on_delete=models.CASCADE)
+    # Vazio nas rotas de e-mail (enviadas pelo SMTP do servidor, ver aioemail.py)
+    token = models.ForeignKey(BotToken, on_delete=models.CASCADE, blank=True, null=True)
     chat_id = models.ForeignKey(ChatId, on_delete=models.CASCADE)
     plataforma = models.CharField(max_length=10, choices=PLATAFORMAS_CHOICES, default='telegram')
+    # Janela de envio no fuso de settings.TIME_ZONE; o notificador espalha os lembretes dentro dela
+    inicio_envio = models.TimeField(default=datetime.time(8, 0), help_text="Início da janela de envio (horário local)")
+    fim_envio = models.TimeField(default=datetime.time(20, 0), help_text="Fim da janela de envio (horário local). Se menor que o início, a janela atravessa a meia-noite")
+    modo_envio = models.CharField(max_length=10, choices=MODO_ENVIO_CHOICES, default='individual', help_text="Resumo agrupa as parcelas do dia em poucas mensagens")
+    # Política de repetição dos lembretes de parcelas vencidas (ver EntregaNotificacao)
+    vencidas_diarias = models.PositiveSmallIntegerField(default=7, help_text="Por quantos dias após o vencimento a parcela vencida é lembrada todo dia")
+    vencidas_intervalo = models.PositiveSmallIntegerField(default=7, help_text="Depois disso, intervalo em dias entre os lembretes (0 = não lembrar mais)")
+    vencidas_reenvio = models.CharField(max_length=10, choices=REENVIO_VENCIDAS_CHOICES, default='editar', help_text="O que fazer com o lembrete anterior da mesma parcela vencida")
 
     def clean(self):
-        if self.token.dono != self.dono:
-            raise ValidationError("O dono do token deve ser o mesmo da notificação.")
+        if self.inicio_envio == self.fim_envio:
+            raise ValidationError("A janela de envio não pode ter início e fim iguais.")
         if self.chat_id.dono != self.dono:
             raise ValidationError("O dono do chat_id deve ser o mesmo da notificação.")
+        if self.chat_id.plataforma == 'email':
+            if self.token:
+                raise ValidationError("Notificações por e-mail não usam token.")
+            return
+        if not self.token:
+            raise ValidationError("O token é obrigatório para Telegram e Discord.")
+        if self.token.dono != self.dono:
+            raise ValidationError("O dono do token deve ser o mesmo da notificação.")
         if self.token.plataforma != self.chat_id.plataforma:
             raise ValidationError("O token e o chat_id devem ser da mesma plataforma.")
 
@@ -389,7 +431,104 @@ class Notificacao(models.Model):
         self.full_clean()
         if self.token and self.chat_id:
             self.plataforma = self.token.plataforma
+        elif self.chat_id:
+            self.plataforma = self.chat_id.plataforma
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.dono} - {self.id}"
\ No newline at end of file
+        return f"{self.dono} - {self.id}"
+
+OUTBOX_STATUS_CHOICES = [
+    ('pendente', 'Pendente'),
+    ('enviando', 'Enviando'),
+    ('enviado', 'Enviado'),
+    ('falha', 'Falha'),
+    ('expirado', 'Expirado'),
+]
+
+class ExecucaoNotificador(models.Model):
+    data_referencia = models.DateField(unique=True)
+    iniciado_em = models.DateTimeField(default=timezone.now)
+    varredura_concluida_em = models.DateTimeField(blank=True, null=True)
+    finalizado_em = models.DateTimeField(blank=True, null=True)
+    # Marca d'água: maior id de parcela já varrido no dia (novas parcelas acima dele são avisadas no próximo ciclo)
+    ultima_parcela_id = models.BigIntegerField(blank=True, null=True)
+    # Resumo das métricas do dia, um objeto por worker (ver notificador_metricas.py)
+    relatorio = models.JSONField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.data_referencia} - {'concluída' if self.finalizado_em else 'em andamento'}"
+
+class NotificacaoOutbox(models.Model):
+    # Chave de idempotência: parcela, janela, data de referência e rota (notificação).
+    # No modo resumo: rota, data de referência, marca d'água e número da parte
+    chave = models.CharField(max_length=255, unique=True)
+    parcela = models.ForeignKey(Parcela, on_delete=models.CASCADE, null=True)
+    notificacao = models.ForeignKey(Notificacao, on_delete=models.CASCADE, null=True)
+    janela = models.SmallIntegerField(help_text="Dias até o vencimento (-1 = vencida)")
+    data_referencia = models.DateField()
+    token = models.CharField(max_length=255)
+    chat_id = models.CharField(max_length=255)
+    plataforma = models.CharField(max_length=10, choices=PLATAFORMAS_CHOICES, default='telegram')
+    texto = models.TextField()
+    # Ids (separados por vírgula) das parcelas incluídas numa mensagem de resumo
+    parcelas = models.TextField(blank=True, null=True)
+    # Lembrete anterior da mesma parcela vencida na rota, editado ou apagado conforme `reenvio`
+    message_id_anterior = models.CharField(max_length=64, blank=True, null=True)
+    reenvio = models.CharField(max_length=10, choices=REENVIO_VENCIDAS_CHOICES, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=OUTBOX_STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True, null=True)
+    message_id = models.CharField(max_length=64, blank=True, null=True)
+    criado_em = models.DateTimeField(default=timezone.now)
+    agendado_para = models.DateTimeField(blank=True, null=True, help_text="Envio não antes deste horário (vazio = imediato)")
+    # Partição da rota (hash de token e chat_id); cada worker envia só os shards que arrendou
+    shard = models.PositiveSmallIntegerField(default=0)
+    reservado_em = models.DateTimeField(blank=True, null=True)
+    enviado_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'core_notification_outbox'
+        indexes = [
+            models.Index(fields=['data_referencia', 'status'], name='core_outbox_data_status_idx'),
+            models.Index(fields=['data_referencia', 'shard', 'status'], name='core_outbox_data_shard_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.chave} - {self.get_status_display()}"
+
+class EntregaNotificacao(models.Model):
+    # Lembretes já entregues por (parcela, janela, rota). A varredura ignora, com um anti-join,
+    # as janelas já avisadas para o mesmo vencimento e as vencidas até `proximo_aviso`
+    parcela = models.ForeignKey(Parcela, on_delete=models.CASCADE)
+    notificacao = models.ForeignKey(Notificacao, on_delete=models.CASCADE)
+    janela = models.SmallIntegerField(help_text="Dias até o vencimento (-1 = vencida)")
+    vencimento = models.DateTimeField(help_text="data_fim da parcela quando foi avisada; se mudar, a parcela volta a ser avisada")
+    envios = models.PositiveIntegerField(default=0)
+    primeiro_envio = models.DateField()
+    ultimo_envio = models.DateField()
+    proximo_aviso = models.DateField(blank=True, null=True, help_text="Vencidas: próximo dia em que pode ser lembrada (vazio = não lembrar mais)")
+    # Última mensagem individual da parcela na rota (não preenchido para resumos)
+    message_id = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        db_table = 'core_notificacao_entrega'
+        constraints = [
+            models.UniqueConstraint(fields=['parcela', 'notificacao', 'janela'], name='core_entrega_parcela_rota_janela_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.parcela_id} - {self.notificacao_id} - {self.janela}"
+
+class LeaseNotificador(models.Model):
+    # Recurso disputado pelos workers do notificador: 'shard:<n>', 'varredura' ou 'worker:<id>' (batimento)
+    recurso = models.CharField(max_length=100, unique=True)
+    dono = models.CharField(max_length=100)
+    expira_em = models.DateTimeField()
+    renovado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'core_notificador_lease'
+
+    def __str__(self):
+        return f"{self.recurso} - {self.dono}"
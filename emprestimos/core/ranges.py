@@ -0,0 +1,215 @@
+"""
+Requisições parciais (Range / If-Range, RFC 9110 §14) compartilhadas pelo
+AsyncStaticMiddleware e pelas views de comprovante.
+
+O fluxo é sempre o mesmo: `intervalos_pedidos` decide entre resposta completa (None),
+416 ([]) ou a lista de intervalos; `planejar` monta o plano do 206 (um intervalo ou
+multipart/byteranges) e o corpo sai de bytes em memória (`corpo_de_bytes`) ou do disco
+em streaming (`corpo_de_arquivo`), sem ler o que não foi pedido.
+"""
+import hashlib
+import secrets
+import aiofiles
+from typing import NamedTuple, Optional
+from django.http import HttpResponse
+from email.utils import parsedate_to_datetime
+
+# Acima disso o Range é ignorado e o arquivo sai inteiro (evita pedidos fragmentados abusivos)
+MAX_INTERVALOS = 16
+
+
+class Intervalo(NamedTuple):
+    inicio: int
+    fim: int        # inclusivo, como no Content-Range
+
+    @property
+    def tamanho(self) -> int:
+        return self.fim - self.inicio + 1
+
+
+class PlanoParcial(NamedTuple):
+    content_type: str
+    content_length: int
+    content_range: Optional[str]    # só com um intervalo; no multipart vai em cada parte
+    partes: tuple                   # bytes (delimitadores do multipart) ou Intervalo a copiar
+
+
+def interpretar_range(cabecalho: str, tamanho: int) -> Optional[list]:
+    """
+    Interpreta o cabeçalho Range para um conteúdo de `tamanho` bytes.
+
+    Returns:
+        None se o cabeçalho deve ser ignorado (unidade desconhecida, sintaxe inválida ou
+        intervalos demais), [] se nenhum intervalo é satisfazível (416), ou a lista de
+        Intervalo ordenada, com sobrepostos e adjacentes unidos
+    """
+    unidade, _, especificacoes = cabecalho.partition("=")
+    if unidade.strip().lower() != "bytes":
+        return None
+    especificacoes = [e.strip() for e in especificacoes.split(",") if e.strip()]
+    if not especificacoes or len(especificacoes) > MAX_INTERVALOS:
+        return None
+
+    intervalos = []
+    for especificacao in especificacoes:
+        primeiro, separador, ultimo = especificacao.partition("-")
+        if not separador:
+            return None
+        primeiro, ultimo = primeiro.strip(), ultimo.strip()
+        if not (primeiro or ultimo) or (primeiro and not primeiro.isdigit()) or (ultimo and not ultimo.isdigit()):
+            return None
+        if not primeiro:
+            # Sufixo: os últimos N bytes
+            sufixo = int(ultimo)
+            if sufixo > 0 and tamanho > 0:
+                intervalos.append(Intervalo(max(0, tamanho - sufixo), tamanho - 1))
+            continue
+        inicio = int(primeiro)
+        if ultimo and int(ultimo) < inicio:
+            return None
+        if inicio < tamanho:
+            fim = min(int(ultimo), tamanho - 1) if ultimo else tamanho - 1
+            intervalos.append(Intervalo(inicio, fim))
+
+    intervalos.sort()
+    unidos = []
+    for intervalo in intervalos:
+        if unidos and intervalo.inicio <= unidos[-1].fim + 1:
+            unidos[-1] = Intervalo(unidos[-1].inicio, max(unidos[-1].fim, intervalo.fim))
+        else:
+            unidos.append(intervalo)
+    return unidos
+
+
+def if_range_confere(if_range: str, etag: Optional[str], ultima_modificacao: Optional[float]) -> bool:
+    """
+    Valida o If-Range: ETag forte idêntico ou data igual ao Last-Modified (em segundos).
+    ETags fracos nunca conferem (comparação forte, RFC 9110 §13.1.5).
+    """
+    if_range = if_range.strip()
+    if if_range.startswith(('"', "W/")):
+        return bool(etag) and not etag.startswith("W/") and if_range == etag
+    if ultima_modificacao is None:
+        return False
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(ultima_modificacao)
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+
+def intervalos_pedidos(request, tamanho: int, etag: Optional[str] = None, ultima_modificacao: Optional[float] = None) -> Optional[list]:
+    """
+    Intervalos a servir para `request` (só GET/HEAD, como manda a RFC).
+
+    Returns:
+        None para resposta completa (200), [] para 416 ou a lista de Intervalo (206)
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    cabecalho = request.headers.get("Range")
+    if not cabecalho:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and not if_range_confere(if_range, etag, ultima_modificacao):
+        return None
+    return interpretar_range(cabecalho, tamanho)
+
+
+def planejar(intervalos: list, tamanho: int, content_type: str) -> PlanoParcial:
+    """Monta o plano do 206: intervalo único ou multipart/byteranges."""
+    if len(intervalos) == 1:
+        intervalo = intervalos[0]
+        return PlanoParcial(
+            content_type=content_type,
+            content_length=intervalo.tamanho,
+            content_range=f"bytes {intervalo.inicio}-{intervalo.fim}/{tamanho}",
+            partes=(intervalo,),
+        )
+
+    fronteira = secrets.token_hex(16)
+    partes = []
+    for numero, intervalo in enumerate(intervalos):
+        # O CRLF antes de cada delimitador (menos o primeiro) faz parte do delimitador
+        quebra = "\r\n" if numero else ""
+        partes.append((
+            f"{quebra}--{fronteira}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {intervalo.inicio}-{intervalo.fim}/{tamanho}\r\n\r\n"
+        ).encode("latin-1"))
+        partes.append(intervalo)
+    partes.append(f"\r\n--{fronteira}--\r\n".encode("latin-1"))
+
+    return PlanoParcial(
+        content_type=f"multipart/byteranges; boundary={fronteira}",
+        content_length=sum(len(p) if isinstance(p, bytes) else p.tamanho for p in partes),
+        content_range=None,
+        partes=tuple(partes),
+    )
+
+
+def aplicar_plano(response, plano: PlanoParcial):
+    """Transforma `response` (já com os demais cabeçalhos) no 206 do plano."""
+    response.status_code = 206
+    response["Content-Type"] = plano.content_type
+    response["Content-Length"] = str(plano.content_length)
+    if plano.content_range:
+        response["Content-Range"] = plano.content_range
+    return response
+
+
+def resposta_416(tamanho: int) -> HttpResponse:
+    """416 Range Not Satisfiable, informando o tamanho atual do conteúdo."""
+    response = HttpResponse(status=416)
+    response["Content-Range"] = f"bytes */{tamanho}"
+    return response
+
+
+def corpo_de_bytes(conteudo, plano: PlanoParcial) -> bytes:
+    """Corpo do 206 a partir do conteúdo em memória (bytes ou memoryview)."""
+    return b"".join(
+        parte if isinstance(parte, bytes) else conteudo[parte.inicio:parte.fim + 1]
+        for parte in plano.partes
+    )
+
+
+async def corpo_de_arquivo(caminho: str, plano: PlanoParcial, chunk_size: int):
+    """Corpo do 206 em streaming: lê do disco só os intervalos pedidos, em chunks."""
+    async with aiofiles.open(caminho, mode="rb") as f:
+        for parte in plano.partes:
+            if isinstance(parte, bytes):
+                yield parte
+                continue
+            await f.seek(parte.inicio)
+            restante = parte.tamanho
+            while restante > 0:
+                chunk = await f.read(min(chunk_size, restante))
+                if not chunk:
+                    break
+                restante -= len(chunk)
+                yield chunk
+
+
+def resposta_conteudo(request, conteudo, content_type: str) -> HttpResponse:
+    """
+    Resposta de um conteúdo em memória (ex.: BinaryField) com suporte a Range.
+
+    O ETag vem do hash do conteúdo, então If-Range funciona mesmo sem data de
+    modificação no modelo; responde 200, 206 ou 416.
+    """
+    tamanho = len(conteudo)
+    etag = f'"{hashlib.blake2b(conteudo, digest_size=16).hexdigest()}"'
+    intervalos = intervalos_pedidos(request, tamanho, etag)
+    if intervalos == []:
+        return resposta_416(tamanho)
+
+    # Sem tipo, vale o padrão do HttpResponse, também nas partes do multipart
+    response = HttpResponse(content_type=content_type)
+    if intervalos:
+        plano = planejar(intervalos, tamanho, response["Content-Type"])
+        response.content = corpo_de_bytes(conteudo, plano)
+        aplicar_plano(response, plano)
+    else:
+        response.content = conteudo
+    response["ETag"] = etag
+    response["Accept-Ranges"] = "bytes"
+    return response
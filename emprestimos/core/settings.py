@@ -50,7 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.middleware.gzip.GZipMiddleware',  # Compressão de respostas para melhor performance
+    'core.middleware.RangeAwareGZipMiddleware',  # Compressão de respostas (exceto 206/416 e as que aceitam Range) para melhor performance
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -108,10 +108,24 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
         'OPTIONS': {
             'timeout': 20,  # Timeout para operações async
+            # WAL: leituras (site e notificador) não bloqueiam as escritas umas das outras
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
         }
     }
 }
 
+# PostgreSQL quando configurado (o notificador lê esta mesma configuração, ver notificador_banco.py)
+if os.getenv('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB'),
+        'USER': os.getenv('POSTGRES_USER', ''),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': 60,
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -162,7 +176,8 @@ STORAGES = {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
     "staticfiles": {
-        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        # Manifest do WhiteNoise com variantes .gz, .br e .zst (ver core/storage.py)
+        "BACKEND": "core.storage.CompressedManifestZstdStorage",
     },
 }
 
@@ -194,6 +209,19 @@ STATIC_MIDDLEWARE = {
         
         # Logging - Debug logging
         "DEBUG_LOGGING": bool(int(os.getenv('STATIC_DEBUG_LOGGING', 0))),
+        
+        # Envio direto pelo servidor ASGI (pathsend/zerocopysend) quando anunciado
+        "ZERO_COPY": bool(int(os.getenv('STATIC_ZERO_COPY', 1))),
+        
+        # Índice imutável de STATIC_ROOT montado no startup (staticfiles.json + varredura).
+        # Arquivos fora dele recebem 404; novos arquivos exigem reiniciar o processo
+        "INDEX": bool(int(os.getenv('STATIC_INDEX', 1))),
+        
+        # Cache de conteúdo - Memória para os bytes de arquivos pequenos (em MB, 0 desliga)
+        "CONTENT_CACHE_MEMORY_MB": int(os.getenv('STATIC_CONTENT_CACHE_MEMORY_MB', 32)),
+        
+        # Cache de conteúdo - Tamanho máximo de arquivo mantido em memória (em bytes)
+        "CONTENT_CACHE_MAX_FILE_SIZE": int(os.getenv('STATIC_CONTENT_CACHE_MAX_FILE_SIZE', 65536)),
     },
     "cache": {
         # HTTP Cache - Tempo de cache padrão (1 ano para assets versionados)
@@ -0,0 +1,46 @@
+"""
+Storage de estáticos com variantes pré-compactadas .gz, .br e .zst.
+
+O collectstatic do WhiteNoise já grava .gz e, com o pacote brotli, .br; aqui o
+compressor também grava .zst com o `compression.zstd` da stdlib (Python 3.14+).
+O AsyncStaticMiddleware escolhe a menor variante aceita pelo cliente.
+"""
+import os
+from whitenoise.compress import Compressor
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+try:
+    from compression import zstd
+except ImportError:  # Python < 3.14
+    zstd = None
+
+
+class CompressorZstd(Compressor):
+    """Compressor do WhiteNoise que também grava a variante Zstandard (.zst)."""
+
+    SKIP_COMPRESS_EXTENSIONS = Compressor.SKIP_COMPRESS_EXTENSIONS + ("zst",)
+
+    # Nível alto: a compactação roda uma vez no collectstatic, a descompactação é barata
+    ZSTD_LEVEL = 19
+
+    def __init__(self, *args, use_zstd=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.use_zstd = use_zstd and zstd is not None
+
+    def compress(self, path):
+        filenames = super().compress(path)
+        if self.use_zstd:
+            with open(path, "rb") as f:
+                stat_result = os.fstat(f.fileno())
+                data = f.read()
+            compressed = zstd.compress(data, level=self.ZSTD_LEVEL)
+            if self.is_compressed_effectively("Zstandard", path, len(data), compressed):
+                filenames.append(self.write_data(path, compressed, ".zst", stat_result))
+        return filenames
+
+
+class CompressedManifestZstdStorage(CompressedManifestStaticFilesStorage):
+    """CompressedManifestStaticFilesStorage com .zst além de .gz e .br."""
+
+    def create_compressor(self, **kwargs):
+        return CompressorZstd(**kwargs)
@@ -1,6 +1,7 @@
 from django.views import View
 from django.contrib import messages
 from ..models import Parcela, Emprestimo
+from ..ranges import resposta_conteudo
 from datetime import datetime, timedelta
 from allauth.account.views import SignupView
 from django.utils.safestring import mark_safe
@@ -33,7 +34,7 @@ class ComprovanteParcelaView(LoginRequiredMixin, UserPassesTestMixin, View):
     def get(self, request, parcela_id):
         if self.parcela.comprovante:
             extensao = MIME_EXTENSIONS.get(self.parcela.tipo_comprovante, 'bin')
-            response = HttpResponse(self.parcela.comprovante, content_type=self.parcela.tipo_comprovante)
+            response = resposta_conteudo(request, self.parcela.comprovante, self.parcela.tipo_comprovante)
             data_formatada = self.parcela.data_pagamento.strftime('%Y-%m-%d') if self.parcela.data_pagamento else 'sem-data'
             nome = f"comprovante_{parcela_id}_{self.parcela.emprestimo.id}_{self.parcela.cliente.id}_{self.parcela.cliente.nome_completo}_{data_formatada}.{extensao}".replace(" ","")
             response['Content-Disposition'] = f'inline; filename="{nome}"'
@@ -54,7 +55,7 @@ class ComprovanteEmprestimoView(LoginRequiredMixin, UserPassesTestMixin, View):
     def get(self, request, emprestimo_id):
         if self.emprestimo.comprovante:
             extensao = MIME_EXTENSIONS.get(self.emprestimo.tipo_comprovante, 'bin')
-            response = HttpResponse(self.emprestimo.comprovante, content_type=self.emprestimo.tipo_comprovante)
+            response = resposta_conteudo(request, self.emprestimo.comprovante, self.emprestimo.tipo_comprovante)
             data_formatada = self.emprestimo.data_inicio.strftime('%Y-%m-%d') if self.emprestimo.data_inicio else 'sem-data'
             nome = f"comprovante_{emprestimo_id}_{self.emprestimo.cliente.id}_{self.emprestimo.cliente.nome_completo}_{data_formatada}.{extensao}".replace(" ","")
             response['Content-Disposition'] = f'inline; filename="{nome}"'
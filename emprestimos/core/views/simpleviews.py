@@ -263,6 +263,11 @@ class CacheControlView(StaticMiddlewareMixin, AdminRequiredMixin, View):
             middleware._file_cache.clear()
             middleware._cache_memory_bytes = 0
             
+            # Conteúdo em memória dos arquivos pequenos
+            memory_freed += middleware._content_cache_bytes
+            middleware._content_cache.clear()
+            middleware._content_cache_bytes = 0
+            
             return {
                 'success': True,
                 'action': 'clear_cache',
@@ -387,6 +392,11 @@ class CompleteCacheAdminView(StaticMiddlewareMixin, AdminRequiredMixin, View):
             middleware._file_cache.clear()
             middleware._cache_memory_bytes = 0
             
+            # Conteúdo em memória dos arquivos pequenos
+            memory_freed += middleware._content_cache_bytes
+            middleware._content_cache.clear()
+            middleware._content_cache_bytes = 0
+            
             return {
                 'success': True,
                 'action': 'clear_cache',
@@ -43,7 +43,10 @@ if not User.objects.filter(username="${SUPER_USER_NAME}").exists():
 EOF
 fi
 
-uv run python notificador.py &
+# Workers do notificador: as rotas são divididas entre eles por leases no banco
+for _ in $(seq 1 "${NOTIFICADOR_WORKERS:-1}"); do
+    uv run python notificador.py &
+done
 
 if [ "$DEBUG" = "1" ]; then
     uv run uvicorn core.asgi:application --host 0.0.0.0 --port 8000 --workers 1 --log-level warning --lifespan off --loop uvloop --http httptools --timeout-keep-alive 5 --use-colors
@@ -1,212 +1,555 @@
 import os
-import re
+import json
+import time
 import uvloop
+import random
 import asyncio
 import logging
 import aiohttp
 import datetime
-import aiosqlite
 from aiotelegram import TelegramBot
 from aiodiscord import DiscordBot
+from aiohttppool import get_pool
+from aioratelimit import RateLimiter, RateLimitError
+from notificador_mensagens import renderizar_vencimento, item_resumo, montar_resumos
+from notificador_metricas import get_metricas
+from notificador_banco import BancoSQLite, criar_banco
+from notificador_agenda import FUSO, hoje_local, agendar, segundos_ate_proximo_ciclo
+from notificador_outbox import OutboxDB
+from notificador_leases import LeasesDB, Particionamento
+from collections import Counter
 from datetime import date, timedelta
 
-class DB():
-    def __init__(self,):
-        self.dbpath = "db.sqlite3"
-        self.conexao = None
+class DB(OutboxDB, LeasesDB):
+    """
+    Consultas do notificador. O SQL é portável (marcadores `?`, limites de data calculados
+    em Python) e roda sobre o backend de notificador_banco escolhido pelo DATABASES do
+    Django: SQLite em WAL com pool de leitura ou PostgreSQL com asyncpg.
+    As consultas do outbox e dos leases vêm de notificador_outbox e notificador_leases.
+    """
 
-    async def connect(self):
-        self.conexao = await aiosqlite.connect(self.dbpath)
-        self.conexao.row_factory = aiosqlite.Row
-        await self.conexao.execute("PRAGMA foreign_keys = ON")
+    def __init__(self, dbpath=None, banco=None):
+        # `dbpath` força um arquivo SQLite (ex.: bench_notificador.py); sem ele, usa o DATABASES do Django
+        self.banco = banco or (BancoSQLite(dbpath) if dbpath else criar_banco())
 
-    async def get_cliente(self, cliente_id):
-        async with self.conexao.cursor() as cursor:
-            await cursor.execute("SELECT * FROM core_cliente WHERE id = ?", (cliente_id,))
-            row = await cursor.fetchone()
-            return dict(row) if row else {}
+    async def connect(self, criar=True):
+        await self.banco.abrir(criar=criar)
 
-    async def get_emprestimo(self, emprestimo_id):
-        async with self.conexao.cursor() as cursor:
-            await cursor.execute("SELECT * FROM core_emprestimo WHERE id = ?", (emprestimo_id,))
-            row = await cursor.fetchone()
-            return dict(row) if row else {}
+    @property
+    def conectado(self):
+        return self.banco.aberto
 
-    async def get_parcelas_a_vencer(self, dias):
+    async def close(self):
+        await self.banco.fechar()
+
+    # Colunas usadas pelo notificador; se alguma faltar, as migrações ainda não rodaram
+    CONSULTAS_ESQUEMA = (
+        "SELECT id, status, data_fim, responsavel_id FROM core_parcela LIMIT 0",
+        "SELECT id, inicio_envio, fim_envio, modo_envio, vencidas_diarias, vencidas_intervalo, vencidas_reenvio FROM core_notificacao LIMIT 0",
+        "SELECT id, chave, parcelas, agendado_para, shard, message_id_anterior, reenvio FROM core_notification_outbox LIMIT 0",
+        "SELECT id, ultima_parcela_id, relatorio FROM core_execucaonotificador LIMIT 0",
+        "SELECT id, recurso, dono, expira_em FROM core_notificador_lease LIMIT 0",
+        "SELECT id, parcela_id, notificacao_id, janela, vencimento, proximo_aviso, message_id FROM core_notificacao_entrega LIMIT 0",
+    )
+
+    async def verificar_esquema(self):
         """
-        Busca parcelas com vencimento em X dias.
-        
-        Args:
-            dias (int): Dias até o vencimento
-                - dias > 0: Parcelas que vencem em X dias
-                - dias = 0: Parcelas que vencem hoje
-                - dias < 0: Parcelas vencidas (usa valor absoluto como referência)
-                
+        Confere se o banco tem as tabelas e colunas que o notificador usa.
+
         Returns:
-            list: Lista de parcelas encontradas
+            str | None: Motivo de o banco ainda não estar pronto, ou None se estiver
         """
-        if dias < 0:
-            # Parcelas vencidas: data_fim < hoje
-            data_ref = date.today().isoformat()
-            condition = "date(p.data_fim) < ?"
-        else:
-            # Parcelas que vencem em X dias
-            data_ref = (date.today() + timedelta(days=dias)).isoformat()
-            condition = "date(p.data_fim) = ?"
-        
+        try:
+            for consulta in self.CONSULTAS_ESQUEMA:
+                await self.banco.buscar(consulta)
+        except self.banco.erros as e:
+            return str(e)
+        return None
+
+    async def iterar_vencimentos(self, hoje=None, tamanho_lote=500, apos_parcela_id=None):
+        """
+        Busca, numa única consulta, todas as parcelas pendentes que vencem nos
+        próximos 3 dias (3, 2, 1, hoje) ou que já venceram, já combinadas com
+        empréstimo, cliente, responsável e cada rota de notificação do dono.
+
+        As linhas seguem a ordem do índice (status, data_fim), da mais distante para
+        a vencida, intercalando as rotas, e são entregues em lotes sem carregar
+        tudo em memória. Dentro de cada rota a ordem é 3, 2, 1, 0 dias e vencidas.
+
+        Um anti-join com o registro de entregas (core_notificacao_entrega) descarta a
+        janela já avisada para o mesmo vencimento e as vencidas cujo `proximo_aviso`
+        ainda não chegou (ver registrar_entregas). Vencidas que voltam a ser lembradas
+        trazem o message_id do lembrete anterior (`message_id_anterior`).
+
+        Args:
+            hoje (date): Data de referência da varredura (padrão: hoje)
+            tamanho_lote (int): Quantidade de linhas lidas por vez do cursor
+            apos_parcela_id (int): Se informado, só parcelas com id maior (marca d'água)
+
+        Yields:
+            dict: Linha com os dados da parcela e da rota, incluindo `dias`
+                - dias >= 0: Dias até o vencimento
+                - dias = -1: Parcela vencida
+        """
+        hoje = hoje or date.today()
+        # Limites de cada janela calculados aqui (meia-noite UTC de hoje até hoje + 4), para a
+        # mesma consulta servir ao SQLite e ao PostgreSQL; comparar data_fim direto usa o índice
+        limites = [datetime.datetime.combine(hoje + timedelta(days=dias), datetime.time(), tzinfo=datetime.timezone.utc) for dias in range(5)]
+
+        janela = '''CASE
+                        WHEN p.data_fim < ? THEN -1
+                        WHEN p.data_fim < ? THEN 0
+                        WHEN p.data_fim < ? THEN 1
+                        WHEN p.data_fim < ? THEN 2
+                        ELSE 3
+                    END'''
         query = f'''
-            SELECT p.*, u.username as responsavel_username
+            SELECT p.id as parcela_id, p.numero_parcela, p.valor as parcela_valor,
+                    p.data_inicio as parcela_data_inicio, p.data_fim as parcela_data_fim, p.status as parcela_status,
+                    e.id as emprestimo_id, e.parcelas as emprestimo_parcelas, e.valor as emprestimo_valor,
+                    e.porcentagem as emprestimo_porcentagem, e.motivo as emprestimo_motivo,
+                    cl.nome_completo as cliente_nome_completo,
+                    u.username as responsavel_username,
+                    n.id as notificacao_id, n.inicio_envio, n.fim_envio, n.modo_envio, n.vencidas_reenvio, COALESCE(t.token, '') as bot_token,
+                    c.chat_id as chat_id_val, c.plataforma as chat_plataforma,
+                    {janela} as dias, en.message_id as message_id_anterior
             FROM core_parcela p
+            INNER JOIN core_notificacao n ON n.dono_id = p.responsavel_id
+            LEFT JOIN core_bottoken t ON n.token_id = t.id
+            INNER JOIN core_chatid c ON n.chat_id_id = c.id
             LEFT JOIN core_emprestimo e ON p.emprestimo_id = e.id
+            LEFT JOIN core_cliente cl ON p.cliente_id = cl.id
             LEFT JOIN auth_user u ON e.responsavel_id = u.id
-            WHERE p.status = 0 AND {condition}
-        '''
-        async with self.conexao.cursor() as cursor:
-            await cursor.execute(query, (data_ref,))
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows] if rows else []
-
-    async def get_notificacoes(self, user_id=None):
-        query = '''
-            SELECT n.*, 
-                    t.token as bot_token, t.nome as bot_nome, t.plataforma as bot_plataforma, t.dono_id as bot_dono_id,
-                    c.chat_id as chat_id_val, c.nome as chat_nome, c.plataforma as chat_plataforma, c.dono_id as chat_dono_id,
-                    u.username as dono_username, u.email as dono_email
-            FROM core_notificacao n
-            LEFT JOIN core_bottoken t ON n.token_id = t.id
-            LEFT JOIN core_chatid c ON n.chat_id_id = c.id
-            LEFT JOIN auth_user u ON n.dono_id = u.id
+            LEFT JOIN core_notificacao_entrega en ON en.parcela_id = p.id AND en.notificacao_id = n.id
+                AND en.janela = {janela} AND en.vencimento = p.data_fim
+            WHERE p.status = ? AND p.data_fim < ? AND (en.id IS NULL OR en.proximo_aviso <= ?) {{filtro_id}}
+            ORDER BY p.data_fim DESC
         '''
-        params = ()
-        if user_id is not None:
-            query += " WHERE n.dono_id = ?"
-            params = (user_id,)
-        async with self.conexao.cursor() as cursor:
-            await cursor.execute(query, params)
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows] if rows else []
+        parametros = [*limites[:4], *limites[:4], False, limites[4], hoje]
+        filtro_id = ''
+        if apos_parcela_id is not None:
+            filtro_id = 'AND p.id > ?'
+            parametros.append(apos_parcela_id)
+        metricas = get_metricas()
+        inicio = time.perf_counter()
+        async for rows in self.banco.iterar(query.format(filtro_id=filtro_id), parametros, tamanho_lote):
+            # O tempo do lote (sem o tempo do consumidor) é dividido entre as janelas das linhas lidas
+            decorrido = time.perf_counter() - inicio
+            for janela, quantidade in Counter(row['dias'] for row in rows).items():
+                metricas.incrementar('notificador_consulta_segundos', decorrido * quantidade / len(rows), janela=janela)
+                metricas.incrementar('notificador_parcelas_varridas_total', quantidade, janela=janela)
+            for row in rows:
+                yield row
+            inicio = time.perf_counter()
+
+    @staticmethod
+    def agora():
+        """Data/hora atual em UTC (cada backend a grava no formato do Django)."""
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    async def iniciar_execucao(self, hoje):
+        """
+        Registra a execução do dia (se ainda não existe).
+
+        Returns:
+            dict: varredura_concluida_em, finalizado_em e ultima_parcela_id da execução do dia
+        """
+        await self.banco.executar(
+            "INSERT INTO core_execucaonotificador (data_referencia, iniciado_em) VALUES (?, ?) "
+            "ON CONFLICT(data_referencia) DO NOTHING",
+            (hoje, self.agora())
+        )
+        return await self.banco.buscar_um(
+            "SELECT varredura_concluida_em, finalizado_em, ultima_parcela_id "
+            "FROM core_execucaonotificador WHERE data_referencia = ?",
+            (hoje,)
+        )
+
+    async def marcar_execucao(self, hoje, campo):
+        """Preenche `varredura_concluida_em` ou `finalizado_em` da execução do dia."""
+        if campo not in ('varredura_concluida_em', 'finalizado_em'):
+            raise ValueError(f"Campo inválido: {campo}")
+        await self.banco.executar(
+            f"UPDATE core_execucaonotificador SET {campo} = ? WHERE data_referencia = ?",
+            (self.agora(), hoje)
+        )
+
+    async def gravar_relatorio(self, hoje, worker_id, relatorio):
+        """Grava o resumo de métricas do worker em ExecucaoNotificador.relatorio (um objeto por worker)."""
+        if self.banco.dialeto == 'postgres':
+            sql = "UPDATE core_execucaonotificador SET relatorio = COALESCE(relatorio, '{}'::jsonb) || jsonb_build_object(?::text, ?::jsonb) WHERE data_referencia = ?"
+        else:
+            sql = "UPDATE core_execucaonotificador SET relatorio = json_set(COALESCE(relatorio, '{}'), '$.' || json_quote(?), json(?)) WHERE data_referencia = ?"
+        await self.banco.executar(sql, (worker_id, json.dumps(relatorio, default=str), hoje))
+
+    async def maior_parcela_id(self):
+        row = await self.banco.buscar_um("SELECT COALESCE(MAX(id), 0) AS maior FROM core_parcela")
+        return row['maior']
+
+    async def atualizar_marca_dagua(self, hoje, parcela_id):
+        """Grava o maior id de parcela já coberto pelas varreduras do dia."""
+        await self.banco.executar(
+            "UPDATE core_execucaonotificador SET ultima_parcela_id = ? WHERE data_referencia = ?",
+            (parcela_id, hoje)
+        )
+
+class RotaEnvio():
+    """
+    Fila limitada de uma rota (token, chat_id, plataforma) consumida por um worker de envio.
+    Quando a fila enche, a rota "transborda": as mensagens seguintes ficam pendentes
+    no outbox e são enviadas depois, na drenagem, mantendo a ordem dentro do chat.
+    """
+    def __init__(self, chave, tamanho):
+        self.chave = chave
+        self.fila = asyncio.Queue(maxsize=tamanho)
+        self.reservados = 0       # vagas reservadas para o lote sendo gravado
+        self.transbordou = False
+        self.task = None
+
+    def reservar_vaga(self):
+        if self.transbordou:
+            return False
+        if self.fila.qsize() + self.reservados >= self.fila.maxsize:
+            self.transbordou = True
+            return False
+        self.reservados += 1
+        return True
 
 class Notificador():
+    MAX_TENTATIVAS = 6
+    TAMANHO_LOTE_OUTBOX = 500
+    TAMANHO_LOTE_PIPELINE = 100   # mensagens gravadas por vez no outbox durante a varredura
+    TAMANHO_FILA_LINHAS = 1000    # linhas lidas do banco aguardando renderização
+    TAMANHO_FILA_ROTA = 20        # mensagens em memória por rota
+    BACKOFF_BASE = 2     # segundos
+    BACKOFF_MAX = 300    # segundos
+    PRONTIDAO_BASE = 0.1  # segundos
+    PRONTIDAO_MAX = 5     # segundos
+
     def __init__(self):
         """Inicializa o notificador com cache de bots."""
         self.db = None
+        self._particao = None     # Shards arrendados por este worker (definido em main)
         self._telegram_bots = {}  # Cache: token -> TelegramBot
         self._discord_bots = {}   # Cache: token -> DiscordBot
-        self._pending_tasks = []  # Lista para rastrear tasks pendentes
-        self._semaphoro = asyncio.Semaphore(20)  # Limita a 20 processos paralelos
-        self._contador_mensagens = 0  # Contador de mensagens enviadas
-
-    async def buscar_vencimentos(self):
-        """
-        Busca parcelas em diferentes períodos de vencimento e agrupa mensagens por usuário.
-        Envia sequencialmente para cada usuário com delay de 3s entre mensagens.
-        """
-        periodos = [3, 2, 1, 0, -1]
-        
-        # Agrupar mensagens por (token, chat_id, plataforma)
-        mensagens_agrupadas = {}
-        
-        for dias in periodos:
-            parcelas = await self.db.get_parcelas_a_vencer(dias)
-            for parcela in parcelas:
-                # Prepara dados de mensagem sem enviar
-                dados_mensagens = await self.preparar_dados_mensagem(parcela, dias_restantes=dias)
-                for token, chat_id, plataforma, mensagem_texto in dados_mensagens:
-                    chave = (token, chat_id, plataforma)
-                    if chave not in mensagens_agrupadas:
-                        mensagens_agrupadas[chave] = []
-                    mensagens_agrupadas[chave].append(mensagem_texto)
-        
-        # Criar tasks para enviar mensagens agrupadas por usuário
-        for (token, chat_id, plataforma), textos_mensagens in mensagens_agrupadas.items():
-            task = asyncio.create_task(
-                self._enviar_com_fila(token, chat_id, plataforma, textos_mensagens)
-            )
-            self._pending_tasks.append(task)
-
-    async def escape_markdown_v2(self, text):
-        escape_chars = r'_\*\[\]\(\)~`>#+\-=|{}.!'
-        return re.sub(f'([{escape_chars}])', r'\\\1', text)
-
-    async def preparar_dados_mensagem(self, parcela, dias_restantes=None):
-        """
-        Prepara dados de mensagens a serem enviadas para uma parcela.
-        
+        self._email_bot = None    # Único, com o pool de sessões SMTP do processo (ver aioemail)
+        self._remocoes = {}       # (token, chat_id, plataforma) -> lembretes substituídos a apagar no fim do ciclo
+        self._envios_nao_registrados = {}  # outbox_id -> (registro, message_id, concluido): entregues sem registro no banco
+        # Limita envios em andamento ao mesmo tempo; o ritmo real de envio vem do RateLimiter de cada bot
+        self._semaphoro = asyncio.Semaphore(int(os.getenv('NOTIFICADOR_CONCORRENCIA', 100)))
+        # Intervalo máximo entre ciclos do agendador (envios agendados e novas parcelas)
+        self._intervalo = int(os.getenv('NOTIFICADOR_INTERVALO', 60))
+        self._metricas = get_metricas()
+        self._base_metricas = None  # Instantâneo da virada do dia (base do relatório do dia)
+        self._fila_linhas = None    # Filas da varredura em andamento, lidas pelos medidores
+        self._rotas_varredura = {}
+        self._metricas.medidor('notificador_fila_linhas', lambda: self._fila_linhas.qsize() if self._fila_linhas else 0)
+        self._metricas.medidor('notificador_fila_rotas', lambda: sum(rota.fila.qsize() for rota in self._rotas_varredura.values()))
+
+    # Agenda: funções de notificador_agenda (o bench substitui `agendar` numa subclasse)
+    hoje_local = staticmethod(hoje_local)
+    agendar = staticmethod(agendar)
+
+    async def buscar_vencimentos(self, hoje, apos_parcela_id=None):
+        """
+        Varre as parcelas a vencer (3, 2, 1, 0 dias) e vencidas e já envia enquanto lê
+        as mensagens cujo horário agendado já chegou; as demais ficam pendentes no outbox.
+
+        Pipeline com filas limitadas (backpressure):
+            leitor do banco -> renderizador (grava no outbox) -> worker de envio por rota
+
+        A chave de idempotência (parcela, janela, data, rota) evita duplicatas se a
+        varredura for repetida após uma queda. Mensagens que não cabem na fila da
+        rota ficam pendentes no outbox para a drenagem em processar_outbox.
+
+        Com `apos_parcela_id` (marca d'água), só parcelas novas são varridas e os avisos
+        saem assim que a janela de envio permitir, sem espalhamento.
+
+        Rotas no modo resumo não geram uma mensagem por parcela: os itens são acumulados
+        durante a varredura e, no fim, empacotados em poucas mensagens por rota.
+
         Returns:
-            list: Lista de tuplas (token, chat_id, plataforma, mensagem_texto)
-        """
-        if not parcela:
-            return []
-        
-        notificacoes = await self.db.get_notificacoes(parcela['responsavel_id'])
-        dados_mensagens = []
-        
-        for notificacao in notificacoes:
-            chat_id = notificacao['chat_id_val']
-            plataforma = notificacao['chat_plataforma']
-            token = notificacao['bot_token']
-            
-            cliente = await self.db.get_cliente(parcela['cliente_id'])
-            emprestimo = await self.db.get_emprestimo(parcela['emprestimo_id'])
-
-            total_parcelas = emprestimo['parcelas'] if emprestimo else '?'
-            porcentagem = f"{emprestimo['porcentagem']}%" if emprestimo else '%'
-            admin_url = f"{os.getenv('SITE_URL')}emprestimosadmindjango/core/emprestimo/{emprestimo['id']}/change/" if emprestimo else '#'
-
-            data_fim = parcela['data_fim'][:10]
-            try:
-                data_fim_fmt = datetime.datetime.strptime(data_fim, "%Y-%m-%d").strftime("%d/%m/%Y")
-            except Exception:
-                data_fim_fmt = data_fim
+            int: Quantidade de mensagens novas gravadas no outbox
+        """
+        fila_linhas = asyncio.Queue(maxsize=self.TAMANHO_FILA_LINHAS)
+        rotas = {}
+        self._fila_linhas, self._rotas_varredura = fila_linhas, rotas
+        leitor = asyncio.create_task(self._ler_vencimentos(hoje, fila_linhas, apos_parcela_id))
+        agora = datetime.datetime.now(FUSO)
+        espalhar = apos_parcela_id is None
+        try:
+            with self._metricas.cronometrar('notificador_varredura_segundos', tipo='completa' if espalhar else 'novas'):
+                total = await self._renderizar_vencimentos(hoje, fila_linhas, rotas, agora, espalhar, apos_parcela_id)
+                await leitor
+        finally:
+            if not leitor.done():
+                leitor.cancel()
+            await self._encerrar_rotas(rotas)
+            self._fila_linhas, self._rotas_varredura = None, {}
+        return total
 
-            try:
-                data_inicio_fmt = datetime.datetime.strptime(parcela['data_inicio'][:10], "%Y-%m-%d").strftime("%d/%m/%Y")
-            except Exception:
-                data_inicio_fmt = parcela['data_inicio'][:10] if 'data_inicio' in parcela else ''
-
-            # Define o título baseado em dias_restantes
-            if dias_restantes is None:
-                hoje = date.today().isoformat()
-                data_vencimento = parcela['data_fim'][:10]
-                dias = (datetime.datetime.strptime(data_vencimento, "%Y-%m-%d").date() - date.today()).days
-                dias_restantes = dias
-            
-            if dias_restantes < 0:
-                titulo = f"🚨 **Parcela {parcela['numero_parcela']} VENCIDA\\!**"
-            elif dias_restantes == 0:
-                titulo = f"⚠️ **Parcela {parcela['numero_parcela']} vence HOJE\\!**"
-            elif dias_restantes == 1:
-                titulo = f"🔔 **Parcela {parcela['numero_parcela']} vence AMANHÃ\\!**"
-            elif dias_restantes == 2:
-                titulo = f"📅 **Parcela {parcela['numero_parcela']} vence em 2 DIAS\\!**"
-            elif dias_restantes == 3:
-                titulo = f"📆 **Parcela {parcela['numero_parcela']} vence em 3 DIAS\\!**"
+    async def _ler_vencimentos(self, hoje, fila_linhas, apos_parcela_id=None):
+        """Estágio 1: lê as linhas da varredura e as coloca na fila (bloqueia se a fila encher)."""
+        try:
+            async for linha in self.db.iterar_vencimentos(hoje, apos_parcela_id=apos_parcela_id):
+                await fila_linhas.put(linha)
+        finally:
+            await fila_linhas.put(None)
+
+    async def _renderizar_vencimentos(self, hoje, fila_linhas, rotas, agora, espalhar=True, apos_parcela_id=None):
+        """
+        Estágio 2: monta o texto de cada linha, grava no outbox em lotes pequenos
+        e entrega as mensagens gravadas às filas das rotas. As linhas de rotas no
+        modo resumo são acumuladas e gravadas só no fim, quando a rota está completa.
+        """
+        data_referencia = hoje.isoformat()
+        total = 0
+        lote = []
+        resumos = {}  # notificacao_id -> (primeira linha da rota, itens)
+        render, individuais = 0.0, 0
+        while True:
+            linha = await fila_linhas.get()
+            if linha is None:
+                break
+            inicio = time.perf_counter()
+            if linha['modo_envio'] == 'resumo':
+                resumos.setdefault(linha['notificacao_id'], (linha, []))[1].append(item_resumo(linha))
             else:
-                titulo = f"📢 **Aviso de Parcela {parcela['numero_parcela']}**"
-
-            valor_formatado_parcela = await self.escape_markdown_v2(f"{parcela['valor']:,.2f}")
-            valor_formatado_emprestimo = await self.escape_markdown_v2(f"{emprestimo['valor']:,.2f}") if emprestimo else '0,00'
-            responsavel_formatado = await self.escape_markdown_v2(parcela.get('responsavel_username', ''))
-            motivo = await self.escape_markdown_v2(emprestimo.get('motivo', ''))
-
-            mensagem = (
-                f"{titulo}\n\n"
-                f"👤 Cliente: {cliente['nome_completo'] if cliente else ''}\n"
-                f"💳 Parcela: {parcela['numero_parcela']} de {total_parcelas}\n"
-                f"💰 Valor Empréstimo: R$ {valor_formatado_emprestimo}\n"
-                f"💰 Valor Parcela: R$ {valor_formatado_parcela}\n"
-                f"📆 Início: {data_inicio_fmt}\n"
-                f"📅 Vencimento: {data_fim_fmt}\n"
-                f"📈 Porcentagem: {porcentagem}\n"
-                f"🔗 Status: {'Pendente' if not parcela['status'] else 'Paga'}\n"
-                f"👨‍💼 Responsável: {responsavel_formatado}\n"
-                f"📝 Motivo: {motivo}\n"
-                f"\n🔗 [Ver Empréstimo no Admin]({admin_url})"
-            )
-            
-            dados_mensagens.append((token, chat_id, plataforma, mensagem))
-        
-        return dados_mensagens
+                individuais += 1
+                registro = {
+                    'chave': f"{linha['parcela_id']}:{linha['dias']}:{data_referencia}:{linha['notificacao_id']}",
+                    'parcela_id': linha['parcela_id'],
+                    'notificacao_id': linha['notificacao_id'],
+                    'janela': linha['dias'],
+                    'data_referencia': hoje,
+                    'token': linha['bot_token'],
+                    'chat_id': linha['chat_id_val'],
+                    'plataforma': linha['chat_plataforma'],
+                    'texto': self.preparar_mensagem(linha, hoje),
+                    'agendado_para': self.agendar(linha, agora, espalhar),
+                }
+                # E-mails enviados não podem ser editados nem apagados: cada lembrete sai como novo
+                if (linha['dias'] == -1 and linha['message_id_anterior'] and linha['vencidas_reenvio'] != 'nova'
+                        and linha['chat_plataforma'] != 'email'):
+                    registro['message_id_anterior'] = linha['message_id_anterior']
+                    registro['reenvio'] = linha['vencidas_reenvio']
+                lote.append(registro)
+            render += time.perf_counter() - inicio
+            # Grava assim que o lote enche ou o leitor ainda não tem mais linhas prontas
+            if lote and (len(lote) >= self.TAMANHO_LOTE_PIPELINE or fila_linhas.empty()):
+                self._metricas.medir('notificador_fila_linhas', fila_linhas.qsize())
+                self._metricas.medir('notificador_fila_rotas', sum(rota.fila.qsize() for rota in rotas.values()))
+                total += await self._gravar_e_despachar(lote, rotas)
+                lote = []
+        total += await self._gravar_e_despachar(lote, rotas)
+
+        inicio = time.perf_counter()
+        registros = self.preparar_resumos(hoje, resumos, agora, espalhar, apos_parcela_id)
+        render += time.perf_counter() - inicio
+        self._metricas.incrementar('notificador_render_segundos', render)
+        self._metricas.incrementar('notificador_render_mensagens_total', individuais + len(registros))
+        for inicio in range(0, len(registros), self.TAMANHO_LOTE_PIPELINE):
+            total += await self._gravar_e_despachar(registros[inicio:inicio + self.TAMANHO_LOTE_PIPELINE], rotas)
+        return total
+
+    def preparar_resumos(self, hoje, resumos, agora, espalhar=True, apos_parcela_id=None):
+        """
+        Empacota os itens acumulados de cada rota no modo resumo em mensagens dentro do
+        limite da plataforma (ver notificador_mensagens.montar_resumos).
+
+        A chave de idempotência usa rota, data, marca d'água e número da parte: repetir a
+        varredura do dia não duplica o resumo, e as parcelas novas encontradas pela marca
+        d'água saem num resumo próprio.
+
+        Args:
+            resumos (dict): notificacao_id -> (primeira linha da rota, itens de item_resumo)
+
+        Returns:
+            list[dict]: Registros prontos para _gravar_e_despachar
+        """
+        data_referencia = hoje.isoformat()
+        registros = []
+        for notificacao_id, (linha, itens) in resumos.items():
+            agendado_para = self.agendar(linha, agora, espalhar)
+            mensagens = montar_resumos(itens, linha['chat_plataforma'], hoje)
+            for parte, (texto, parcelas, janela) in enumerate(mensagens, start=1):
+                registros.append({
+                    'chave': f"resumo:{notificacao_id}:{data_referencia}:{apos_parcela_id or 0}:{parte}",
+                    'parcela_id': None,
+                    'notificacao_id': notificacao_id,
+                    'janela': janela,
+                    'data_referencia': hoje,
+                    'token': linha['bot_token'],
+                    'chat_id': linha['chat_id_val'],
+                    'plataforma': linha['chat_plataforma'],
+                    'texto': texto,
+                    'parcelas': ','.join(map(str, parcelas)),
+                    'agendado_para': agendado_para,
+                })
+        return registros
+
+    async def _gravar_e_despachar(self, lote, rotas):
+        """
+        Grava o lote no outbox. Mensagens sem agendamento e com vaga na fila da rota
+        já entram como 'enviando'; as agendadas ficam pendentes até o horário.
+        Rotas de shards arrendados por outros workers também ficam pendentes.
+        """
+        if not lote:
+            return 0
+        for registro in lote:
+            registro['shard'] = self._particao.shard_de(registro['token'], registro['chat_id'])
+            if registro['agendado_para'] is not None or registro['shard'] not in self._particao.shards:
+                registro['status'] = 'pendente'
+                continue
+            chave = (registro['token'], registro['chat_id'], registro['plataforma'])
+            rota = rotas.get(chave)
+            if rota is None:
+                rota = rotas[chave] = self._abrir_rota(chave, self.TAMANHO_FILA_ROTA)
+            registro['rota'] = rota
+            registro['status'] = 'enviando' if rota.reservar_vaga() else 'pendente'
+
+        inseridos = {row['chave']: row['id'] for row in await self.db.inserir_outbox(lote)}
+
+        for registro in lote:
+            if registro['status'] != 'enviando':
+                continue
+            rota = registro.pop('rota')
+            rota.reservados -= 1
+            # Chave já existente: a mensagem pertence a uma execução anterior
+            if registro['chave'] in inseridos:
+                registro['id'] = inseridos[registro['chave']]
+                rota.fila.put_nowait(registro)
+        return len(inseridos)
+
+    def _abrir_rota(self, chave, tamanho):
+        """Cria a fila de uma rota (token, chat_id, plataforma) e o worker que a consome."""
+        rota = RotaEnvio(chave, tamanho)
+        rota.task = asyncio.create_task(self._worker_rota(rota))
+        return rota
+
+    async def _encerrar_rotas(self, rotas):
+        """Sinaliza fim para os workers das rotas e aguarda o esvaziamento das filas."""
+        for rota in rotas.values():
+            await rota.fila.put(None)
+        await asyncio.gather(*(rota.task for rota in rotas.values()), return_exceptions=True)
+
+    async def _worker_rota(self, rota):
+        """Estágio 3: envia, em ordem, as mensagens da fila de uma rota."""
+        token, chat_id, plataforma = rota.chave
+        bot = self._get_bot(token, plataforma)
+        while True:
+            registro = await rota.fila.get()
+            if registro is None:
+                break
+            async with self._semaphoro:
+                await self._enviar_registro(bot, chat_id, plataforma, registro)
+
+    async def processar_outbox(self, hoje):
+        """
+        Reserva lotes de mensagens pendentes do outbox e as envia pelas mesmas filas de
+        rota (RotaEnvio / _worker_rota) da varredura, até não restar nada pendente para o dia.
+        O lote reservado já está em memória, então cada fila comporta as mensagens da rota no lote.
+        """
+        await self._registrar_envios_pendentes()
+        processadas = 0
+        while True:
+            registros = await self.db.reservar_outbox(hoje, self.TAMANHO_LOTE_OUTBOX, self._particao.shards)
+            if not registros:
+                break
+            por_rota = {}
+            for registro in registros:
+                if registro['id'] in self._envios_nao_registrados:
+                    # Já entregue; só falta o registro no banco (reservada de novo após a expiração)
+                    continue
+                por_rota.setdefault((registro['token'], registro['chat_id'], registro['plataforma']), []).append(registro)
+            rotas = {}
+            for chave, registros_rota in por_rota.items():
+                rota = rotas[chave] = self._abrir_rota(chave, len(registros_rota) + 1)
+                for registro in registros_rota:
+                    rota.fila.put_nowait(registro)
+                processadas += len(registros_rota)
+            await self._encerrar_rotas(rotas)
+        if processadas:
+            logging.warning(f"Outbox de {hoje}: {processadas} mensagens processadas.")
+
+    async def executar_ciclo(self, hoje):
+        """
+        Executa (ou retoma) o ciclo do dia:
+            - na primeira vez no dia, expira o que sobrou de dias anteriores e varre as parcelas;
+            - nas seguintes, varre só as parcelas criadas depois da marca d'água;
+            - envia o que já está no horário agendado nos shards deste worker;
+            - apaga em lote os lembretes de vencidas substituídos por mensagens novas.
+
+        A varredura e a marca d'água ficam com um único worker por vez (lease 'varredura').
+
+        Returns:
+            str | datetime | None: Próximo horário agendado (UTC) com mensagens pendentes no dia
+        """
+        execucao = await self.db.iniciar_execucao(hoje)
+        particao = self._particao
+        if await self.db.adquirir_lease('varredura', particao.worker_id, particao.ttl):
+            try:
+                # Relê com o lease em mãos: outro worker pode ter acabado de varrer
+                execucao = await self.db.iniciar_execucao(hoje)
+                if execucao['varredura_concluida_em'] is None:
+                    expiradas = await self.db.expirar_outbox(hoje)
+                    if expiradas:
+                        logging.warning(f"{expiradas} mensagens de dias anteriores expiradas sem envio.")
+                    marca = await self.db.maior_parcela_id()
+                    novas = await self.buscar_vencimentos(hoje)
+                    await self.db.atualizar_marca_dagua(hoje, marca)
+                    await self.db.marcar_execucao(hoje, 'varredura_concluida_em')
+                    logging.warning(f"Varredura de {hoje} concluída: {novas} mensagens novas no outbox.")
+                else:
+                    await self.verificar_novas_parcelas(hoje, execucao['ultima_parcela_id'])
+            finally:
+                await self.db.liberar_lease(particao.worker_id, 'varredura')
+
+        await self.processar_outbox(hoje)
+        await self.apagar_substituidas()
+
+        situacao = await self.db.situacao_outbox(hoje)
+        self._metricas.medir('notificador_outbox_restantes', situacao['restantes'])
+        if situacao['restantes'] == 0 and execucao['finalizado_em'] is None:
+            await self.db.marcar_execucao(hoje, 'finalizado_em')
+            logging.critical(f"Notificações de {hoje} enviadas.")
+        await self.gravar_relatorio(hoje)
+        return situacao['proximo']
+
+    async def gravar_relatorio(self, hoje):
+        """Atualiza o resumo de métricas do dia deste worker em ExecucaoNotificador.relatorio."""
+        try:
+            relatorio = self._metricas.resumo(self._base_metricas)
+            relatorio['atualizado_em'] = self.db.agora()
+            await self.db.gravar_relatorio(hoje, self._particao.worker_id, relatorio)
+        except Exception as e:
+            logging.error(f"Erro ao gravar o relatório de métricas: {e}")
+
+    async def verificar_novas_parcelas(self, hoje, marca):
+        """
+        Marca d'água por id: avisa, sem esperar a varredura do dia seguinte, as parcelas
+        criadas depois da última varredura que já vencem nos próximos dias ou estão vencidas.
+        """
+        nova_marca = await self.db.maior_parcela_id()
+        if marca is not None and nova_marca > marca:
+            novas = await self.buscar_vencimentos(hoje, apos_parcela_id=marca)
+            if novas:
+                logging.warning(f"{novas} mensagens novas para parcelas criadas após a varredura.")
+        if marca is None or nova_marca > marca:
+            await self.db.atualizar_marca_dagua(hoje, nova_marca)
+
+    def segundos_ate_proximo_ciclo(self, hoje, proximo):
+        return segundos_ate_proximo_ciclo(hoje, proximo, self._intervalo)
+
+    def preparar_mensagem(self, linha, hoje=None):
+        """
+        Monta o texto da mensagem de uma linha retornada por DB.iterar_vencimentos,
+        com o template pré-compilado da plataforma e da janela (ver notificador_mensagens).
+
+        Returns:
+            str: Texto em MarkdownV2 (Telegram), markdown do Discord ou HTML (e-mail)
+        """
+        return renderizar_vencimento(linha, hoje)
 
     def _get_telegram_bot(self, token):
         """
@@ -214,7 +557,7 @@ class Notificador():
         Reutiliza a mesma sessão para múltiplas mensagens do mesmo token.
         """
         if token not in self._telegram_bots:
-            self._telegram_bots[token] = TelegramBot(token=token)
+            self._telegram_bots[token] = TelegramBot(token=token, rate_limiter=self._rate_limiter('telegram'))
         return self._telegram_bots[token]
 
     def _get_discord_bot(self, token):
@@ -223,137 +566,257 @@ class Notificador():
         Reutiliza a mesma sessão para múltiplas mensagens do mesmo token.
         """
         if token not in self._discord_bots:
-            self._discord_bots[token] = DiscordBot(token=token)
+            self._discord_bots[token] = DiscordBot(token=token, rate_limiter=self._rate_limiter('discord'))
         return self._discord_bots[token]
 
+    def _get_email_bot(self):
+        """
+        Obtém o EmailBot do processo. Ele não depende do token: todas as rotas de e-mail
+        usam o SMTP do servidor, e as sessões do pool ficam abertas entre os ciclos.
+        """
+        if self._email_bot is None:
+            # Importado só com uma rota de e-mail: o aioemail puxa o Django (core.email_template)
+            from aioemail import EmailBot
+            self._email_bot = EmailBot(rate_limiter=self._rate_limiter('email'))
+        return self._email_bot
+
+    def _rate_limiter(self, plataforma):
+        # O mesmo token pode ter rotas em vários workers: cada um usa uma fração do limite global
+        workers = self._particao.workers if self._particao else 1
+        return RateLimiter.para_plataforma(plataforma, 1 / workers)
+
+    def _get_bot(self, token, plataforma):
+        if plataforma == 'telegram':
+            return self._get_telegram_bot(token)
+        if plataforma == 'email':
+            return self._get_email_bot()
+        return self._get_discord_bot(token)
+
     async def _cleanup_bots(self):
         """
-        Fecha todas as sessões abertas dos bots.
-        Deve ser chamado ao final de cada ciclo ou ao encerrar.
+        Descarta as instâncias de bots do ciclo.
+        As conexões HTTP ficam no pool do processo e continuam aquecidas para o próximo ciclo;
+        o pool só é fechado ao encerrar (ver main).
         """
-        for bot in self._telegram_bots.values():
-            try:
-                await bot.reset_session()
-            except Exception as e:
-                logging.warning(f"Erro ao fechar sessão Telegram: {e}")
-        
-        for bot in self._discord_bots.values():
-            try:
-                await bot.reset_session()
-            except Exception as e:
-                logging.warning(f"Erro ao fechar sessão Discord: {e}")
-        
         self._telegram_bots.clear()
         self._discord_bots.clear()
+        logging.warning(f"Pool HTTP ao fim do ciclo: {get_pool().metricas()}")
 
-    async def _wait_for_pending_tasks(self):
+    async def _enviar_registro(self, bot, chat_id, plataforma, registro):
         """
-        Aguarda a conclusão de todas as tasks pendentes.
+        Envia uma mensagem do outbox e marca o resultado logo após o envio.
+
+        Lembretes de vencidas com `message_id_anterior` editam o lembrete anterior
+        (reenvio 'editar') ou saem como mensagem nova e o anterior é apagado no fim do
+        ciclo (reenvio 'substituir'). Se a edição falhar, o lembrete também sai como
+        mensagem nova e substitui o anterior.
+
+        Um erro no envio marca a mensagem como 'falha'; ela nunca fica em 'enviando' para
+        ser reservada de novo. Já uma mensagem entregue cujo registro no banco falhou fica
+        em memória e é registrada no próximo processar_outbox (ver _registrar_envio).
         """
-        if self._pending_tasks:
+        try:
+            anterior, editada = registro.get('message_id_anterior'), False
+            msg = None
+            if anterior and registro.get('reenvio') == 'editar':
+                msg = await self.enviar_mensagem(bot, chat_id, registro['texto'], plataforma, editar=anterior)
+                editada = getattr(msg, 'message_id', None) is not None
+                if not editada:
+                    logging.warning(f"Não foi possível editar a mensagem {anterior} de {chat_id}; enviando um lembrete novo.")
+            if not editada:
+                msg = await self.enviar_mensagem(bot, chat_id, registro['texto'], plataforma)
+        except Exception as e:
+            logging.error(f"Erro ao enviar mensagem para {chat_id}: {e}")
+            msg, erro = None, e
+        else:
+            erro = getattr(msg, 'description', None) or getattr(msg, 'error_message', None) or "Mensagem não enviada"
+
+        message_id = getattr(msg, 'message_id', None)
+        if message_id is None:
+            self._metricas.incrementar('notificador_falhas_total', plataforma=plataforma)
             try:
-                await asyncio.gather(*self._pending_tasks, return_exceptions=True)
-                logging.warning(f"Todas as {self._contador_mensagens} mensagens foram processadas.")
+                await self.db.concluir_outbox(registro['id'], erro=erro)
             except Exception as e:
-                logging.error(f"Erro ao aguardar tasks: {e}")
-            finally:
-                self._pending_tasks.clear()
-                self._contador_mensagens = 0  # Reseta contador para próximo ciclo
+                # Não foi entregue: se voltar a ser reservada após a expiração, não duplica
+                logging.error(f"Erro ao marcar a falha da mensagem {registro['id']} no outbox: {e}")
+            return
+
+        if editada:
+            self._metricas.incrementar('notificador_mensagens_editadas_total', plataforma=plataforma)
+        else:
+            self._metricas.incrementar('notificador_mensagens_enviadas_total', plataforma=plataforma)
+            if anterior:
+                self._remocoes.setdefault((registro['token'], chat_id, plataforma), []).append(anterior)
+        await self._registrar_envio(registro, message_id)
 
-    async def enviar_mensagens_usuario_sequencial(self, token, chat_id, plataforma, textos_mensagens):
+    async def _registrar_envio(self, registro, message_id, concluido=False):
         """
-        Envia múltiplas mensagens para o mesmo usuário de forma sequencial.
-        Aguarda 3 segundos entre cada mensagem para evitar rate limit do Telegram.
-        
-        Args:
-            token: Token do bot
-            chat_id: ID do chat/usuário
-            plataforma: 'telegram' ou 'discord'
-            textos_mensagens: Lista de textos das mensagens
+        Marca no outbox uma mensagem já entregue e registra as entregas dela.
+
+        Se o banco falhar, o envio fica em _envios_nao_registrados (com o passo em que
+        parou) até _registrar_envios_pendentes conseguir gravá-lo; enquanto isso a
+        mensagem não é reenviada por este worker, mesmo que volte a ser reservada.
         """
-        # Obtém bot do cache
-        if plataforma == 'telegram':
-            bot = self._get_telegram_bot(token)
-        else:
-            bot = self._get_discord_bot(token)
-        
-        for i, texto in enumerate(textos_mensagens):
-            # Aguarda 3 segundos entre mensagens do mesmo usuário
-            if i > 0:
-                await asyncio.sleep(3)
-            
+        try:
+            if not concluido:
+                await self.db.concluir_outbox(registro['id'], message_id=message_id)
+                concluido = True
+            await self.db.registrar_entregas(registro, message_id)
+        except Exception as e:
+            logging.error(f"Mensagem {registro['id']} entregue, mas não registrada no banco: {e}")
+            self._envios_nao_registrados[registro['id']] = (registro, message_id, concluido)
+
+    async def _registrar_envios_pendentes(self):
+        """Tenta de novo gravar os envios entregues cujo registro no banco falhou."""
+        pendentes, self._envios_nao_registrados = self._envios_nao_registrados, {}
+        for registro, message_id, concluido in pendentes.values():
+            await self._registrar_envio(registro, message_id, concluido)
+
+    def _backoff(self, tentativa):
+        """Espera exponencial com jitter completo para falhas de rede: uniforme em [0, min(teto, base * 2^n)]."""
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** (tentativa - 1)))
+
+    async def apagar_substituidas(self):
+        """Apaga em lote, por rota, os lembretes substituídos por mensagens novas no ciclo."""
+        remocoes, self._remocoes = self._remocoes, {}
+        for (token, chat_id, plataforma), message_ids in remocoes.items():
             try:
-                await self.enviar_mensagem(bot, chat_id, texto, plataforma)
+                await self._get_bot(token, plataforma).delete_messages(chat_id, message_ids)
+                self._metricas.incrementar('notificador_mensagens_apagadas_total', len(message_ids), plataforma=plataforma)
             except Exception as e:
-                logging.error(f"Erro ao enviar mensagem para {chat_id}: {e}")
+                logging.error(f"Erro ao apagar {len(message_ids)} lembretes substituídos em {chat_id}: {e}")
 
-    async def _enviar_com_fila(self, token, chat_id, plataforma, textos_mensagens):
+    async def enviar_mensagem(self, bot, chat_id, texto, plataforma, editar=None):
         """
-        Wrapper que controla concorrência usando semáforo (fila com limite de 20 processos).
-        Garante que no máximo 20 usuarios recebem mensagens em paralelo.
+        Envia uma mensagem com novas tentativas (com `editar`, edita essa mensagem).
+        - 429 (RateLimitError): o bot já pausou o RateLimiter pelo retry_after informado pela
+          plataforma; a nova tentativa espera só no acquire, uma única vez para todos os envios.
+        - Falhas de rede/timeout: espera exponencial com jitter.
+        - Outros erros: não são retentados.
         """
-        async with self._semaphoro:
-            await self.enviar_mensagens_usuario_sequencial(token, chat_id, plataforma, textos_mensagens)
-
-    async def enviar_mensagem(self, bot, chat_id, texto, plataforma):
-        delays = [10, 20, 60, 120, 300]  # segundos
-        for tentativa, delay in enumerate([0] + delays):
+        for tentativa in range(1, self.MAX_TENTATIVAS + 1):
             try:
-                if plataforma == 'telegram':
-                    msg = await bot.send_message(chat_id=chat_id, text=texto, parse_mode="MarkdownV2")
-                else:
-                    msg = await bot.send_message(chat_id=chat_id, text=texto)
-                self._contador_mensagens += 1  # Incrementa contador de mensagens
+                with self._metricas.cronometrar('notificador_envio_segundos', plataforma=plataforma):
+                    if editar is not None:
+                        if plataforma == 'telegram':
+                            msg = await bot.edit_message_text(chat_id=chat_id, message_id=editar, text=texto, parse_mode="MarkdownV2")
+                        else:
+                            msg = await bot.edit_message(chat_id, editar, texto)
+                    elif plataforma == 'telegram':
+                        msg = await bot.send_message(chat_id=chat_id, text=texto, parse_mode="MarkdownV2")
+                    else:
+                        msg = await bot.send_message(chat_id=chat_id, text=texto)
                 logging.warning(f"Mensagem enviada para {chat_id} após {tentativa} tentativa(s).")
-                break
+                return msg
+            except RateLimitError as execao:
+                erro, espera = execao, 0
+                self._metricas.incrementar('notificador_rate_limit_total', plataforma=plataforma, escopo=execao.escopo or 'desconhecido')
+            except (RuntimeError, TimeoutError, OSError) as execao:
+                erro, espera = execao, self._backoff(tentativa)
             except Exception as execao:
-                if tentativa < len(delays):
-                    logging.warning(f"Tentativa {tentativa+1} falhou para {chat_id}. Erro: {execao}. Retentando em {delay}s...")
-                    await asyncio.sleep(delay)
-                else:
-                    logging.critical(f"Mensagem NÃO enviada para o {chat_id} após {tentativa+1} tentativas. Erro final: {execao}")
+                logging.critical(f"Mensagem NÃO enviada para o {chat_id}. Erro não recuperável: {execao}")
+                return None
+
+            if tentativa == self.MAX_TENTATIVAS:
+                logging.critical(f"Mensagem NÃO enviada para o {chat_id} após {tentativa} tentativas. Erro final: {erro}")
+                return None
+            logging.warning(f"Tentativa {tentativa} falhou para {chat_id}. Erro: {erro}. Retentando em {espera:.1f}s...")
+            self._metricas.incrementar('notificador_retentativas_total', plataforma=plataforma)
+            if espera:
+                await asyncio.sleep(espera)
 
-    async def health_check(self):
+    async def aguardar_prontidao(self, db):
+        """
+        Espera até que os dados de que o notificador precisa estejam acessíveis.
+
+        NOTIFICADOR_PRONTIDAO escolhe a verificação:
+            - 'banco' (padrão): o arquivo existe e as migrações já criaram tabelas e colunas;
+            - 'http': SITE_URL/health/ responde 200, usando a sessão compartilhada do pool;
+            - 'nenhuma': não espera.
+        Entre as tentativas, espera exponencial com jitter (PRONTIDAO_BASE até PRONTIDAO_MAX).
+        No modo 'banco' a conexão aberta na verificação é a que o notificador passa a usar.
+        """
+        modo = os.getenv('NOTIFICADOR_PRONTIDAO', 'banco')
+        if modo == 'nenhuma':
+            return
+        verificar = self._verificar_http if modo == 'http' else self._verificar_banco
+        inicio = time.monotonic()
+        tentativa = 0
         while True:
+            tentativa += 1
+            motivo = await verificar(db)
+            if motivo is None:
+                logging.warning(f"Notificador pronto ({modo}) após {tentativa} verificação(ões) em {time.monotonic() - inicio:.1f}s.")
+                return
+            espera = min(self.PRONTIDAO_MAX, self.PRONTIDAO_BASE * 2 ** (tentativa - 1)) * random.uniform(0.5, 1)
+            logging.warning(f"Aguardando prontidão ({modo}): {motivo}. Nova verificação em {espera:.1f}s.")
+            await asyncio.sleep(espera)
+
+    async def _verificar_banco(self, db):
+        if not db.conectado:
             try:
-                health_url = f"{os.getenv('SITE_URL')}health/"
-                logging.warning(f"Verificando saúde do serviço em {health_url}...")
-                async with aiohttp.ClientSession() as client:
-                    async with client.get(health_url) as resp:
-                        if resp.status == 200:
-                            logging.warning("Serviço está saudável.")
-                            break
-                        else:
-                            logging.warning(f"Serviço retornou status {resp.status}.")
-            except Exception as e:
-                logging.error(f"Erro ao verificar saúde do serviço: {e}")
-            await asyncio.sleep(1)
+                # criar=False: não deixa o SQLite criar um arquivo vazio antes do migrate do Django
+                await db.connect(criar=False)
+            except db.banco.erros as e:
+                return f"{type(e).__name__}: {e}"
+        return await db.verificar_esquema()
 
-    async def main(self):
-        await self.health_check()
+    async def _verificar_http(self, db):
+        health_url = f"{os.getenv('SITE_URL')}health/"
+        try:
+            session = await get_pool().get_session(health_url)
+            async with session.get(health_url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                if resp.status == 200:
+                    return None
+                return f"{health_url} retornou status {resp.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return f"{health_url} inacessível ({type(e).__name__}: {e})"
 
+    async def main(self):
         db = DB()
-        await db.connect()
+        await self.aguardar_prontidao(db)
+        if not db.conectado:
+            await db.connect()
         self.db = db
+        metricas = await self._metricas.servir()
 
-        while True:
-            await self.buscar_vencimentos()
-            
-            # Aguarda que TODAS as mensagens sejam enviadas antes de fechar as sessões
-            await self._wait_for_pending_tasks()
-            
-            # Fecha todas as sessões de bots para evitar "Unclosed client session"
-            await self._cleanup_bots()
-            
-            logging.critical("Notificações enviadas. Aguardando até a próxima meia-noite...")
-
-            # Calcula segundos até a próxima meia-noite
-            agora = datetime.datetime.now()
-            amanha = agora + datetime.timedelta(days=1)
-            proxima_meia_noite = amanha.replace(hour=0, minute=0, second=0, microsecond=0)
-            segundos_ate_meia_noite = (proxima_meia_noite - agora).total_seconds()
-
-            await asyncio.sleep(segundos_ate_meia_noite)
+        # Conexões próprias para os leases: a renovação roda em paralelo aos envios
+        db_leases = DB()
+        await db_leases.connect()
+        self._particao = Particionamento(db_leases)
+        await self._particao.rebalancear()
+        leases = asyncio.create_task(self._particao.manter())
+
+        dia = None
+        try:
+            while True:
+                hoje = self.hoje_local()
+                if dia is not None and hoje != dia:
+                    # Virada do dia: libera os bots do dia anterior
+                    # (as conexões do pool permanecem abertas)
+                    await self._cleanup_bots()
+                    self._base_metricas = self._metricas.instantaneo()
+                dia = hoje
+
+                # Varre (se necessário), avisa parcelas novas e envia o que já está no horário;
+                # após uma queda, retoma de onde parou e envia o que ficou atrasado
+                proximo = await self.executar_ciclo(hoje)
+
+                await asyncio.sleep(self.segundos_ate_proximo_ciclo(hoje, proximo))
+        finally:
+            leases.cancel()
+            # Última tentativa de registrar o que foi entregue antes de soltar os shards
+            await self._registrar_envios_pendentes()
+            # Devolve os shards para que os outros workers assumam sem esperar a expiração
+            await self._particao.encerrar()
+            # Fecha as sessões compartilhadas para evitar "Unclosed client session"
+            await get_pool().close()
+            if self._email_bot is not None:
+                await self._email_bot.close()
+            if metricas is not None:
+                await metricas.cleanup()
+            await db_leases.close()
+            await db.close()
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -0,0 +1,69 @@
+"""
+Agenda do notificador: fuso, janelas de envio e espera entre os ciclos.
+
+Cada rota recebe um horário fixo dentro da janela de envio do dono (Notificacao.inicio_envio
+e fim_envio, no fuso FUSO), derivado do hash da rota; o mesmo hash divide as rotas em
+shards entre os workers (ver notificador_leases). Todos os horários devolvidos estão em
+UTC, como o outbox os grava.
+"""
+import os
+import zlib
+import datetime
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+from notificador_banco import como_datahora, como_hora
+
+# Mesmo fuso do Django (settings.TIME_ZONE); o notificador roda fora do Django e lê a mesma variável
+FUSO = ZoneInfo(os.getenv('TIME_ZONE', 'America/Sao_Paulo'))
+
+def hash_rota(token, chat_id):
+    """Hash estável da rota, usado no agendamento e na divisão em shards."""
+    return zlib.crc32(f"{token}:{chat_id}".encode())
+
+def hoje_local():
+    return datetime.datetime.now(FUSO).date()
+
+def agendar(linha, agora, espalhar=True):
+    """
+    Calcula quando a mensagem de uma rota deve sair, dentro da janela de envio do dono.
+
+    Com `espalhar`, cada rota recebe um horário fixo (derivado do hash da rota) entre o
+    início da janela, ou agora, e o fim dela; assim os envios não se concentram num
+    único instante e as mensagens de um mesmo chat continuam juntas e em ordem.
+    Sem `espalhar`, a mensagem sai assim que a janela permitir.
+
+    Args:
+        linha (dict): Linha da varredura (inicio_envio, fim_envio, bot_token, chat_id_val)
+        agora (datetime): Horário atual no fuso FUSO
+
+    Returns:
+        datetime | None: Horário (com fuso) do envio, ou None para envio imediato
+    """
+    inicio = datetime.datetime.combine(agora.date(), como_hora(linha['inicio_envio']), tzinfo=FUSO)
+    fim = datetime.datetime.combine(agora.date(), como_hora(linha['fim_envio']), tzinfo=FUSO)
+    if fim <= inicio:
+        # Janela que atravessa a meia-noite (ex.: 22:00 às 06:00)
+        if agora < fim:
+            inicio -= timedelta(days=1)
+        else:
+            fim += timedelta(days=1)
+    # Janela do dia já passou (atraso ou queda): recupera enviando agora
+    if agora >= fim:
+        return None
+    base = max(inicio, agora)
+    if espalhar:
+        base += (fim - base) * (hash_rota(linha['bot_token'], linha['chat_id_val']) % 10000 / 10000)
+    if base <= agora:
+        return None
+    return base.astimezone(datetime.timezone.utc)
+
+def segundos_ate_proximo_ciclo(hoje, proximo, intervalo):
+    """Espera até o primeiro entre: `intervalo` do agendador, próximo envio agendado e a meia-noite local."""
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    # Compara em UTC para que a virada de horário de verão não altere a conta
+    meia_noite = datetime.datetime.combine(hoje + timedelta(days=1), datetime.time(), tzinfo=FUSO)
+    espera = min(intervalo, (meia_noite.astimezone(datetime.timezone.utc) - agora).total_seconds())
+    if proximo is not None:
+        agendado = como_datahora(proximo)
+        espera = min(espera, (agendado - agora).total_seconds())
+    return max(1, espera)
@@ -0,0 +1,263 @@
+"""
+Acesso assíncrono ao banco do notificador, com a mesma configuração (DATABASES) do Django.
+
+As consultas de notificador.DB são escritas uma única vez, com marcadores `?` e
+parâmetros Python (date, datetime com fuso, bool); cada backend converte o que precisa:
+
+    BancoSQLite   - arquivo em WAL; um pool de conexões de leitura (query_only, mmap)
+                    e uma única conexão de escrita, serializada. Leitores não bloqueiam
+                    o uvicorn/admin, e o notificador só disputa o lock ao escrever.
+    BancoPostgres - pool do asyncpg (dependência opcional: `pip install emprestimos[postgres]`);
+                    converte `?` para `$n` e devolve os tipos nativos do asyncpg
+                    (datetime, date, time, Decimal).
+
+As linhas voltam com os tipos de cada driver; quem formata a saída normaliza com
+`como_datahora`, `como_data` e `como_hora`, que aceitam tanto o texto do SQLite quanto
+os tipos nativos do asyncpg.
+"""
+import os
+import re
+import asyncio
+import logging
+import datetime
+import aiosqlite
+from functools import lru_cache
+from contextlib import asynccontextmanager
+
+UTC = datetime.timezone.utc
+
+def configuracao_django(alias='default'):
+    """
+    Lê settings.DATABASES[alias] do Django sem inicializar as apps.
+    Sem o Django disponível, cai no SQLite padrão (db.sqlite3 no diretório atual).
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    try:
+        from django.conf import settings
+        return dict(settings.DATABASES[alias])
+    except Exception as e:
+        logging.error(f"Não foi possível ler DATABASES do Django ({e}); usando db.sqlite3.")
+        return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'}
+
+def criar_banco(config=None):
+    """Instancia (sem conectar) o backend correspondente ao ENGINE da configuração."""
+    config = config or configuracao_django()
+    engine = config.get('ENGINE', '')
+    opcoes = config.get('OPTIONS') or {}
+    if engine.endswith('sqlite3'):
+        return BancoSQLite(str(config['NAME']), timeout=opcoes.get('timeout', 30))
+    if engine.endswith(('postgresql', 'postgis')):
+        return BancoPostgres(
+            database=config.get('NAME'), user=config.get('USER') or None, password=config.get('PASSWORD') or None,
+            host=config.get('HOST') or None, port=int(config['PORT']) if config.get('PORT') else None,
+        )
+    raise ValueError(f"Banco não suportado pelo notificador: {engine}")
+
+def _texto_datahora(valor):
+    """datetime -> texto em UTC sem fuso, como o Django grava no SQLite."""
+    if valor.tzinfo is not None:
+        valor = valor.astimezone(UTC).replace(tzinfo=None)
+    return valor.isoformat(" ")
+
+def como_datahora(valor):
+    """Texto do SQLite (UTC sem fuso) ou datetime/date do asyncpg -> datetime em UTC."""
+    if isinstance(valor, str):
+        valor = datetime.datetime.fromisoformat(valor)
+    elif not isinstance(valor, datetime.datetime):
+        valor = datetime.datetime.combine(valor, datetime.time())
+    if valor.tzinfo is None:
+        return valor.replace(tzinfo=UTC)
+    return valor.astimezone(UTC)
+
+def como_data(valor):
+    """Texto 'YYYY-MM-DD[...]', date ou datetime (levado a UTC) -> date."""
+    if isinstance(valor, str):
+        return datetime.date.fromisoformat(valor[:10])
+    if isinstance(valor, datetime.datetime):
+        return como_datahora(valor).date()
+    return valor
+
+def como_hora(valor):
+    """Texto 'HH:MM[:SS]' ou time -> time."""
+    if isinstance(valor, str):
+        return datetime.time.fromisoformat(valor)
+    return valor
+
+class BancoSQLite():
+    dialeto = 'sqlite'
+    erros = (aiosqlite.Error, OSError)
+
+    def __init__(self, caminho, timeout=30, leitores=None, mmap=None):
+        self.caminho = caminho
+        self.timeout = timeout
+        self.total_leitores = leitores or int(os.getenv('NOTIFICADOR_DB_LEITORES', 4))
+        self.mmap = int(os.getenv('NOTIFICADOR_DB_MMAP', 256 * 1024 * 1024)) if mmap is None else mmap
+        self._escrita = None
+        self._lock_escrita = asyncio.Lock()
+        self._leitores = asyncio.Queue()
+        self._conexoes_leitura = []
+
+    async def abrir(self, criar=True):
+        """
+        Abre a conexão de escrita e o pool de leitura. Com `criar=False`, falha se o
+        arquivo ainda não existe (em vez de criar um banco vazio antes do migrate).
+        """
+        if not criar and not os.path.exists(self.caminho):
+            raise FileNotFoundError(f"arquivo {self.caminho} ainda não existe")
+        # Vários workers escrevem no mesmo arquivo: espera o lock em vez de falhar com "database is locked"
+        self._escrita = await aiosqlite.connect(self.caminho, timeout=self.timeout)
+        self._escrita.row_factory = aiosqlite.Row
+        # WAL é persistente no arquivo: leitores (notificador e site) não bloqueiam a escrita
+        await self._escrita.execute("PRAGMA journal_mode = WAL")
+        await self._escrita.execute("PRAGMA synchronous = NORMAL")
+        await self._escrita.execute("PRAGMA foreign_keys = ON")
+        for _ in range(self.total_leitores):
+            conexao = await aiosqlite.connect(self.caminho, timeout=self.timeout)
+            conexao.row_factory = aiosqlite.Row
+            await conexao.execute("PRAGMA query_only = ON")
+            await conexao.execute(f"PRAGMA mmap_size = {self.mmap}")
+            self._conexoes_leitura.append(conexao)
+            self._leitores.put_nowait(conexao)
+
+    @property
+    def aberto(self):
+        return self._escrita is not None
+
+    @staticmethod
+    def _parametros(parametros):
+        convertidos = []
+        for valor in parametros:
+            if isinstance(valor, datetime.datetime):
+                valor = _texto_datahora(valor)
+            elif isinstance(valor, (datetime.date, datetime.time)):
+                valor = valor.isoformat()
+            elif isinstance(valor, bool):
+                valor = int(valor)
+            convertidos.append(valor)
+        return convertidos
+
+    @asynccontextmanager
+    async def _leitura(self):
+        conexao = await self._leitores.get()
+        try:
+            yield conexao
+        finally:
+            self._leitores.put_nowait(conexao)
+
+    async def buscar(self, sql, parametros=()):
+        async with self._leitura() as conexao:
+            async with conexao.execute(sql, self._parametros(parametros)) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def buscar_um(self, sql, parametros=()):
+        linhas = await self.buscar(sql, parametros)
+        return linhas[0] if linhas else None
+
+    async def iterar(self, sql, parametros=(), tamanho_lote=500):
+        """Lê o resultado em lotes (listas de dicts), segurando um leitor até o fim."""
+        async with self._leitura() as conexao:
+            async with conexao.execute(sql, self._parametros(parametros)) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(tamanho_lote)
+                    if not rows:
+                        break
+                    yield [dict(row) for row in rows]
+
+    async def executar(self, sql, parametros=()):
+        """Executa um comando de escrita e faz commit. Returns: linhas afetadas."""
+        async with self._lock_escrita:
+            async with self._escrita.execute(sql, self._parametros(parametros)) as cursor:
+                afetadas = cursor.rowcount
+            await self._escrita.commit()
+        return afetadas
+
+    async def executar_retornando(self, sql, parametros=()):
+        """Executa um comando de escrita com RETURNING e faz commit. Returns: linhas retornadas."""
+        async with self._lock_escrita:
+            # execute_fetchall executa e consome o RETURNING numa única operação da conexão
+            rows = await self._escrita.execute_fetchall(sql, self._parametros(parametros))
+            await self._escrita.commit()
+        return [dict(row) for row in rows]
+
+    async def fechar(self):
+        if self._escrita is not None:
+            await self._escrita.close()
+            self._escrita = None
+        for conexao in self._conexoes_leitura:
+            await conexao.close()
+        self._conexoes_leitura = []
+        self._leitores = asyncio.Queue()
+
+@lru_cache(maxsize=256)
+def _marcadores_postgres(sql):
+    """Troca os marcadores `?` por `$1, $2...`, ignorando os que estão dentro de '...'."""
+    partes = re.split(r"('(?:[^']|'')*')", sql)
+    contador = 0
+    for indice in range(0, len(partes), 2):
+        trechos = partes[indice].split('?')
+        texto = trechos[0]
+        for trecho in trechos[1:]:
+            contador += 1
+            texto += f"${contador}{trecho}"
+        partes[indice] = texto
+    return ''.join(partes)
+
+class BancoPostgres():
+    dialeto = 'postgres'
+
+    def __init__(self, **conexao):
+        try:
+            import asyncpg
+        except ImportError as e:
+            raise RuntimeError("O notificador precisa do asyncpg para PostgreSQL: pip install emprestimos[postgres]") from e
+        self._asyncpg = asyncpg
+        self.erros = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError)
+        self.conexao = {chave: valor for chave, valor in conexao.items() if valor is not None}
+        self.tamanho_pool = int(os.getenv('NOTIFICADOR_DB_POOL', 10))
+        self._pool = None
+
+    async def abrir(self, criar=True):
+        self._pool = await self._asyncpg.create_pool(min_size=1, max_size=self.tamanho_pool, **self.conexao)
+
+    @property
+    def aberto(self):
+        return self._pool is not None
+
+    @staticmethod
+    def _linha(record):
+        return dict(record.items())
+
+    async def buscar(self, sql, parametros=()):
+        rows = await self._pool.fetch(_marcadores_postgres(sql), *parametros)
+        return [self._linha(row) for row in rows]
+
+    async def buscar_um(self, sql, parametros=()):
+        row = await self._pool.fetchrow(_marcadores_postgres(sql), *parametros)
+        return self._linha(row) if row is not None else None
+
+    async def iterar(self, sql, parametros=(), tamanho_lote=500):
+        async with self._pool.acquire() as conexao:
+            # Cursores do PostgreSQL só existem dentro de uma transação
+            async with conexao.transaction(readonly=True):
+                lote = []
+                async for row in conexao.cursor(_marcadores_postgres(sql), *parametros, prefetch=tamanho_lote):
+                    lote.append(self._linha(row))
+                    if len(lote) >= tamanho_lote:
+                        yield lote
+                        lote = []
+                if lote:
+                    yield lote
+
+    async def executar(self, sql, parametros=()):
+        status = await self._pool.execute(_marcadores_postgres(sql), *parametros)
+        # "UPDATE 3", "DELETE 0", "INSERT 0 1": o último número é a quantidade de linhas
+        ultimo = status.rsplit(' ', 1)[-1]
+        return int(ultimo) if ultimo.isdigit() else 0
+
+    async def executar_retornando(self, sql, parametros=()):
+        return await self.buscar(sql, parametros)
+
+    async def fechar(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
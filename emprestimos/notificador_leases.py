@@ -0,0 +1,143 @@
+"""
+Leases do notificador e divisão das rotas em shards entre os workers.
+
+Um lease (core_notificador_lease) é um recurso arrendado por um dono até `expira_em`;
+o worker que cai deixa de renová-lo e, quando expira, outro worker o assume. A varredura
+do dia ('varredura'), o batimento de cada worker ('worker:<id>') e cada shard
+('shard:<n>') são leases.
+"""
+import os
+import math
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import timedelta
+from notificador_agenda import hash_rota
+
+class LeasesDB():
+    """
+    Consultas de leases, misturadas em notificador.DB (usa o `banco` e o `agora()` dele).
+    """
+
+    async def adquirir_lease(self, recurso, dono, ttl):
+        """
+        Tenta arrendar `recurso` por `ttl` segundos. Consegue se ninguém o detém,
+        se o lease anterior expirou ou se já pertence a `dono` (renovação).
+
+        Returns:
+            bool: True se `dono` detém o lease
+        """
+        agora = self.agora()
+        rows = await self.banco.executar_retornando(
+            '''
+            INSERT INTO core_notificador_lease (recurso, dono, expira_em, renovado_em) VALUES (?, ?, ?, ?)
+            ON CONFLICT(recurso) DO UPDATE
+                SET dono = excluded.dono, expira_em = excluded.expira_em, renovado_em = excluded.renovado_em
+                WHERE core_notificador_lease.dono = excluded.dono
+                   OR core_notificador_lease.expira_em < excluded.renovado_em
+            RETURNING dono
+            ''',
+            (recurso, dono, agora + timedelta(seconds=ttl), agora)
+        )
+        return len(rows) > 0
+
+    async def renovar_leases(self, dono, ttl):
+        """
+        Renova de uma vez todos os leases ainda válidos de `dono`.
+
+        Returns:
+            list[str]: Recursos renovados (os expirados não voltam)
+        """
+        agora = self.agora()
+        rows = await self.banco.executar_retornando(
+            '''
+            UPDATE core_notificador_lease SET expira_em = ?, renovado_em = ?
+            WHERE dono = ? AND expira_em >= ?
+            RETURNING recurso
+            ''',
+            (agora + timedelta(seconds=ttl), agora, dono, agora)
+        )
+        return [row['recurso'] for row in rows]
+
+    async def leases_ativos(self, prefixo):
+        """Retorna {recurso: dono} dos leases válidos cujo recurso começa com `prefixo`."""
+        rows = await self.banco.buscar(
+            "SELECT recurso, dono FROM core_notificador_lease WHERE recurso LIKE ? AND expira_em >= ?",
+            (f"{prefixo}%", self.agora())
+        )
+        return {row['recurso']: row['dono'] for row in rows}
+
+    async def limpar_leases_expirados(self):
+        """Remove leases vencidos (ex.: batimentos de workers que caíram)."""
+        await self.banco.executar("DELETE FROM core_notificador_lease WHERE expira_em < ?", (self.agora(),))
+
+    async def liberar_lease(self, dono, recurso=None):
+        """Libera um lease de `dono` ou, sem `recurso`, todos eles."""
+        if recurso is None:
+            await self.banco.executar("DELETE FROM core_notificador_lease WHERE dono = ?", (dono,))
+        else:
+            await self.banco.executar(
+                "DELETE FROM core_notificador_lease WHERE recurso = ? AND dono = ?", (recurso, dono)
+            )
+
+class Particionamento():
+    """
+    Divide as rotas entre os workers do notificador por meio de leases no banco.
+
+    Cada rota pertence a um shard (hash de token e chat_id módulo NOTIFICADOR_SHARDS).
+    Cada worker mantém um lease de batimento ('worker:<id>') e arrenda até
+    ceil(shards / workers vivos) shards. Quando um worker entra, os demais liberam o
+    excedente; quando um worker morre, seus leases expiram e os shards são redistribuídos.
+    Como uma rota só é enviada pelo dono do shard, cada chat continua em ordem
+    e no ritmo do RateLimiter de um único processo.
+    """
+    def __init__(self, db, total_shards=None, ttl=None):
+        self.db = db
+        self.total_shards = total_shards or int(os.getenv('NOTIFICADOR_SHARDS', 16))
+        self.ttl = ttl or int(os.getenv('NOTIFICADOR_LEASE_SEGUNDOS', 30))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.shards = set()
+        self.workers = 1
+
+    def shard_de(self, token, chat_id):
+        return hash_rota(token, chat_id) % self.total_shards
+
+    async def rebalancear(self):
+        """Renova os leases deste worker, libera o excedente e arrenda shards livres até a cota."""
+        renovados = await self.db.renovar_leases(self.worker_id, self.ttl)
+        await self.db.limpar_leases_expirados()
+        await self.db.adquirir_lease(f"worker:{self.worker_id}", self.worker_id, self.ttl)
+        self.workers = max(1, len(await self.db.leases_ativos('worker:')))
+        cota = math.ceil(self.total_shards / self.workers)
+
+        meus = sorted(int(recurso.split(':')[1]) for recurso in renovados if recurso.startswith('shard:'))
+        while len(meus) > cota:
+            await self.db.liberar_lease(self.worker_id, f"shard:{meus.pop()}")
+
+        if len(meus) < cota:
+            ocupados = await self.db.leases_ativos('shard:')
+            for shard in range(self.total_shards):
+                if len(meus) >= cota:
+                    break
+                if f"shard:{shard}" in ocupados:
+                    continue
+                if await self.db.adquirir_lease(f"shard:{shard}", self.worker_id, self.ttl):
+                    meus.append(shard)
+
+        if set(meus) != self.shards:
+            logging.warning(f"Worker {self.worker_id}: {len(meus)}/{self.total_shards} shards ({self.workers} workers vivos).")
+        self.shards = set(meus)
+
+    async def manter(self):
+        """Renova e rebalanceia periodicamente, bem antes do lease expirar."""
+        while True:
+            try:
+                await self.rebalancear()
+            except Exception as e:
+                logging.error(f"Erro ao renovar leases do worker {self.worker_id}: {e}")
+            await asyncio.sleep(self.ttl / 3)
+
+    async def encerrar(self):
+        self.shards = set()
+        await self.db.liberar_lease(self.worker_id)
@@ -0,0 +1,329 @@
+"""
+Templates das mensagens do notificador.
+
+Cada combinação de plataforma e janela (dias até o vencimento) tem um template
+montado uma única vez na importação, já convertido para formatação com % e uma
+ordem fixa de campos; renderizar uma mensagem é só escapar os campos variáveis e
+aplicar o template. O escape usa tabelas de str.translate e tanto os textos escapados
+quanto datas e valores formatados são cacheados, pois se repetem muito numa varredura
+(a mesma parcela sai para cada rota do dono, o mesmo cliente aparece em várias parcelas).
+
+Lembretes de parcelas vencidas ganham uma linha com o atraso e a data do lembrete;
+ela muda a cada dia, então editar o lembrete anterior (Notificacao.vencidas_reenvio)
+mostra o atraso atual em vez de repetir o mesmo texto.
+
+No e-mail, o texto é um fragmento HTML (quebras de linha ainda como \n): negrito
+vira <b>, links viram <a> e o texto variável é escapado para HTML; o aioemail
+converte as quebras e envolve o fragmento na casca de core.email_template.
+
+No modo resumo, as parcelas de uma rota viram uma linha curta cada e são empacotadas,
+agrupadas por janela, no menor número de mensagens dentro do limite da plataforma.
+"""
+import os
+import re
+from decimal import Decimal
+from string import Formatter
+from functools import lru_cache
+from notificador_banco import como_data, como_datahora
+
+SITE_URL = os.getenv('SITE_URL', '')
+
+# Caracteres reservados do MarkdownV2 do Telegram (fora de links e blocos de código)
+_TABELA_MARKDOWN_V2 = str.maketrans({c: f"\\{c}" for c in '\\_*[]()~`>#+-=|{}.!'})
+# Dentro do (...) de um link, só ")" e "\" precisam de escape
+_TABELA_URL_MARKDOWN_V2 = str.maketrans({c: f"\\{c}" for c in '\\)'})
+# Markdown do Discord: ênfase, código, spoiler, citação, cabeçalho e links
+_TABELA_DISCORD = str.maketrans({c: f"\\{c}" for c in '\\*_~`|>#[]()'})
+# HTML do e-mail: texto e valores de atributo
+_TABELA_HTML = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'})
+
+def escapar_markdown_v2(texto):
+    return texto.translate(_TABELA_MARKDOWN_V2)
+
+def escapar_discord(texto):
+    return texto.translate(_TABELA_DISCORD)
+
+def escapar_html(texto):
+    return texto.translate(_TABELA_HTML)
+
+ESCAPE_PLATAFORMA = {
+    'telegram': escapar_markdown_v2,
+    'discord': escapar_discord,
+    'email': escapar_html,
+}
+
+NEGRITO = {
+    'telegram': ('*', '*'),
+    'discord': ('**', '**'),
+    'email': ('<b>', '</b>'),
+}
+
+# Links em markdown ([texto](url)) do texto fixo dos templates, convertidos para <a> no e-mail
+_LINK_MARKDOWN = re.compile(r"\[([^\]]*)\]\(([^)]*)\)")
+
+def _link(texto, url, plataforma):
+    """Link com texto fixo (sem caracteres reservados) e `url` já escapada para a plataforma."""
+    if plataforma == 'email':
+        return f'<a href="{url}">{texto}</a>'
+    return f"[{texto}]({url})"
+
+def _escapar_url(url, plataforma):
+    if plataforma == 'telegram':
+        return url.translate(_TABELA_URL_MARKDOWN_V2)
+    if plataforma == 'email':
+        return escapar_html(url)
+    return url
+
+@lru_cache(maxsize=16384)
+def _escapado(texto, plataforma):
+    return ESCAPE_PLATAFORMA[plataforma](texto)
+
+@lru_cache(maxsize=4096)
+def formatar_data(valor):
+    """'YYYY-MM-DD[ HH:MM...]', date ou datetime -> 'DD/MM/YYYY' (devolve o texto original se não for uma data)."""
+    if valor is not None and not isinstance(valor, str):
+        return f"{como_data(valor):%d/%m/%Y}"
+    data = (valor or '')[:10]
+    if len(data) == 10 and data[4] == '-' and data[7] == '-':
+        return f"{data[8:10]}/{data[5:7]}/{data[0:4]}"
+    return data
+
+@lru_cache(maxsize=8192)
+def formatar_valor(valor):
+    """Valor no formato brasileiro (1.234,56), como utils.formatar_dinheiro; Decimal não passa por float."""
+    if valor is None:
+        valor = 0
+    return f"{Decimal(str(valor)):,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
+
+@lru_cache(maxsize=8192)
+def _valor_escapado(valor, plataforma):
+    return ESCAPE_PLATAFORMA[plataforma](formatar_valor(valor))
+
+@lru_cache(maxsize=4096)
+def _data_escapada(valor, plataforma):
+    return ESCAPE_PLATAFORMA[plataforma](formatar_data(valor))
+
+@lru_cache(maxsize=8192)
+def _admin_url(emprestimo_id, plataforma):
+    if emprestimo_id is None:
+        return '#'
+    return _escapar_url(f"{SITE_URL}emprestimosadmindjango/core/emprestimo/{emprestimo_id}/change/", plataforma)
+
+# Títulos por janela: -1 = vencida, 0..3 = dias até o vencimento; None = aviso genérico
+TITULOS = {
+    -1: ("🚨", "Parcela {numero_parcela} VENCIDA!"),
+    0: ("⚠️", "Parcela {numero_parcela} vence HOJE!"),
+    1: ("🔔", "Parcela {numero_parcela} vence AMANHÃ!"),
+    2: ("📅", "Parcela {numero_parcela} vence em 2 DIAS!"),
+    3: ("📆", "Parcela {numero_parcela} vence em 3 DIAS!"),
+    None: ("📢", "Aviso de Parcela {numero_parcela}"),
+}
+
+CORPO = (
+    "{titulo}\n\n"
+    "👤 Cliente: {{cliente}}\n"
+    "💳 Parcela: {{numero_parcela}} de {{total_parcelas}}\n"
+    "💰 Valor Empréstimo: R$ {{valor_emprestimo}}\n"
+    "💰 Valor Parcela: R$ {{valor_parcela}}\n"
+    "📆 Início: {{data_inicio}}\n"
+    "📅 Vencimento: {{data_fim}}\n"
+    "📈 Porcentagem: {{porcentagem}}%\n"
+    "🔗 Status: {{status}}\n"
+    "👨‍💼 Responsável: {{responsavel}}\n"
+    "📝 Motivo: {{motivo}}\n"
+    "\n🔗 [Ver Empréstimo no Admin]({{admin_url}})"
+)
+
+# Ordem dos valores passados aos templates compilados (o título usa numero_parcela)
+CAMPOS = (
+    'numero_parcela', 'cliente', 'numero_parcela', 'total_parcelas', 'valor_emprestimo',
+    'valor_parcela', 'data_inicio', 'data_fim', 'porcentagem', 'status', 'responsavel',
+    'motivo', 'admin_url',
+)
+
+def _compilar(plataforma, emoji, titulo):
+    """
+    Gera o template final de uma plataforma/janela. O texto fixo do título é escapado
+    aqui, uma única vez, preservando o campo {numero_parcela}; depois os campos {nome}
+    viram %s (bem mais rápido que str.format com argumentos nomeados).
+    """
+    abre, fecha = NEGRITO[plataforma]
+    escapar = ESCAPE_PLATAFORMA[plataforma]
+    titulo = '{numero_parcela}'.join(escapar(parte) for parte in titulo.split('{numero_parcela}'))
+    template = CORPO.format(titulo=f"{emoji} {abre}{titulo}{fecha}")
+    if plataforma == 'email':
+        template = _LINK_MARKDOWN.sub(lambda m: _link(m.group(1), m.group(2), 'email'), template)
+
+    partes = list(Formatter().parse(template))
+    campos = tuple(campo for _, campo, _, _ in partes if campo is not None)
+    if campos != CAMPOS:
+        raise ValueError(f"Template de {plataforma} fora da ordem de CAMPOS: {campos}")
+    return ''.join(literal.replace('%', '%%') + ('%s' if campo is not None else '') for literal, campo, _, _ in partes)
+
+TEMPLATES = {
+    (plataforma, janela): _compilar(plataforma, emoji, titulo)
+    for plataforma in ESCAPE_PLATAFORMA
+    for janela, (emoji, titulo) in TITULOS.items()
+}
+
+@lru_cache(maxsize=4096)
+def linha_atraso(data_fim, hoje, plataforma):
+    """Linha final dos lembretes de vencidas: dias de atraso em `hoje` e a data do lembrete."""
+    dias = (hoje - como_data(data_fim)).days
+    texto = f"⏱️ Em atraso há {dias} dia{'s' if dias != 1 else ''} — lembrete de {hoje:%d/%m/%Y}"
+    return "\n" + ESCAPE_PLATAFORMA[plataforma](texto)
+
+def renderizar_vencimento(linha, hoje=None):
+    """
+    Monta o texto de uma linha de DB.iterar_vencimentos no formato da plataforma da rota.
+    Com `hoje`, lembretes de vencidas terminam com a linha de atraso.
+
+    Returns:
+        str: MarkdownV2 (Telegram), markdown do Discord ou HTML (e-mail)
+    """
+    plataforma = linha['chat_plataforma'] if linha['chat_plataforma'] in ESCAPE_PLATAFORMA else 'telegram'
+    janela = linha['dias'] if linha['dias'] in TITULOS else None
+    emprestimo_id = linha['emprestimo_id']
+    numero_parcela = _escapado(str(linha['numero_parcela']), plataforma)
+
+    # Mesma ordem de CAMPOS
+    texto = TEMPLATES[(plataforma, janela)] % (
+        numero_parcela,
+        _escapado(linha['cliente_nome_completo'] or '', plataforma),
+        numero_parcela,
+        _escapado(str(linha['emprestimo_parcelas']), plataforma) if emprestimo_id is not None else '?',
+        _valor_escapado(linha['emprestimo_valor'] if emprestimo_id is not None else 0, plataforma),
+        _valor_escapado(linha['parcela_valor'], plataforma),
+        _data_escapada(linha['parcela_data_inicio'], plataforma),
+        _data_escapada(linha['parcela_data_fim'], plataforma),
+        _valor_escapado(linha['emprestimo_porcentagem'], plataforma) if emprestimo_id is not None else '',
+        'Pendente' if not linha['parcela_status'] else 'Paga',
+        _escapado(linha['responsavel_username'] or '', plataforma),
+        _escapado(linha['emprestimo_motivo'] or '', plataforma),
+        _admin_url(emprestimo_id, plataforma),
+    )
+    if janela == -1 and hoje is not None:
+        texto += linha_atraso(linha['parcela_data_fim'], hoje, plataforma)
+    return texto
+
+# --- Modo resumo: várias parcelas de uma rota agrupadas em poucas mensagens ---
+
+# Limite de tamanho por mensagem de cada plataforma
+LIMITE_CARACTERES = {
+    'telegram': 4096,
+    'discord': 2000,
+    'email': 100000,
+}
+# Folga para o sufixo " (parte i/n)" acrescentado depois do empacotamento
+FOLGA_PARTE = 32
+# Nomes muito longos são cortados para que uma única linha nunca estoure o limite
+TAMANHO_MAXIMO_NOME = 120
+
+# Ordem dos grupos no resumo: vencidas primeiro, depois hoje, 1, 2 e 3 dias
+GRUPOS_RESUMO = {
+    -1: ("🚨", "Vencidas"),
+    0: ("⚠️", "Vencem hoje"),
+    1: ("🔔", "Vencem amanhã"),
+    2: ("📅", "Vencem em 2 dias"),
+    3: ("📆", "Vencem em 3 dias"),
+}
+
+def tamanho_mensagem(texto):
+    """Tamanho em unidades UTF-16, como as plataformas contam (emojis valem 2)."""
+    return len(texto.encode('utf-16-le')) // 2
+
+def _negrito(texto, plataforma):
+    abre, fecha = NEGRITO[plataforma]
+    return f"{abre}{ESCAPE_PLATAFORMA[plataforma](texto)}{fecha}"
+
+# O texto fixo não tem caracteres reservados em nenhuma das plataformas
+ITEM_RESUMO = "• %s — parcela %s/%s — R$ %s — %s"
+
+def item_resumo(linha):
+    """
+    Reduz uma linha de DB.iterar_vencimentos ao que o resumo precisa, já com o texto
+    do item renderizado, para não guardar a linha inteira até o fim da varredura.
+
+    Returns:
+        tuple: (janela, data_fim, valor, parcela_id, texto)
+    """
+    plataforma = linha['chat_plataforma'] if linha['chat_plataforma'] in ESCAPE_PLATAFORMA else 'telegram'
+    janela = linha['dias'] if linha['dias'] in GRUPOS_RESUMO else -1
+    texto = ITEM_RESUMO % (
+        _escapado((linha['cliente_nome_completo'] or '')[:TAMANHO_MAXIMO_NOME], plataforma),
+        _escapado(str(linha['numero_parcela']), plataforma),
+        _escapado(str(linha['emprestimo_parcelas']), plataforma) if linha['emprestimo_id'] is not None else '?',
+        _valor_escapado(linha['parcela_valor'], plataforma),
+        _data_escapada(linha['parcela_data_fim'], plataforma),
+    )
+    return (janela, como_datahora(linha['parcela_data_fim']), Decimal(str(linha['parcela_valor'] or 0)), linha['parcela_id'], texto)
+
+@lru_cache(maxsize=4)
+def _admin_url_parcelas(plataforma):
+    return _escapar_url(f"{SITE_URL}emprestimosadmindjango/core/parcela/?status__exact=0", plataforma)
+
+def montar_resumos(itens, plataforma, data_referencia):
+    """
+    Empacota os itens de uma rota no menor número de mensagens que cabem no limite
+    da plataforma, agrupados por janela e com o total no início.
+
+    Args:
+        itens (list[tuple]): Saída de item_resumo
+        plataforma (str): 'telegram', 'discord' ou 'email'
+        data_referencia (date): Data da varredura
+
+    Returns:
+        list[tuple[str, list[int], int]]: (texto, ids das parcelas, janela mais urgente) por mensagem
+    """
+    plataforma = plataforma if plataforma in ESCAPE_PLATAFORMA else 'telegram'
+    escapar = ESCAPE_PLATAFORMA[plataforma]
+    limite = LIMITE_CARACTERES[plataforma] - FOLGA_PARTE
+
+    total = sum(item[2] for item in itens)
+    cabecalho = (
+        f"📋 {_negrito(f'Resumo de parcelas — {data_referencia:%d/%m/%Y}', plataforma)}\n"
+        + escapar(f"{len(itens)} parcela{'s' if len(itens) != 1 else ''} — Total R$ {formatar_valor(total)}")
+    )
+    rodape = f"\n\n🔗 {_link('Ver parcelas no Admin', _admin_url_parcelas(plataforma), plataforma)}"
+
+    mensagens = []   # cada uma: [partes do texto, ids, janela mais urgente, tamanho]
+
+    def nova_mensagem(texto_inicial):
+        mensagens.append([[texto_inicial], [], None, tamanho_mensagem(texto_inicial)])
+        return mensagens[-1]
+
+    atual = nova_mensagem(cabecalho)
+    for janela, (emoji, titulo) in GRUPOS_RESUMO.items():
+        grupo = sorted((item for item in itens if item[0] == janela), key=lambda item: item[1])
+        if not grupo:
+            continue
+        # O cabeçalho do grupo vai junto com o primeiro item, para não ficar sozinho no fim de uma mensagem
+        cabecalho_grupo = f"\n\n{emoji} {_negrito(f'{titulo} ({len(grupo)})', plataforma)} — R$ {_valor_escapado(sum(item[2] for item in grupo), plataforma)}"
+        continuacao = f"{emoji} {_negrito(f'{titulo} (continuação)', plataforma)}"
+        for posicao, (_, _, _, parcela_id, texto) in enumerate(grupo):
+            bloco = f"{cabecalho_grupo if posicao == 0 else ''}\n{texto}"
+            tamanho = tamanho_mensagem(bloco)
+            if atual[3] + tamanho > limite and atual[1]:
+                atual = nova_mensagem(cabecalho_grupo.lstrip('\n') if posicao == 0 else continuacao)
+                bloco = f"\n{texto}"
+                tamanho = tamanho_mensagem(bloco)
+            atual[0].append(bloco)
+            atual[1].append(parcela_id)
+            atual[2] = janela if atual[2] is None else min(atual[2], janela)
+            atual[3] += tamanho
+
+    # Se o link não cabe na última mensagem, ele vai numa mensagem própria em vez de se perder
+    if mensagens[-1][3] + tamanho_mensagem(rodape) <= limite:
+        mensagens[-1][0].append(rodape)
+    else:
+        janela = mensagens[-1][2]
+        nova_mensagem(rodape.lstrip('\n'))[2] = janela
+
+    resultado = []
+    for indice, (partes, ids, janela, _) in enumerate(mensagens, start=1):
+        texto = ''.join(partes)
+        if len(mensagens) > 1:
+            primeira, _, resto = texto.partition('\n')
+            texto = f"{primeira} {escapar(f'(parte {indice}/{len(mensagens)})')}\n{resto}"
+        resultado.append((texto, ids, -1 if janela is None else janela))
+    return resultado
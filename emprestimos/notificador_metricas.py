@@ -0,0 +1,258 @@
+"""
+Métricas do notificador.
+
+Registro em memória de contadores, medidores e histogramas com rótulos, exposto no
+formato texto do Prometheus por um servidor aiohttp.web local (NOTIFICADOR_METRICAS_PORTA,
+0 desliga) e resumido em JSON ao fim de cada ciclo, gravado em
+ExecucaoNotificador.relatorio para consulta no admin.
+
+Os contadores nunca são zerados no processo (o Prometheus calcula as taxas); o resumo
+do dia é a diferença em relação a um instantâneo tirado na virada do dia.
+"""
+import os
+import time
+import errno
+import bisect
+import logging
+from aiohttp import web
+from contextlib import contextmanager
+
+# Limites (em segundos) dos histogramas
+BUCKETS_ENVIO = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_CONSULTA = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+# nome -> (tipo, ajuda, limites do histograma)
+DEFINICOES = {
+    'notificador_consulta_segundos': ('counter', 'Tempo de leitura da varredura, atribuído à janela das linhas lidas', None),
+    'notificador_parcelas_varridas_total': ('counter', 'Linhas (parcela x rota) lidas na varredura, por janela', None),
+    'notificador_varredura_segundos': ('histogram', 'Duração de cada varredura completa', BUCKETS_CONSULTA),
+    'notificador_render_segundos': ('counter', 'Tempo gasto montando textos de mensagens', None),
+    'notificador_render_mensagens_total': ('counter', 'Mensagens (individuais ou partes de resumo) montadas', None),
+    'notificador_fila_linhas': ('gauge', 'Linhas lidas do banco aguardando renderização', None),
+    'notificador_fila_rotas': ('gauge', 'Mensagens aguardando nas filas das rotas', None),
+    'notificador_outbox_restantes': ('gauge', 'Mensagens do dia ainda não concluídas no outbox', None),
+    'notificador_envio_segundos': ('histogram', 'Latência de cada chamada de envio à plataforma', BUCKETS_ENVIO),
+    'notificador_mensagens_enviadas_total': ('counter', 'Mensagens aceitas pela plataforma', None),
+    'notificador_mensagens_editadas_total': ('counter', 'Lembretes de vencidas atualizados editando a mensagem anterior', None),
+    'notificador_mensagens_apagadas_total': ('counter', 'Lembretes substituídos apagados em lote', None),
+    'notificador_rate_limit_total': ('counter', 'Respostas 429 recebidas', None),
+    'notificador_retentativas_total': ('counter', 'Novas tentativas de envio', None),
+    'notificador_falhas_total': ('counter', 'Mensagens que falharam em definitivo', None),
+}
+
+class Histograma:
+    __slots__ = ('limites', 'contagens', 'soma', 'total')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # o último é o +Inf
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def copia(self):
+        copia = Histograma(self.limites)
+        copia.contagens = list(self.contagens)
+        copia.soma, copia.total = self.soma, self.total
+        return copia
+
+    def percentil(self, p, base=None):
+        """
+        Limite superior do bucket que contém o percentil `p` (aproximado, como no Prometheus).
+        Acima do último limite devolve '+Inf' (JSON não aceita infinito).
+        """
+        contagens = [c - (base.contagens[i] if base else 0) for i, c in enumerate(self.contagens)]
+        total = sum(contagens)
+        if not total:
+            return None
+        alvo, acumulado = p * total, 0
+        for limite, contagem in zip(self.limites, contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return limite
+        return '+Inf'
+
+def _escapar_rotulo(valor):
+    # Formato de exposição: barra invertida, aspas e quebra de linha são escapadas nos valores de rótulo
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{chave}="{_escapar_rotulo(valor)}"' for chave, valor in rotulos) + '}'
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Metricas:
+    """
+    Registro de métricas do processo. Rótulos são passados como argumentos nomeados:
+        metricas.incrementar('notificador_falhas_total', plataforma='telegram')
+    """
+    def __init__(self):
+        self._valores = {}      # (nome, rótulos ordenados) -> número ou Histograma
+        self._funcoes = {}      # nome -> função que devolve o valor atual do medidor
+        self._maximos = {}      # (nome, rótulos) -> maior valor do medidor desde o último instantâneo
+        self.iniciado_em = time.time()
+
+    @staticmethod
+    def _chave(nome, rotulos):
+        return (nome, tuple(sorted((chave, str(valor)) for chave, valor in rotulos.items())))
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = self._chave(nome, rotulos)
+        self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def medir(self, nome, valor, **rotulos):
+        chave = self._chave(nome, rotulos)
+        self._valores[chave] = valor
+        if valor > self._maximos.get(chave, float('-inf')):
+            self._maximos[chave] = valor
+
+    def medidor(self, nome, funcao):
+        """Medidor calculado no momento da leitura (ex.: tamanho de uma fila)."""
+        self._funcoes[nome] = funcao
+
+    def observar(self, nome, valor, **rotulos):
+        chave = self._chave(nome, rotulos)
+        histograma = self._valores.get(chave)
+        if histograma is None:
+            histograma = self._valores[chave] = Histograma(DEFINICOES[nome][2])
+        histograma.observar(valor)
+
+    @contextmanager
+    def cronometrar(self, nome, **rotulos):
+        """Observa (histograma) ou soma (contador) a duração do bloco em segundos."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            decorrido = time.perf_counter() - inicio
+            if DEFINICOES[nome][0] == 'histogram':
+                self.observar(nome, decorrido, **rotulos)
+            else:
+                self.incrementar(nome, decorrido, **rotulos)
+
+    def _atualizar_funcoes(self):
+        for nome, funcao in self._funcoes.items():
+            try:
+                self.medir(nome, funcao())
+            except Exception as e:
+                logging.error(f"Erro ao calcular a métrica {nome}: {e}")
+
+    def exportar_prometheus(self):
+        """Texto no formato de exposição do Prometheus (version 0.0.4)."""
+        self._atualizar_funcoes()
+        por_nome = {}
+        for (nome, rotulos), valor in self._valores.items():
+            por_nome.setdefault(nome, []).append((rotulos, valor))
+        linhas = []
+        for nome in sorted(por_nome):
+            tipo, ajuda, _ = DEFINICOES.get(nome, ('untyped', '', None))
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in sorted(por_nome[nome]):
+                if isinstance(valor, Histograma):
+                    acumulado = 0
+                    for limite, contagem in zip(valor.limites + (float('inf'),), valor.contagens):
+                        acumulado += contagem
+                        linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos + (('le', _formatar_numero(limite)),))} {acumulado}")
+                    linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {_formatar_numero(valor.soma)}")
+                    linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {valor.total}")
+                else:
+                    linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {_formatar_numero(valor)}")
+        linhas.append("# TYPE notificador_iniciado_em_segundos gauge")
+        linhas.append(f"notificador_iniciado_em_segundos {self.iniciado_em}")
+        return '\n'.join(linhas) + '\n'
+
+    def instantaneo(self):
+        """Cópia dos valores atuais, base para o resumo de um período. Reinicia os máximos dos medidores."""
+        self._maximos = {}
+        return {
+            chave: valor.copia() if isinstance(valor, Histograma) else valor
+            for chave, valor in self._valores.items()
+        }
+
+    def resumo(self, base=None):
+        """
+        Resumo em JSON do período desde o instantâneo `base`: contadores como diferença,
+        histogramas com total, média e percentis, medidores com valor atual e máximo.
+
+        Returns:
+            dict: nome da métrica -> rótulos ("plataforma=telegram", ou "total") -> valor
+        """
+        self._atualizar_funcoes()
+        base = base or {}
+        resultado = {}
+        for (nome, rotulos), valor in self._valores.items():
+            rotulo = ','.join(f"{chave}={v}" for chave, v in rotulos) or 'total'
+            anterior = base.get((nome, rotulos))
+            tipo = DEFINICOES.get(nome, ('untyped',))[0]
+            if isinstance(valor, Histograma):
+                total = valor.total - (anterior.total if anterior else 0)
+                soma = valor.soma - (anterior.soma if anterior else 0)
+                if not total:
+                    continue
+                item = {
+                    'total': total,
+                    'media': round(soma / total, 4),
+                    'p50': valor.percentil(0.5, anterior),
+                    'p95': valor.percentil(0.95, anterior),
+                    'p99': valor.percentil(0.99, anterior),
+                }
+            elif tipo == 'gauge':
+                item = {'atual': valor, 'maximo': self._maximos.get((nome, rotulos), valor)}
+            else:
+                item = valor - (anterior or 0)
+                if not item:
+                    continue
+                item = round(item, 4) if isinstance(item, float) else item
+            resultado.setdefault(nome, {})[rotulo] = item
+        return resultado
+
+    async def _responder(self, request):
+        return web.Response(text=self.exportar_prometheus(), content_type='text/plain', charset='utf-8',
+                            headers={'Cache-Control': 'no-store'})
+
+    async def servir(self, host=None, porta=None, tentativas=16):
+        """
+        Sobe o endpoint GET /metrics. Com vários workers no mesmo host, cada um usa a
+        primeira porta livre a partir de NOTIFICADOR_METRICAS_PORTA.
+
+        Returns:
+            web.AppRunner | None: runner a ser encerrado com `cleanup()`, ou None se desligado
+        """
+        host = host or os.getenv('NOTIFICADOR_METRICAS_HOST', '127.0.0.1')
+        porta = int(os.getenv('NOTIFICADOR_METRICAS_PORTA', 9108)) if porta is None else porta
+        if not porta:
+            return None
+        app = web.Application()
+        app.router.add_get('/metrics', self._responder)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        for deslocamento in range(tentativas):
+            try:
+                await web.TCPSite(runner, host, porta + deslocamento).start()
+                logging.warning(f"Métricas em http://{host}:{porta + deslocamento}/metrics")
+                return runner
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    raise
+        logging.error(f"Nenhuma porta livre para as métricas entre {porta} e {porta + tentativas - 1}.")
+        await runner.cleanup()
+        return None
+
+_METRICAS = None
+
+def get_metricas() -> Metricas:
+    """Registro global do processo."""
+    global _METRICAS
+    if _METRICAS is None:
+        _METRICAS = Metricas()
+    return _METRICAS
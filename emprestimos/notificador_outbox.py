@@ -0,0 +1,211 @@
+"""
+Outbox do notificador e índice de entregas.
+
+Toda mensagem passa pelo outbox (core_notification_outbox) antes de sair: a varredura
+grava com uma chave de idempotência, os workers reservam lotes dos seus shards e marcam
+cada mensagem como enviada ou com falha. As entregas concluídas vão para o índice
+core_notificacao_entrega, que decide quando a mesma parcela pode ser avisada de novo.
+"""
+from datetime import timedelta
+from notificador_banco import como_data, como_datahora
+
+class OutboxDB():
+    """
+    Consultas do outbox e do índice de entregas, misturadas em notificador.DB
+    (usa o `banco` e o `agora()` dele).
+    """
+    # Limite seguro de parâmetros por consulta no SQLite
+    TAMANHO_LOTE_IN = 500
+
+    async def inserir_outbox(self, registros):
+        """
+        Grava em lote as mensagens no outbox. Registros cuja chave de idempotência
+        já existe são ignorados, então repetir a varredura não duplica envios.
+        Registros com status 'enviando' já entram reservados para este processo.
+
+        Args:
+            registros (list[dict]): chave, parcela_id, notificacao_id, janela,
+                data_referencia, token, chat_id, plataforma, texto, agendado_para, shard e, opcionalmente,
+                status, parcelas (ids incluídos num resumo), message_id_anterior e reenvio
+
+        Returns:
+            list[dict]: id e chave das mensagens efetivamente gravadas
+        """
+        if not registros:
+            return []
+        agora = self.agora()
+        valores = []
+        for r in registros:
+            reservado = r.get('status') == 'enviando'
+            valores.extend((
+                r['chave'], r['parcela_id'], r['notificacao_id'], r['janela'], r['data_referencia'],
+                r['token'], r['chat_id'], r['plataforma'], r['texto'], r.get('parcelas'),
+                r.get('message_id_anterior'), r.get('reenvio'),
+                'enviando' if reservado else 'pendente', 1 if reservado else 0,
+                agora if reservado else None, agora, r.get('agendado_para'), r['shard'],
+            ))
+        marcadores = ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"] * len(registros))
+        return await self.banco.executar_retornando(
+            f'''
+            INSERT INTO core_notification_outbox
+                (chave, parcela_id, notificacao_id, janela, data_referencia, token, chat_id, plataforma,
+                 texto, parcelas, message_id_anterior, reenvio, status, tentativas, reservado_em, criado_em, agendado_para, shard)
+            VALUES {marcadores}
+            ON CONFLICT(chave) DO NOTHING
+            RETURNING id, chave
+            ''',
+            valores
+        )
+
+    async def reservar_outbox(self, hoje, limite, shards, expira_segundos=600):
+        """
+        Reserva atomicamente um lote de mensagens do dia cujo horário agendado já chegou,
+        apenas dos `shards` arrendados por este worker.
+        Mensagens em 'enviando' há mais de `expira_segundos` (processo que caiu)
+        voltam a ser elegíveis.
+
+        Returns:
+            list[dict]: Mensagens reservadas, em ordem de criação
+        """
+        if not shards:
+            return []
+        shards = sorted(shards)
+        agora = self.agora()
+        # No PostgreSQL, workers concorrentes pulam as linhas que outro já está reservando
+        travar = "FOR UPDATE SKIP LOCKED" if self.banco.dialeto == 'postgres' else ""
+        rows = await self.banco.executar_retornando(
+            f'''
+            UPDATE core_notification_outbox
+            SET status = 'enviando', reservado_em = ?, tentativas = tentativas + 1
+            WHERE id IN (
+                SELECT id FROM core_notification_outbox
+                WHERE data_referencia = ?
+                  AND shard IN ({", ".join("?" * len(shards))})
+                  AND (status = 'pendente' OR (status = 'enviando' AND reservado_em < ?))
+                  AND (agendado_para IS NULL OR agendado_para <= ?)
+                ORDER BY id
+                LIMIT ?
+                {travar}
+            )
+            RETURNING id, parcela_id, notificacao_id, janela, data_referencia, token, chat_id, plataforma, texto, parcelas,
+                      message_id_anterior, reenvio, tentativas
+            ''',
+            (agora, hoje, *shards, agora - timedelta(seconds=expira_segundos), agora, limite)
+        )
+        return sorted(rows, key=lambda r: r['id'])
+
+    async def situacao_outbox(self, hoje):
+        """
+        Returns:
+            dict: `restantes` (mensagens do dia ainda não concluídas) e `proximo`
+                (menor agendado_para entre elas, em UTC, ou None)
+        """
+        return await self.banco.buscar_um(
+            '''
+            SELECT COUNT(*) AS restantes, MIN(agendado_para) AS proximo
+            FROM core_notification_outbox
+            WHERE data_referencia = ? AND status IN ('pendente', 'enviando')
+            ''',
+            (hoje,)
+        )
+
+    async def expirar_outbox(self, hoje):
+        """
+        Expira mensagens de dias anteriores que não chegaram a ser enviadas (queda do
+        processo). O texto delas ("vence em N dias") ficou desatualizado; a varredura
+        de hoje gera os avisos corretos.
+
+        Returns:
+            int: Quantidade de mensagens expiradas
+        """
+        return await self.banco.executar(
+            '''
+            UPDATE core_notification_outbox
+            SET status = 'expirado', erro = 'Não enviada no dia de referência'
+            WHERE data_referencia < ? AND status IN ('pendente', 'enviando')
+            ''',
+            (hoje,)
+        )
+
+    async def concluir_outbox(self, outbox_id, message_id=None, erro=None):
+        """Marca uma mensagem do outbox como 'enviado' ou, se houve erro, como 'falha'."""
+        if erro is None:
+            await self.banco.executar(
+                "UPDATE core_notification_outbox SET status = 'enviado', message_id = ?, enviado_em = ?, erro = NULL WHERE id = ?",
+                (None if message_id is None else str(message_id), self.agora(), outbox_id)
+            )
+        else:
+            await self.banco.executar(
+                "UPDATE core_notification_outbox SET status = 'falha', erro = ? WHERE id = ?",
+                (str(erro), outbox_id)
+            )
+
+    @staticmethod
+    def proximo_aviso(janela, vencimento, hoje, diarias, intervalo):
+        """
+        Próximo dia em que a mesma (parcela, janela, rota) pode ser avisada de novo.
+        Janelas 0 a 3 são avisadas uma única vez por vencimento; vencidas são lembradas
+        todo dia até `diarias` dias após o vencimento e, depois, a cada `intervalo` dias.
+
+        Returns:
+            date | None: None quando não deve ser avisada de novo
+        """
+        if janela >= 0:
+            return None
+        if (hoje - vencimento.date()).days < diarias:
+            return hoje + timedelta(days=1)
+        return hoje + timedelta(days=intervalo) if intervalo else None
+
+    async def registrar_entregas(self, registro, message_id=None):
+        """
+        Registra no índice de entregas as parcelas de uma mensagem enviada (uma, ou as
+        de um resumo), com o vencimento atual e o próximo aviso pela política da rota.
+        O `message_id` só é guardado para mensagens individuais, as únicas editadas ou
+        apagadas no próximo lembrete.
+        """
+        if registro.get('parcelas'):
+            parcela_ids = [int(i) for i in registro['parcelas'].split(',')]
+            message_id = None
+        elif registro.get('parcela_id') is not None:
+            parcela_ids = [registro['parcela_id']]
+        else:
+            return
+        message_id = None if message_id is None else str(message_id)
+        hoje = como_data(registro['data_referencia'])
+        valores = []
+        for inicio in range(0, len(parcela_ids), self.TAMANHO_LOTE_IN):
+            lote = parcela_ids[inicio:inicio + self.TAMANHO_LOTE_IN]
+            rows = await self.banco.buscar(
+                f'''
+                SELECT p.id, p.data_fim, n.vencidas_diarias, n.vencidas_intervalo
+                FROM core_parcela p, core_notificacao n
+                WHERE n.id = ? AND p.id IN ({", ".join("?" * len(lote))})
+                ''',
+                (registro['notificacao_id'], *lote)
+            )
+            for row in rows:
+                vencimento = como_datahora(row['data_fim'])
+                # Mesma classificação da varredura, pelo dia de referência da mensagem
+                janela = -1 if vencimento.date() < hoje else min((vencimento.date() - hoje).days, 3)
+                proximo = self.proximo_aviso(janela, vencimento, hoje, row['vencidas_diarias'], row['vencidas_intervalo'])
+                valores.append((row['id'], registro['notificacao_id'], janela, vencimento, hoje, hoje, proximo, message_id))
+        for inicio in range(0, len(valores), 100):
+            lote = valores[inicio:inicio + 100]
+            await self.banco.executar(
+                f'''
+                INSERT INTO core_notificacao_entrega
+                    (parcela_id, notificacao_id, janela, vencimento, primeiro_envio, ultimo_envio, proximo_aviso, message_id, envios)
+                VALUES {", ".join(["(?, ?, ?, ?, ?, ?, ?, ?, 1)"] * len(lote))}
+                ON CONFLICT(parcela_id, notificacao_id, janela) DO UPDATE SET
+                    envios = CASE WHEN core_notificacao_entrega.vencimento = excluded.vencimento
+                                  THEN core_notificacao_entrega.envios + 1 ELSE 1 END,
+                    primeiro_envio = CASE WHEN core_notificacao_entrega.vencimento = excluded.vencimento
+                                          THEN core_notificacao_entrega.primeiro_envio ELSE excluded.primeiro_envio END,
+                    vencimento = excluded.vencimento,
+                    ultimo_envio = excluded.ultimo_envio,
+                    proximo_aviso = excluded.proximo_aviso,
+                    message_id = excluded.message_id
+                ''',
+                [valor for linha in lote for valor in linha]
+            )
+        return len(valores)
@@ -0,0 +1,40 @@
+"""
+Configuração comum dos testes: Django apontado para core.settings (o middleware e as
+views leem as settings) e um banco SQLite migrado por teste para as consultas do notificador.
+"""
+import os
+import shutil
+
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('DEBUG', '1')
+
+import django  # noqa: E402
+
+django.setup()
+
+
+@pytest.fixture(scope='session')
+def banco_modelo(tmp_path_factory):
+    """Arquivo SQLite com as migrations aplicadas uma única vez na sessão."""
+    from bench_notificador import configurar_django
+
+    caminho = str(tmp_path_factory.mktemp('banco') / 'modelo.sqlite3')
+    configurar_django(caminho)
+    from django.db import connections
+    connections.close_all()
+    return caminho
+
+
+@pytest.fixture
+def banco(banco_modelo, tmp_path):
+    """Cópia do banco migrado só deste teste, já configurada no Django."""
+    from django.db import connections
+
+    caminho = str(tmp_path / 'db.sqlite3')
+    shutil.copy(banco_modelo, caminho)
+    connections.close_all()
+    connections['default'].settings_dict['NAME'] = caminho
+    yield caminho
+    connections.close_all()
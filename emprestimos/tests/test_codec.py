@@ -0,0 +1,63 @@
+import importlib.util
+import sys
+
+import pytest
+
+import aiocodec
+from aiotelegram import TelegramResponse
+
+
+def _carregar_aiocodec(monkeypatch, *ausentes):
+    """Carrega uma cópia isolada do aiocodec como se `ausentes` não estivessem instalados."""
+    for nome in ausentes:
+        monkeypatch.setitem(sys.modules, nome, None)
+    spec = importlib.util.spec_from_file_location("aiocodec_isolado", aiocodec.__file__)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+@pytest.fixture(params=[(), ("msgspec",), ("msgspec", "orjson")], ids=lambda ausentes: "sem-" + "-".join(ausentes) if ausentes else "instalado")
+def codec(request, monkeypatch):
+    return _carregar_aiocodec(monkeypatch, *request.param)
+
+
+def test_fallback_sem_dependencias_opcionais(monkeypatch):
+    assert _carregar_aiocodec(monkeypatch, "msgspec", "orjson").CODEC == "json"
+
+
+def test_codificar_ida_e_volta(codec):
+    payload = {"chat_id": -100123, "text": "Olá, parcela 1/3 ✅", "disable_notification": True}
+    dados = codec.codificar(payload)
+    assert isinstance(dados, bytes)
+    assert codec.decodificar(dados) == payload
+
+
+def test_decodificar_struct_aninhado_ignora_campos_extras(codec):
+    class Chat(codec.Struct):
+        id: int | None = None
+
+    class Mensagem(codec.Struct):
+        message_id: int = 0
+        chat: Chat | None = None
+        text: str = ""
+
+    mensagem = codec.decodificar(
+        b'{"message_id": 7, "chat": {"id": -5, "type": "group"}, "text": "oi", "date": 1}', Mensagem
+    )
+    assert (mensagem.message_id, mensagem.chat.id, mensagem.text) == (7, -5, "oi")
+    assert codec.decodificar(b'{"message_id": 8}', Mensagem).chat is None
+
+
+def test_json_invalido_levanta_value_error(codec):
+    with pytest.raises(ValueError):
+        codec.decodificar(b"<html>502</html>")
+
+
+def test_resposta_do_telegram():
+    resposta = aiocodec.decodificar(
+        b'{"ok": false, "description": "Too Many Requests", "parameters": {"retry_after": 12}}', TelegramResponse
+    )
+    assert not resposta.ok
+    assert resposta.parameters.retry_after == 12
+    assert aiocodec.decodificar(b'{"ok": true, "result": true}', TelegramResponse).result is True
@@ -0,0 +1,53 @@
+import asyncio
+
+from aiodiscord import DiscordResponse
+from aiolote import enviar_em_lote
+from aioratelimit import RateLimitError
+from aiotelegram import MessageInfo, TelegramResponse
+
+
+def test_lote_separa_entregues_recusadas_e_erros():
+    respostas = {
+        'entregue': MessageInfo(message_id=1, chat_id=1, text='a'),
+        'telegram': TelegramResponse(ok=False, description="Bad Request: chat not found"),
+        'discord': DiscordResponse(success=False, error_message="Missing Access"),
+        'erro': ValueError("corpo inválido"),
+    }
+    tentativas = {}
+
+    async def enviar(item):
+        chat, tipo = item
+        tentativas[item] = tentativas.get(item, 0) + 1
+        if tipo == '429':
+            if tentativas[item] < 3:
+                raise RateLimitError(0)
+            return MessageInfo(message_id=2, chat_id=chat, text='b')
+        resposta = respostas[tipo]
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    itens = [(1, 'entregue'), (1, 'telegram'), (2, 'discord'), (2, 'erro'), (3, '429'), (4, '429')]
+    resultados, estatisticas = asyncio.run(enviar_em_lote(itens, lambda item: item[0], enviar, tentativas_429=2))
+
+    assert resultados[0].message_id == 1
+    assert resultados[1].ok is False and resultados[2].success is False
+    assert isinstance(resultados[3], ValueError)
+    assert all(isinstance(resultado, RateLimitError) for resultado in resultados[4:])
+    assert (estatisticas.total, estatisticas.ok, estatisticas.recusadas, estatisticas.erros) == (6, 1, 2, 3)
+    assert estatisticas.rate_limit == 4
+
+
+def test_lote_mantem_a_ordem_dentro_do_chat():
+    ordem = []
+
+    async def enviar(item):
+        await asyncio.sleep(0.001 * (5 - item[1]))
+        ordem.append(item)
+        return MessageInfo(message_id=item[1], chat_id=item[0], text='')
+
+    itens = [(chat, numero) for numero in range(5) for chat in ('a', 'b')]
+    _, estatisticas = asyncio.run(enviar_em_lote(itens, lambda item: item[0], enviar))
+    assert [item for item in ordem if item[0] == 'a'] == [('a', numero) for numero in range(5)]
+    assert estatisticas.ok == 10
+    assert estatisticas.em_voo_max == 2
@@ -0,0 +1,338 @@
+import asyncio
+import datetime
+import types
+from datetime import timedelta
+
+import pytest
+
+from bench_notificador import gerar_dados
+from notificador import DB, Notificador
+from notificador_leases import Particionamento
+
+UTC = datetime.timezone.utc
+
+
+def _hoje():
+    # Os vencimentos do gerar_dados são relativos a agora em UTC
+    return datetime.datetime.now(UTC).date()
+
+
+async def _conectar(caminho):
+    db = DB(caminho)
+    await db.connect()
+    return db
+
+
+async def _varrer(db, hoje, **kwargs):
+    return [linha async for linha in db.iterar_vencimentos(hoje, **kwargs)]
+
+
+def _registro(linha, hoje, shard=0, **extra):
+    return {
+        'chave': f"{hoje}:{linha['parcela_id']}:{linha['notificacao_id']}:{linha['dias']}",
+        'parcela_id': linha['parcela_id'],
+        'notificacao_id': linha['notificacao_id'],
+        'janela': linha['dias'],
+        'data_referencia': hoje,
+        'token': linha['bot_token'],
+        'chat_id': linha['chat_id_val'],
+        'plataforma': linha['chat_plataforma'],
+        'texto': f"parcela {linha['parcela_id']}",
+        'agendado_para': None,
+        'shard': shard,
+        **extra,
+    }
+
+
+def test_proximo_aviso():
+    hoje = datetime.date(2025, 3, 10)
+    vencimento = datetime.datetime(2025, 3, 8, 3, tzinfo=UTC)
+    assert DB.proximo_aviso(0, vencimento, hoje, 3, 7) is None
+    assert DB.proximo_aviso(3, vencimento, hoje, 3, 7) is None
+    # Vencida há 2 dias, com lembretes diários nos 3 primeiros: amanhã
+    assert DB.proximo_aviso(-1, vencimento, hoje, 3, 7) == datetime.date(2025, 3, 11)
+    # Depois dos diários, a cada `intervalo` dias ou nunca mais
+    assert DB.proximo_aviso(-1, vencimento, hoje, 2, 7) == datetime.date(2025, 3, 17)
+    assert DB.proximo_aviso(-1, vencimento, hoje, 2, 0) is None
+
+
+def test_varredura_traz_uma_linha_por_parcela_e_rota(banco):
+    esperado = gerar_dados(banco, emprestimos=30, donos=3, rotas_por_dono=2)
+    hoje = _hoje()
+
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            linhas = await _varrer(db, hoje, tamanho_lote=7)
+            marca = sorted({linha['parcela_id'] for linha in linhas})[-5]
+            novas = await _varrer(db, hoje, apos_parcela_id=marca)
+        finally:
+            await db.close()
+        return linhas, marca, novas
+
+    linhas, marca, novas = asyncio.run(cenario())
+    assert len(linhas) == esperado['mensagens_esperadas']
+    assert {linha['dias'] for linha in linhas} <= {-1, 0, 1, 2, 3}
+    assert len({(linha['parcela_id'], linha['notificacao_id']) for linha in linhas}) == len(linhas)
+    # Cliente, empréstimo e rota já vêm na mesma linha
+    assert all(linha['cliente_nome_completo'] and linha['emprestimo_id'] and linha['bot_token'] for linha in linhas)
+    # Ordem do índice: da mais distante para a vencida
+    datas = [linha['parcela_data_fim'] for linha in linhas]
+    assert datas == sorted(datas, reverse=True)
+    # Marca d'água: só parcelas posteriores
+    assert len(novas) == 4 * 2
+    assert all(linha['parcela_id'] > marca for linha in novas)
+
+
+def test_entrega_registrada_sai_da_varredura(banco):
+    gerar_dados(banco, emprestimos=20, donos=2, rotas_por_dono=2)
+    hoje = _hoje()
+
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            linhas = await _varrer(db, hoje)
+            entregues = linhas[:5]
+            for linha in entregues:
+                await db.registrar_entregas(_registro(linha, hoje), message_id=linha['parcela_id'])
+            return linhas, entregues, await _varrer(db, hoje)
+        finally:
+            await db.close()
+
+    linhas, entregues, depois = asyncio.run(cenario())
+    assert len(depois) == len(linhas) - len(entregues)
+    restantes = {(linha['parcela_id'], linha['notificacao_id']) for linha in depois}
+    assert not restantes & {(linha['parcela_id'], linha['notificacao_id']) for linha in entregues}
+
+
+def test_outbox_idempotente_reserva_por_shard_e_conclui(banco):
+    gerar_dados(banco, emprestimos=10, donos=2, rotas_por_dono=1)
+    hoje = _hoje()
+
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            linhas = await _varrer(db, hoje)
+            registros = [_registro(linha, hoje, shard=indice % 2) for indice, linha in enumerate(linhas)]
+            # Um deles ainda não chegou no horário agendado
+            registros[0]['agendado_para'] = db.agora() + timedelta(hours=1)
+            gravadas = await db.inserir_outbox(registros)
+            assert len(gravadas) == len(registros)
+            assert await db.inserir_outbox(registros) == []
+
+            reservadas = await db.reservar_outbox(hoje, 100, {1})
+            assert reservadas and all(r['id'] % 2 == 0 for r in reservadas)
+            assert await db.reservar_outbox(hoje, 100, {1}) == []
+            assert await db.reservar_outbox(hoje, 100, set()) == []
+
+            pares = await db.reservar_outbox(hoje, 100, {0})
+            assert registros[0]['parcela_id'] not in {r['parcela_id'] for r in pares}
+            assert len(pares) == len(registros) - len(reservadas) - 1
+
+            await db.concluir_outbox(reservadas[0]['id'], message_id=123)
+            await db.concluir_outbox(reservadas[1]['id'], erro="Forbidden")
+            situacao = await db.situacao_outbox(hoje)
+            status = {
+                linha['id']: linha for linha in await db.banco.buscar("SELECT id, status, message_id, erro FROM core_notification_outbox")
+            }
+            # O que não saiu no dia expira na virada, em vez de ser enviado com o texto velho
+            expiradas = await db.expirar_outbox(hoje + timedelta(days=1))
+            return registros, reservadas, situacao, status, expiradas
+        finally:
+            await db.close()
+
+    registros, reservadas, situacao, status, expiradas = asyncio.run(cenario())
+    assert (status[reservadas[0]['id']]['status'], status[reservadas[0]['id']]['message_id']) == ('enviado', '123')
+    assert (status[reservadas[1]['id']]['status'], status[reservadas[1]['id']]['erro']) == ('falha', 'Forbidden')
+    assert situacao['restantes'] == len(registros) - 2
+    assert situacao['proximo'] is not None
+    assert expiradas == len(registros) - 2
+
+
+def test_mensagem_reservada_por_processo_que_caiu_volta_a_ser_elegivel(banco):
+    gerar_dados(banco, emprestimos=1, donos=1, rotas_por_dono=1)
+    hoje = _hoje()
+
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            [linha] = await _varrer(db, hoje)
+            await db.inserir_outbox([_registro(linha, hoje)])
+            [primeira] = await db.reservar_outbox(hoje, 10, {0})
+            assert await db.reservar_outbox(hoje, 10, {0}, expira_segundos=600) == []
+            [retomada] = await db.reservar_outbox(hoje, 10, {0}, expira_segundos=-1)
+            return primeira, retomada
+        finally:
+            await db.close()
+
+    primeira, retomada = asyncio.run(cenario())
+    assert retomada['id'] == primeira['id']
+    assert retomada['tentativas'] == 2
+
+
+class _BotGravador:
+    """Bot falso que guarda, por chat, a ordem das mensagens recebidas."""
+    def __init__(self):
+        self.recebidas = {}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.recebidas.setdefault(chat_id, []).append(text)
+        await asyncio.sleep(0)
+        return types.SimpleNamespace(message_id=len(self.recebidas[chat_id]))
+
+
+def test_drenagem_do_outbox_usa_as_filas_de_rota(banco, monkeypatch):
+    gerar_dados(banco, emprestimos=12, donos=2, rotas_por_dono=2)
+    hoje = _hoje()
+    bot = _BotGravador()
+    abertas = []
+
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            linhas = await _varrer(db, hoje)
+            await db.inserir_outbox([_registro(linha, hoje) for linha in linhas])
+            notificador = Notificador()
+            notificador.db = db
+            notificador._particao = types.SimpleNamespace(shards={0})
+            monkeypatch.setattr(notificador, '_get_bot', lambda token, plataforma: bot)
+            abrir = notificador._abrir_rota
+            monkeypatch.setattr(notificador, '_abrir_rota', lambda chave, tamanho: abertas.append(chave) or abrir(chave, tamanho))
+            notificador.TAMANHO_LOTE_OUTBOX = 5
+            await notificador.processar_outbox(hoje)
+            return linhas, await db.banco.buscar("SELECT chat_id, texto, status FROM core_notification_outbox ORDER BY id")
+        finally:
+            await db.close()
+
+    linhas, outbox = asyncio.run(cenario())
+    assert {linha['status'] for linha in outbox} == {'enviado'}
+    assert abertas
+    # Dentro de cada chat, as mensagens saem na ordem do outbox
+    esperado = {}
+    for linha in outbox:
+        esperado.setdefault(linha['chat_id'], []).append(linha['texto'])
+    assert bot.recebidas == esperado
+
+
+def test_leases(banco):
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            assert await db.adquirir_lease('shard:0', 'a', 60)
+            assert not await db.adquirir_lease('shard:0', 'b', 60)
+            assert await db.adquirir_lease('shard:0', 'a', 60)  # renovação pelo próprio dono
+            assert await db.adquirir_lease('shard:1', 'a', -1)  # já nasce expirado
+            assert await db.adquirir_lease('shard:1', 'b', 60)  # expirado: outro dono assume
+            assert await db.renovar_leases('a', 60) == ['shard:0']
+            assert await db.leases_ativos('shard:') == {'shard:0': 'a', 'shard:1': 'b'}
+            await db.liberar_lease('a', 'shard:0')
+            assert await db.adquirir_lease('shard:0', 'b', 60)
+            await db.liberar_lease('b')
+            assert await db.leases_ativos('shard:') == {}
+        finally:
+            await db.close()
+
+    asyncio.run(cenario())
+
+
+def test_particionamento_divide_e_redistribui_os_shards(banco):
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            primeiro = Particionamento(db, total_shards=4, ttl=60)
+            segundo = Particionamento(db, total_shards=4, ttl=60)
+            await primeiro.rebalancear()
+            assert primeiro.shards == {0, 1, 2, 3}
+            # O segundo entra: o primeiro libera o excedente no próximo rebalanceamento
+            await segundo.rebalancear()
+            await primeiro.rebalancear()
+            await segundo.rebalancear()
+            assert len(primeiro.shards) == len(segundo.shards) == 2
+            assert primeiro.shards.isdisjoint(segundo.shards)
+            # O primeiro encerra: o segundo assume tudo
+            await primeiro.encerrar()
+            await segundo.rebalancear()
+            assert segundo.shards == {0, 1, 2, 3}
+        finally:
+            await db.close()
+
+    asyncio.run(cenario())
+
+
+class _BotFalso:
+    def __init__(self, resposta):
+        self.resposta = resposta
+
+    async def send_message(self, **kwargs):
+        if isinstance(self.resposta, Exception):
+            raise self.resposta
+        return self.resposta
+
+
+class _DBInstavel:
+    """DB que falha nas `falhas` primeiras chamadas de concluir_outbox."""
+    def __init__(self, db, falhas):
+        self._db = db
+        self.falhas = falhas
+
+    async def concluir_outbox(self, *args, **kwargs):
+        if self.falhas:
+            self.falhas -= 1
+            raise OSError("database is locked")
+        return await self._db.concluir_outbox(*args, **kwargs)
+
+    def __getattr__(self, nome):
+        return getattr(self._db, nome)
+
+
+@pytest.mark.parametrize('resposta', [ValueError("Bad Request: chat not found"), types.SimpleNamespace(description="Forbidden")])
+def test_envio_com_erro_marca_falha(banco, resposta):
+    gerar_dados(banco, emprestimos=1, donos=1, rotas_por_dono=1)
+    hoje = _hoje()
+
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            [linha] = await _varrer(db, hoje)
+            await db.inserir_outbox([_registro(linha, hoje)])
+            [registro] = await db.reservar_outbox(hoje, 10, {0})
+            notificador = Notificador()
+            notificador.db = db
+            await notificador._enviar_registro(_BotFalso(resposta), registro['chat_id'], 'telegram', registro)
+            return await db.banco.buscar_um("SELECT status, erro FROM core_notification_outbox"), notificador
+        finally:
+            await db.close()
+
+    linha, notificador = asyncio.run(cenario())
+    assert linha['status'] == 'falha'
+    assert linha['erro']
+    assert notificador._envios_nao_registrados == {}
+
+
+def test_envio_entregue_sem_registro_fica_em_memoria(banco):
+    gerar_dados(banco, emprestimos=1, donos=1, rotas_por_dono=1)
+    hoje = _hoje()
+
+    async def cenario():
+        db = await _conectar(banco)
+        try:
+            [linha] = await _varrer(db, hoje)
+            await db.inserir_outbox([_registro(linha, hoje)])
+            [registro] = await db.reservar_outbox(hoje, 10, {0})
+            notificador = Notificador()
+            notificador.db = _DBInstavel(db, falhas=1)
+            bot = _BotFalso(types.SimpleNamespace(message_id=77))
+            await notificador._enviar_registro(bot, registro['chat_id'], 'telegram', registro)
+            assert set(notificador._envios_nao_registrados) == {registro['id']}
+            pendente = await db.banco.buscar_um("SELECT status FROM core_notification_outbox")
+
+            await notificador._registrar_envios_pendentes()
+            assert notificador._envios_nao_registrados == {}
+            concluida = await db.banco.buscar_um("SELECT status, message_id FROM core_notification_outbox")
+            return pendente, concluida
+        finally:
+            await db.close()
+
+    pendente, concluida = asyncio.run(cenario())
+    assert pendente['status'] == 'enviando'
+    assert concluida == {'status': 'enviado', 'message_id': '77'}
@@ -0,0 +1,40 @@
+import datetime
+
+from notificador_agenda import FUSO, agendar, segundos_ate_proximo_ciclo
+
+UTC = datetime.timezone.utc
+
+
+def test_agendar_dentro_da_janela():
+    linha = {'inicio_envio': '08:00', 'fim_envio': '18:00', 'bot_token': '1:abc', 'chat_id_val': '-100'}
+    manha = datetime.datetime(2025, 3, 10, 6, 0, tzinfo=FUSO)
+    horario = agendar(linha, manha)
+    assert manha.replace(hour=8) <= horario < manha.replace(hour=18)
+    assert horario.tzinfo == UTC
+    # Mesma rota, mesmo horário
+    assert agendar(linha, manha) == horario
+    assert agendar(linha, manha, espalhar=False) == manha.replace(hour=8)
+    # Dentro da janela sem espalhar, ou depois dela: envio imediato
+    assert agendar(linha, manha.replace(hour=9), espalhar=False) is None
+    assert agendar(linha, manha.replace(hour=19)) is None
+
+
+def test_agendar_janela_que_atravessa_a_meia_noite():
+    linha = {'inicio_envio': datetime.time(22), 'fim_envio': datetime.time(6), 'bot_token': '1:abc', 'chat_id_val': '-100'}
+    madrugada = datetime.datetime(2025, 3, 10, 2, 0, tzinfo=FUSO)
+    horario = agendar(linha, madrugada)
+    assert horario is None or madrugada < horario < madrugada.replace(hour=6)
+    tarde = madrugada.replace(hour=15)
+    assert agendar(linha, tarde, espalhar=False) == tarde.replace(hour=22)
+
+
+def test_proximo_ciclo_respeita_intervalo_e_agendamento():
+    hoje = datetime.datetime.now(FUSO).date()
+    agora = datetime.datetime.now(UTC)
+    assert segundos_ate_proximo_ciclo(hoje, None, 30) <= 30
+    assert segundos_ate_proximo_ciclo(hoje, agora + datetime.timedelta(seconds=5), 3600) <= 5
+    # Agendamento no passado: não espera menos de 1 segundo
+    assert segundos_ate_proximo_ciclo(hoje, agora - datetime.timedelta(hours=1), 3600) == 1
+    # O texto do SQLite (UTC sem fuso) também serve
+    proximo = (agora + datetime.timedelta(seconds=10)).replace(tzinfo=None).isoformat(" ")
+    assert segundos_ate_proximo_ciclo(hoje, proximo, 3600) <= 10
@@ -0,0 +1,74 @@
+import asyncio
+import datetime
+
+import pytest
+
+from notificador_banco import BancoSQLite, _marcadores_postgres, como_data, como_datahora, como_hora
+
+UTC = datetime.timezone.utc
+
+
+def test_marcadores_postgres_numera_em_ordem():
+    assert _marcadores_postgres("SELECT * FROM t WHERE a = ? AND b IN (?, ?)") == (
+        "SELECT * FROM t WHERE a = $1 AND b IN ($2, $3)"
+    )
+    assert _marcadores_postgres("SELECT 1") == "SELECT 1"
+
+
+def test_marcadores_postgres_ignora_interrogacao_entre_aspas():
+    assert _marcadores_postgres("SELECT '?' || ?, 'it''s ?' WHERE x = ?") == (
+        "SELECT '?' || $1, 'it''s ?' WHERE x = $2"
+    )
+
+
+def test_como_datahora():
+    esperado = datetime.datetime(2025, 3, 1, 12, 30, tzinfo=UTC)
+    assert como_datahora("2025-03-01 12:30:00") == esperado
+    assert como_datahora(datetime.datetime(2025, 3, 1, 12, 30)) == esperado
+    sao_paulo = datetime.timezone(datetime.timedelta(hours=-3))
+    convertido = como_datahora(datetime.datetime(2025, 3, 1, 9, 30, tzinfo=sao_paulo))
+    assert convertido == esperado and convertido.tzinfo == UTC
+    assert como_datahora(datetime.date(2025, 3, 1)) == datetime.datetime(2025, 3, 1, tzinfo=UTC)
+
+
+def test_como_data_e_como_hora():
+    assert como_data("2025-03-01 23:59:59") == datetime.date(2025, 3, 1)
+    assert como_data(datetime.date(2025, 3, 1)) == datetime.date(2025, 3, 1)
+    # datetime com fuso é levado a UTC antes de virar data
+    sao_paulo = datetime.timezone(datetime.timedelta(hours=-3))
+    assert como_data(datetime.datetime(2025, 3, 1, 22, 0, tzinfo=sao_paulo)) == datetime.date(2025, 3, 2)
+    assert como_hora("08:30") == datetime.time(8, 30)
+    assert como_hora(datetime.time(8, 30)) == datetime.time(8, 30)
+
+
+def test_banco_sqlite_leitura_escrita_e_parametros(tmp_path):
+    async def cenario():
+        banco = BancoSQLite(str(tmp_path / "t.sqlite3"), leitores=2)
+        await banco.abrir()
+        try:
+            await banco.executar("CREATE TABLE t (id INTEGER PRIMARY KEY, quando TEXT, ativo INTEGER)")
+            quando = datetime.datetime(2025, 3, 1, 9, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=-3)))
+            inseridos = await banco.executar_retornando(
+                "INSERT INTO t (quando, ativo) VALUES (?, ?), (?, ?) RETURNING id", [quando, True, None, False]
+            )
+            assert [linha["id"] for linha in inseridos] == [1, 2]
+            # datetime com fuso é gravado em UTC sem fuso, como o Django
+            assert await banco.buscar_um("SELECT quando, ativo FROM t WHERE id = ?", [1]) == {
+                "quando": "2025-03-01 12:30:00", "ativo": 1,
+            }
+            assert await banco.buscar_um("SELECT * FROM t WHERE id = ?", [3]) is None
+            assert await banco.executar("UPDATE t SET ativo = ?", [True]) == 2
+            lotes = [lote async for lote in banco.iterar("SELECT id FROM t ORDER BY id", tamanho_lote=1)]
+            assert lotes == [[{"id": 1}], [{"id": 2}]]
+        finally:
+            await banco.fechar()
+        assert not banco.aberto
+
+    asyncio.run(cenario())
+
+
+def test_banco_sqlite_sem_criar_nao_abre_arquivo_inexistente(tmp_path):
+    banco = BancoSQLite(str(tmp_path / "nao_existe.sqlite3"))
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(banco.abrir(criar=False))
+    assert not (tmp_path / "nao_existe.sqlite3").exists()
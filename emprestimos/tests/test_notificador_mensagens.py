@@ -0,0 +1,153 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from notificador_mensagens import (
+    FOLGA_PARTE, LIMITE_CARACTERES, escapar_discord, escapar_html, escapar_markdown_v2, formatar_data,
+    formatar_valor, item_resumo, montar_resumos, renderizar_vencimento, tamanho_mensagem,
+)
+
+HOJE = datetime.date(2025, 3, 10)
+
+
+def _vencimento(plataforma, dias=0, **extra):
+    return {
+        'chat_plataforma': plataforma,
+        'dias': dias,
+        'parcela_id': 1,
+        'numero_parcela': 2,
+        'parcela_valor': '150.5',
+        'parcela_data_inicio': '2025-02-10 03:00:00',
+        'parcela_data_fim': f"{HOJE + datetime.timedelta(days=dias):%Y-%m-%d} 03:00:00",
+        'parcela_status': False,
+        'emprestimo_id': 9,
+        'emprestimo_parcelas': 3,
+        'emprestimo_valor': '1000',
+        'emprestimo_porcentagem': '10',
+        'emprestimo_motivo': 'Reforma (cozinha)',
+        'cliente_nome_completo': 'Ana_Maria <Silva>',
+        'responsavel_username': 'joao.p',
+        **extra,
+    }
+
+
+def _linha(parcela_id, dias, plataforma, nome="Cliente", valor="150.00"):
+    return {
+        'chat_plataforma': plataforma,
+        'dias': dias,
+        'cliente_nome_completo': f"{nome} {parcela_id}",
+        'numero_parcela': 1,
+        'emprestimo_parcelas': 3,
+        'emprestimo_id': parcela_id,
+        'parcela_valor': valor,
+        'parcela_data_fim': f"{HOJE + datetime.timedelta(days=dias):%Y-%m-%d} 03:00:00",
+        'parcela_id': parcela_id,
+    }
+
+
+def test_escapes_por_plataforma():
+    assert escapar_markdown_v2("a_b*c.d-e!(f)") == r"a\_b\*c\.d\-e\!\(f\)"
+    assert escapar_discord("a_b*c.d") == r"a\_b\*c.d"
+    assert escapar_html("<b>&'\"") == "&lt;b&gt;&amp;&#x27;&quot;"
+
+
+def test_formatar_valor_sem_float():
+    assert formatar_valor(Decimal("1234.56")) == "1.234,56"
+    assert formatar_valor("0.1") == "0,10"
+    assert formatar_valor(None) == "0,00"
+    assert formatar_valor(Decimal("1234567.8")) == "1.234.567,80"
+
+
+def test_formatar_data():
+    assert formatar_data("2025-03-01 03:00:00") == "01/03/2025"
+    assert formatar_data(datetime.date(2025, 3, 1)) == "01/03/2025"
+    assert formatar_data(datetime.datetime(2025, 3, 1, 3, tzinfo=datetime.timezone.utc)) == "01/03/2025"
+    assert formatar_data("sem data") == "sem data"
+
+
+@pytest.mark.parametrize('dias, titulo', [
+    (3, "vence em 3 DIAS"), (1, "vence AMANHÃ"), (0, "vence HOJE"), (-1, "VENCIDA"), (7, "Aviso de Parcela"),
+])
+def test_titulo_por_janela(dias, titulo):
+    assert titulo in renderizar_vencimento(_vencimento('discord', dias))
+
+
+def test_renderizar_telegram_escapa_campos_e_mantem_o_link():
+    texto = renderizar_vencimento(_vencimento('telegram'))
+    assert r"Ana\_Maria <Silva\>" in texto
+    assert r"Reforma \(cozinha\)" in texto
+    assert r"R$ 150,50" in texto
+    assert r"Vencimento: 10/03/2025" in texto
+    assert r"joao\.p" in texto
+    assert "[Ver Empréstimo no Admin](" in texto and texto.rstrip().endswith("/9/change/)")
+
+
+def test_renderizar_email_gera_html():
+    texto = renderizar_vencimento(_vencimento('email'))
+    assert "Ana_Maria &lt;Silva&gt;" in texto
+    assert "<b>" in texto
+    assert '<a href="' in texto and "/9/change/" in texto
+
+
+def test_vencida_termina_com_os_dias_de_atraso():
+    texto = renderizar_vencimento(_vencimento('discord', -1, parcela_data_fim='2025-03-07 03:00:00'), HOJE)
+    assert texto.endswith("Em atraso há 3 dias — lembrete de 10/03/2025")
+    assert "Em atraso" not in renderizar_vencimento(_vencimento('discord', -1))
+
+
+def test_item_resumo():
+    janela, data_fim, valor, parcela_id, texto = item_resumo(_linha(7, -2, 'telegram', valor=Decimal("99.90")))
+    assert (janela, parcela_id, valor) == (-1, 7, Decimal("99.90"))
+    assert data_fim == datetime.datetime(2025, 3, 8, 3, tzinfo=datetime.timezone.utc)
+    assert "99,90" in texto and "08/03/2025" in texto
+
+
+def test_resumo_curto_cabe_numa_mensagem():
+    itens = [item_resumo(_linha(i, dias, 'telegram')) for i, dias in enumerate((2, 0, -1), start=1)]
+    [(texto, ids, janela)] = montar_resumos(itens, 'telegram', HOJE)
+    assert sorted(ids) == [1, 2, 3]
+    assert janela == -1
+    assert "parte" not in texto
+    # Vencidas vêm antes de hoje, que vem antes de 2 dias
+    assert texto.index("Vencidas") < texto.index("Vencem hoje") < texto.index("Vencem em 2 dias")
+    assert "450,00" in texto
+
+
+@pytest.mark.parametrize('plataforma', ['telegram', 'discord'])
+def test_resumo_longo_e_dividido_dentro_do_limite(plataforma):
+    # Nomes longos com emoji: o tamanho conta em unidades UTF-16
+    linhas = [_linha(i, (-1, 0, 1, 2, 3)[i % 5], plataforma, nome="🙂 " + "n" * 100) for i in range(1, 201)]
+    itens = [item_resumo(linha) for linha in linhas]
+    mensagens = montar_resumos(itens, plataforma, HOJE)
+    total = len(mensagens)
+    assert total > 1
+
+    ids = [parcela_id for _, ids_mensagem, _ in mensagens for parcela_id in ids_mensagem]
+    assert sorted(ids) == list(range(1, 201))
+    for indice, (texto, ids_mensagem, janela) in enumerate(mensagens, start=1):
+        # Só a última pode ter apenas o link do Admin
+        assert ids_mensagem or indice == total
+        assert tamanho_mensagem(texto) <= LIMITE_CARACTERES[plataforma]
+        assert tamanho_mensagem(texto) <= LIMITE_CARACTERES[plataforma] - FOLGA_PARTE + len(f" (parte {indice}/{total})") + 2
+        assert f"parte {indice}/{total}" in texto.split('\n', 1)[0].replace('\\', '')
+    # A primeira parte leva as vencidas e o total geral
+    assert mensagens[0][2] == -1
+    assert "200 parcelas" in mensagens[0][0]
+    assert [janela for _, _, janela in mensagens] == sorted(janela for _, _, janela in mensagens)
+    assert "Ver parcelas no Admin" in mensagens[-1][0]
+
+
+def test_link_do_admin_nunca_e_descartado(monkeypatch):
+    # Com um limite pequeno, alguma quantidade de itens deixa a última mensagem cheia demais para o link
+    monkeypatch.setitem(LIMITE_CARACTERES, 'discord', FOLGA_PARTE + 400)
+    so_link = 0
+    for quantidade in range(1, 30):
+        itens = [item_resumo(_linha(i, 0, 'discord')) for i in range(1, quantidade + 1)]
+        mensagens = montar_resumos(itens, 'discord', HOJE)
+        assert "Ver parcelas no Admin" in mensagens[-1][0]
+        assert all(tamanho_mensagem(texto) <= LIMITE_CARACTERES['discord'] for texto, _, _ in mensagens)
+        if not mensagens[-1][1]:
+            so_link += 1
+            assert mensagens[-1][2] == mensagens[-2][2] == 0
+    assert so_link
@@ -0,0 +1,28 @@
+from notificador_metricas import Metricas
+
+
+def test_exportar_prometheus_escapa_valores_de_rotulo():
+    metricas = Metricas()
+    metricas.incrementar('notificador_falhas_total', plataforma='telegram', erro='Bad "Request"\nC:\\chat')
+    texto = metricas.exportar_prometheus()
+    assert 'notificador_falhas_total{erro="Bad \\"Request\\"\\nC:\\\\chat",plataforma="telegram"} 1\n' in texto
+    assert all(linha.count('"') % 2 == 0 for linha in texto.splitlines() if not linha.startswith('#'))
+
+
+def test_histograma_acumula_buckets_e_resumo_usa_a_diferenca():
+    metricas = Metricas()
+    metricas.observar('notificador_envio_segundos', 0.02, plataforma='discord')
+    base = metricas.instantaneo()
+    for valor in (0.02, 0.3, 50):
+        metricas.observar('notificador_envio_segundos', valor, plataforma='discord')
+    metricas.incrementar('notificador_mensagens_enviadas_total', 3, plataforma='discord')
+
+    texto = metricas.exportar_prometheus()
+    assert 'notificador_envio_segundos_bucket{plataforma="discord",le="0.025"} 2' in texto
+    assert 'notificador_envio_segundos_bucket{plataforma="discord",le="+Inf"} 4' in texto
+    assert 'notificador_envio_segundos_count{plataforma="discord"} 4' in texto
+
+    resumo = metricas.resumo(base)
+    envio = resumo['notificador_envio_segundos']['plataforma=discord']
+    assert (envio['total'], envio['p50'], envio['p99']) == (3, 0.5, '+Inf')
+    assert resumo['notificador_mensagens_enviadas_total'] == {'plataforma=discord': 3}
@@ -0,0 +1,117 @@
+from email.utils import formatdate
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from core.middleware import RangeAwareGZipMiddleware
+from core.ranges import (
+    MAX_INTERVALOS, Intervalo, interpretar_range, if_range_confere, planejar,
+    corpo_de_bytes, resposta_conteudo,
+)
+
+
+def test_interpretar_range_intervalo_unico():
+    assert interpretar_range("bytes=0-9", 100) == [Intervalo(0, 9)]
+    assert interpretar_range("bytes=90-", 100) == [Intervalo(90, 99)]
+    assert interpretar_range("bytes=-10", 100) == [Intervalo(90, 99)]
+    # Fim além do tamanho é cortado no último byte
+    assert interpretar_range("bytes=50-500", 100) == [Intervalo(50, 99)]
+    # Sufixo maior que o conteúdo devolve o conteúdo inteiro
+    assert interpretar_range("bytes=-500", 100) == [Intervalo(0, 99)]
+
+
+def test_interpretar_range_une_sobrepostos_e_adjacentes():
+    assert interpretar_range("bytes=20-29, 0-9, 5-14", 100) == [Intervalo(0, 14), Intervalo(20, 29)]
+    assert interpretar_range("bytes=0-9,10-19", 100) == [Intervalo(0, 19)]
+
+
+def test_interpretar_range_nao_satisfazivel():
+    assert interpretar_range("bytes=100-", 100) == []
+    assert interpretar_range("bytes=200-300", 100) == []
+    assert interpretar_range("bytes=-0", 100) == []
+    assert interpretar_range("bytes=0-", 0) == []
+
+
+def test_interpretar_range_ignorado():
+    assert interpretar_range("items=0-9", 100) is None
+    assert interpretar_range("bytes=", 100) is None
+    assert interpretar_range("bytes=9-0", 100) is None
+    assert interpretar_range("bytes=a-b", 100) is None
+    assert interpretar_range("bytes=5", 100) is None
+    assert interpretar_range("bytes=-", 100) is None
+    muitos = ",".join(f"{i * 2}-{i * 2}" for i in range(MAX_INTERVALOS + 1))
+    assert interpretar_range(f"bytes={muitos}", 1000) is None
+
+
+def test_if_range_confere_etag_forte():
+    assert if_range_confere('"abc"', '"abc"', None)
+    assert not if_range_confere('"abc"', '"def"', None)
+    assert not if_range_confere('"abc"', None, None)
+    # Comparação forte: ETags fracos nunca conferem
+    assert not if_range_confere('W/"abc"', 'W/"abc"', None)
+    assert not if_range_confere('"abc"', 'W/"abc"', None)
+
+
+def test_if_range_confere_data():
+    modificado = 1_700_000_000.7
+    assert if_range_confere(formatdate(1_700_000_000, usegmt=True), None, modificado)
+    assert not if_range_confere(formatdate(1_700_000_100, usegmt=True), None, modificado)
+    assert not if_range_confere(formatdate(1_700_000_000, usegmt=True), None, None)
+    assert not if_range_confere("ontem", None, modificado)
+
+
+def test_planejar_multipart_content_length_confere_com_o_corpo():
+    conteudo = bytes(range(256)) * 4
+    plano = planejar([Intervalo(0, 9), Intervalo(100, 199)], len(conteudo), "text/plain")
+    corpo = corpo_de_bytes(conteudo, plano)
+    assert plano.content_type.startswith("multipart/byteranges; boundary=")
+    assert plano.content_range is None
+    assert plano.content_length == len(corpo)
+    assert conteudo[0:10] in corpo and conteudo[100:200] in corpo
+    assert b"Content-Range: bytes 100-199/1024" in corpo
+
+
+def test_resposta_conteudo_200_206_416():
+    fabrica = RequestFactory()
+    conteudo = b"0123456789" * 10
+
+    completa = resposta_conteudo(fabrica.get("/"), conteudo, "application/pdf")
+    assert completa.status_code == 200
+    assert completa.content == conteudo
+    assert completa["Accept-Ranges"] == "bytes"
+
+    parcial = resposta_conteudo(fabrica.get("/", HTTP_RANGE="bytes=10-19"), conteudo, "application/pdf")
+    assert parcial.status_code == 206
+    assert parcial.content == conteudo[10:20]
+    assert parcial["Content-Range"] == "bytes 10-19/100"
+    assert parcial["Content-Length"] == "10"
+
+    fora = resposta_conteudo(fabrica.get("/", HTTP_RANGE="bytes=500-"), conteudo, "application/pdf")
+    assert fora.status_code == 416
+    assert fora["Content-Range"] == "bytes */100"
+
+    # If-Range com ETag diferente: o conteúdo mudou, a resposta volta a ser completa
+    desatualizada = resposta_conteudo(
+        fabrica.get("/", HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"outro"'), conteudo, "application/pdf"
+    )
+    assert desatualizada.status_code == 200
+
+    mesma = resposta_conteudo(
+        fabrica.get("/", HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE=completa["ETag"]), conteudo, "application/pdf"
+    )
+    assert mesma.status_code == 206
+
+
+def test_gzip_preserva_o_range_do_comprovante():
+    request = RequestFactory().get("/", headers={"Accept-Encoding": "gzip"})
+    conteudo = b"%PDF-1.7 " + b"0" * 1000
+    gzip = RangeAwareGZipMiddleware(lambda request: HttpResponse())
+
+    resposta = gzip.process_response(request, resposta_conteudo(request, conteudo, "application/pdf"))
+    assert resposta["Accept-Ranges"] == "bytes"
+    assert not resposta.has_header("Content-Encoding")
+    assert resposta.content == conteudo
+
+    # Respostas sem Range continuam sendo comprimidas
+    comum = gzip.process_response(request, HttpResponse(conteudo))
+    assert comum["Content-Encoding"] == "gzip"
@@ -0,0 +1,182 @@
+import asyncio
+import types
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import notificador
+from aiodiscord import DiscordBot
+from aiohttppool import PoolHTTP
+from aioratelimit import ConfigLimites, LimiteTaxa, RateLimiter, RateLimitError, TokenBucket
+from aiotelegram import TelegramBot
+from notificador import Notificador
+
+SEM_LIMITE = LimiteTaxa(capacidade=10**9, por_segundo=10**9)
+
+
+def test_token_bucket_repoe_na_taxa_configurada():
+    balde = TokenBucket(LimiteTaxa(capacidade=2, por_segundo=4))
+    agora = balde.atualizado
+    assert balde.tempo_ate_disponivel(agora) == 0
+    balde.consumir()
+    balde.consumir()
+    assert balde.tempo_ate_disponivel(agora) == pytest.approx(0.25)
+    # Reposição nunca passa da capacidade
+    assert balde.tempo_ate_disponivel(agora + 10) == 0
+    assert balde.tokens == 2
+    assert balde.cheio(agora + 10)
+
+
+def test_token_bucket_bloqueio_libera_uma_requisicao():
+    balde = TokenBucket(LimiteTaxa(capacidade=5, por_segundo=1))
+    balde.bloquear(2)
+    assert balde.tempo_ate_disponivel(balde.bloqueado_ate - 1) == pytest.approx(1)
+    assert not balde.cheio(balde.bloqueado_ate - 1)
+    assert balde.tempo_ate_disponivel(balde.bloqueado_ate) == 0
+    balde.consumir()
+    assert balde.tempo_ate_disponivel(balde.bloqueado_ate) == pytest.approx(1)
+
+
+def test_todo_chat_negativo_do_telegram_e_grupo(monkeypatch):
+    monkeypatch.delenv('TELEGRAM_PREFIXOS_GRUPO', raising=False)
+    telegram = RateLimiter.para_plataforma('telegram')
+    # Supergrupo/canal e grupo básico
+    assert telegram.eh_grupo(-1001234567890)
+    assert telegram.eh_grupo(-123456)
+    assert not RateLimiter.para_plataforma('discord').eh_grupo('-1001234')
+
+    monkeypatch.setenv('TELEGRAM_PREFIXOS_GRUPO', '-100')
+    assert not RateLimiter.para_plataforma('telegram').eh_grupo(-123456)
+    monkeypatch.setenv('TELEGRAM_PREFIXOS_GRUPO', '')
+    assert not RateLimiter.para_plataforma('telegram').eh_grupo(-1001234567890)
+
+
+def test_para_plataforma_divide_o_limite_global():
+    limiter = RateLimiter.para_plataforma('telegram', fracao=1 / 4)
+    assert limiter.config.global_.por_segundo == pytest.approx(28 / 4)
+    with pytest.raises(ValueError):
+        RateLimiter.para_plataforma('sms')
+
+
+def test_pausa_por_chat_nao_segura_outros_chats():
+    async def cenario():
+        limiter = RateLimiter(ConfigLimites(global_=SEM_LIMITE, chat=LimiteTaxa(capacidade=1, por_segundo=1000)))
+        limiter.pausar(60, chat_id='a')
+        await asyncio.wait_for(limiter.acquire('b'), 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire('a'), 0.05)
+    asyncio.run(cenario())
+
+
+def test_grupo_segue_o_limite_por_minuto(monkeypatch):
+    monkeypatch.delenv('TELEGRAM_PREFIXOS_GRUPO', raising=False)
+
+    async def cenario():
+        config = RateLimiter.para_plataforma('telegram').config
+        limiter = RateLimiter(ConfigLimites(
+            global_=SEM_LIMITE, chat=SEM_LIMITE, grupo=config.grupo, prefixos_grupo=config.prefixos_grupo,
+        ))
+        for _ in range(config.grupo.capacidade):
+            await asyncio.wait_for(limiter.acquire(-123456), 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(-123456), 0.05)
+    asyncio.run(cenario())
+
+
+class _BotFalso:
+    def __init__(self, respostas):
+        self.respostas = list(respostas)
+        self.chamadas = 0
+
+    async def send_message(self, **kwargs):
+        self.chamadas += 1
+        resposta = self.respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    """Registra os asyncio.sleep do notificador (sem esperar de verdade)."""
+    registradas = []
+    sleep = asyncio.sleep
+
+    async def registrar(segundos, *args, **kwargs):
+        registradas.append(segundos)
+        await sleep(0)
+
+    monkeypatch.setattr(notificador.asyncio, 'sleep', registrar)
+    return registradas
+
+
+def test_429_espera_so_no_rate_limiter(esperas):
+    # O bot já pausou o RateLimiter pelo retry_after; o notificador não dorme de novo
+    enviada = types.SimpleNamespace(message_id=1)
+    bot = _BotFalso([RateLimitError(30, escopo='chat'), RateLimitError(30, escopo='chat'), enviada])
+    assert asyncio.run(Notificador().enviar_mensagem(bot, -1, "texto", 'telegram')) is enviada
+    assert bot.chamadas == 3
+    assert esperas == []
+
+
+def test_falha_de_rede_usa_backoff(esperas):
+    enviada = types.SimpleNamespace(message_id=1)
+    bot = _BotFalso([RuntimeError("Conexão perdida"), enviada])
+    assert asyncio.run(Notificador().enviar_mensagem(bot, -1, "texto", 'telegram')) is enviada
+    assert len(esperas) == 1 and 0 <= esperas[0] <= Notificador.BACKOFF_BASE
+
+
+def _limiter():
+    return RateLimiter(ConfigLimites(global_=SEM_LIMITE, chat=SEM_LIMITE))
+
+
+@pytest.mark.parametrize('corpo', [b'', b'<html>429</html>', b'[]', b'\xff'])
+def test_discord_429_com_corpo_invalido_usa_os_headers(corpo):
+    bot = DiscordBot('token', rate_limiter=_limiter())
+    resposta = types.SimpleNamespace(headers={'Retry-After': '7', 'X-RateLimit-Scope': 'shared'})
+    erro = bot._rate_limit_error(resposta, bot._corpo_429(corpo), 'canal')
+    assert erro.retry_after == 7
+    assert erro.escopo == 'shared'
+
+
+def test_discord_429_global_pausa_o_bot_inteiro():
+    limiter = _limiter()
+    bot = DiscordBot('token', rate_limiter=limiter)
+    resposta = types.SimpleNamespace(headers={'X-RateLimit-Reset-After': '9'})
+    erro = bot._rate_limit_error(resposta, bot._corpo_429(b'{"retry_after": 2.5, "global": true}'), 'canal')
+    assert erro.retry_after == 2.5
+    assert erro.escopo == 'global'
+    assert limiter._global.bloqueado_ate > 0
+    assert 'canal' not in limiter._chats
+
+
+@pytest.mark.parametrize('corpo, esperado', [
+    (b'{"ok": false, "error_code": 429, "parameters": {"retry_after": 12}}', 12),
+    (b'<html><body>Too Many Requests</body></html>', 7),
+    (b'', 7),
+])
+def test_telegram_429_vira_rate_limit_mesmo_sem_json(monkeypatch, corpo, esperado):
+    async def cenario():
+        async def responder(request):
+            return web.Response(status=429, body=corpo, headers={'Retry-After': '7'}, content_type='text/html')
+
+        app = web.Application()
+        app.router.add_post('/bottoken/sendMessage', responder)
+        servidor = TestServer(app)
+        await servidor.start_server()
+        monkeypatch.setenv('TELEGRAM_API_URL', str(servidor.make_url('')).rstrip('/'))
+        limiter = _limiter()
+        pool = PoolHTTP()
+        try:
+            bot = TelegramBot('token', rate_limiter=limiter, pool=pool)
+            with pytest.raises(RateLimitError) as erro:
+                await bot.send_message(chat_id=-5, text="oi")
+        finally:
+            await pool.close()
+            await servidor.close()
+        return erro.value, limiter
+
+    erro, limiter = asyncio.run(cenario())
+    assert erro.retry_after == esperado
+    assert limiter._estado_chat(-5)[1].bloqueado_ate > 0
@@ -0,0 +1,151 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, override_settings
+
+from core.middleware import (
+    ESCOPO_ENVIO_DIRETO, AsyncStaticMiddleware, RangeAwareGZipMiddleware, RespostaArquivo, parse_accept_encoding,
+)
+
+CSS = b"body { color: #222; }\n" * 200
+JS = b"var x = 1;\n" * 100
+
+
+async def _proxima(request):
+    return HttpResponse("app")
+
+
+@pytest.fixture
+def static_root(tmp_path):
+    raiz = tmp_path / "static"
+    (raiz / "js").mkdir(parents=True)
+    (raiz / "app.css").write_bytes(CSS)
+    (raiz / "app.css.gz").write_bytes(gzip.compress(CSS))
+    # .br falso, só precisa ser menor que o .gz para ganhar a negociação
+    (raiz / "app.css.br").write_bytes(b"b" * 10)
+    (raiz / "app.0123456789ab.css").write_bytes(CSS)
+    # Sem variante pré-compactada: o GZipMiddleware comprimiria se pudesse
+    (raiz / "js" / "vendor.js").write_bytes(JS)
+    (raiz / "staticfiles.json").write_text(json.dumps({"paths": {"app.css": "app.0123456789ab.css"}}))
+    return raiz
+
+
+@pytest.fixture(autouse=True)
+def configuracao(static_root):
+    # O middleware lê STATIC_URL/STATIC_ROOT também a cada requisição
+    with override_settings(STATIC_ROOT=str(static_root), STATIC_URL="/static/"):
+        yield
+
+
+def _middleware(**storage):
+    config = {"storage": {"INDEX": True, "ZERO_COPY": False, **storage}}
+    with override_settings(STATIC_MIDDLEWARE=config):
+        return AsyncStaticMiddleware(_proxima)
+
+
+def _get(middleware, path, **headers):
+    return asyncio.run(middleware(AsyncRequestFactory().get(path, headers=headers)))
+
+
+def test_gzip_nao_mexe_no_arquivo_com_envio_direto():
+    middleware = _middleware(ZERO_COPY=True, CONTENT_CACHE_MAX_FILE_SIZE=0)
+    request = AsyncRequestFactory().get("/static/js/vendor.js", headers={"Accept-Encoding": "gzip"})
+    request.scope[ESCOPO_ENVIO_DIRETO] = "http.response.pathsend"
+    resposta = asyncio.run(middleware(request))
+    assert isinstance(resposta, RespostaArquivo)
+
+    resposta = RangeAwareGZipMiddleware(_proxima).process_response(request, resposta)
+    assert resposta.envio == "http.response.pathsend"
+    assert not resposta.has_header("Content-Encoding")
+    assert resposta["Accept-Ranges"] == "bytes"
+    assert resposta["Content-Length"] == str(len(JS))
+
+
+def test_cache_de_conteudo_lru(static_root):
+    tamanho = 400 * 1024
+    for nome in ("a", "b", "c"):
+        (static_root / f"{nome}.bin").write_bytes(nome.encode() * tamanho)
+    middleware = _middleware(CONTENT_CACHE_MEMORY_MB=1, CONTENT_CACHE_MAX_FILE_SIZE=1024 * 1024)
+
+    def ler(nome):
+        entry = middleware._index[f"{nome}.bin"]
+        return asyncio.run(middleware._get_cached_content(entry.path, entry.stat))
+
+    assert ler("a") == b"a" * tamanho
+    ler("b")
+    ler("a")  # acerto: "a" passa a ser o mais recente
+    assert middleware._content_hits == 1
+    ler("c")  # não cabem três: sai o menos usado recentemente ("b")
+    caminhos = [caminho.rsplit("/", 1)[-1] for caminho in middleware._content_cache]
+    assert caminhos == ["a.bin", "c.bin"]
+    assert middleware._content_evictions == 1
+    assert middleware._content_cache_bytes <= 1024 * 1024
+
+    # Arquivos acima do limite por arquivo não entram no cache
+    middleware.content_cache_max_file_size = 1024
+    assert ler("b") is None
+
+
+def test_indice_marca_imutaveis_e_inclui_variantes():
+    middleware = _middleware()
+    assert middleware._index["app.0123456789ab.css"].immutable
+    assert not middleware._index["app.css"].immutable
+    assert set(middleware._index["app.css"].variants) == {"gzip", "br"}
+    # As variantes também respondem pela URL direta
+    assert {"app.css.gz", "app.css.br", "js/vendor.js"} <= set(middleware._index)
+
+
+def test_indice_serve_variante_direta_e_404_fora_dele(static_root):
+    middleware = _middleware()
+    direta = _get(middleware, "/static/app.css.gz")
+    assert direta.status_code == 200
+    assert not direta.has_header("Content-Encoding")
+
+    negociada = _get(middleware, "/static/app.css", **{"Accept-Encoding": "gzip"})
+    assert negociada["Content-Encoding"] == "gzip"
+    assert negociada["Vary"] == "Accept-Encoding"
+
+    (static_root / "novo.js").write_bytes(b"1")
+    assert _get(middleware, "/static/novo.js").status_code == 404
+    assert _get(middleware, "/static/../settings.py").status_code == 404
+    assert _get(middleware, "/fora/").content == b"app"
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.9, *;q=0") == {"gzip": 1.0, "br": 0.9, "*": 0.0}
+    assert parse_accept_encoding("x-gzip") == {"gzip": 1.0}
+    assert parse_accept_encoding("BR ; Q=0.5") == {"br": 0.5}
+    assert parse_accept_encoding("gzip;q=abc") == {"gzip": 0.0}
+    assert parse_accept_encoding("") == {}
+
+
+def test_choose_variant_menor_aceita():
+    middleware = _middleware()
+    entry = middleware._index["app.css"]
+    escolher = lambda cabecalho: middleware._choose_variant(  # noqa: E731
+        AsyncRequestFactory().get("/", headers={"Accept-Encoding": cabecalho}), entry
+    )
+    assert escolher("gzip, br").path.endswith("app.css.br")
+    assert escolher("gzip, br;q=0").path.endswith("app.css.gz")
+    assert escolher("*").path.endswith("app.css.br")
+    assert escolher("*;q=0, gzip").path.endswith("app.css.gz")
+    assert escolher("identity").path.endswith("app.css")
+    assert middleware._choose_variant(AsyncRequestFactory().get("/"), entry) is entry
+
+
+def test_range_sobre_a_variante():
+    middleware = _middleware()
+    resposta = _get(middleware, "/static/app.css", Range="bytes=0-9")
+    assert resposta.status_code == 206
+    assert resposta["Content-Range"] == f"bytes 0-9/{len(CSS)}"
+    assert b"".join(asyncio.run(_ler(resposta))) == CSS[:10]
+    assert _get(middleware, "/static/app.css", Range=f"bytes={len(CSS)}-").status_code == 416
+
+
+async def _ler(resposta):
+    if not resposta.streaming:
+        return [resposta.content]
+    return [parte async for parte in resposta.streaming_content]